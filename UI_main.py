@@ -1,22 +1,32 @@
 # tkinter_app.py
 import tkinter as tk
-from tkinter import ttk, scrolledtext, messagebox, filedialog
+from tkinter import ttk, messagebox, filedialog
 import os
-import time
 import logging
 import traceback
 import json
-import openai
-from dotenv import load_dotenv
-import threading
 import queue
 import sys
+import importlib.util
+
+from config import setup_logging, get_setting
+
+# --- 基本設定 ---
+setup_logging(filename='app.log')
+logger = logging.getLogger(__name__)
 
 # --- 導入你的模組 ---
+# openai、phub 等重量級模組由各階段在第一次使用時才載入，視窗不必等待；這裡只確認檔案存在
+REQUIRED_MODULES = ("voice2text", "content_analyzer", "pornhub_audio")
 try:
-    from voice2text import AudioProcessor
-    from content_analyzer import ContentAnalyzer
-    from pornhub_audio import PornhubAudioDownloader
+    missing = [name for name in REQUIRED_MODULES if importlib.util.find_spec(name) is None]
+    if missing:
+        raise ImportError(", ".join(missing))
+    from pipeline_tasks import TOY_FUNCTIONS_JSON, ANALYSIS_ENGINE, BLEND_AUDIO, DOWNLOAD_RESUME, ANALYSIS_MODE, ensure_output_dirs
+    from jobs import Job, JobEngine, JobEvent, JobEventType, JobOptions
+    from log_view import LogView, LEVEL_NAMES
+    import metrics
+    import tracing
 except ImportError as e:
     root_check = tk.Tk()
     root_check.withdraw()
@@ -24,18 +34,17 @@ except ImportError as e:
     root_check.destroy()
     sys.exit(1)
 
-# --- 基本設定 ---
-log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-logging.basicConfig(level=logging.INFO, format=log_format, filename='app.log', filemode='a')
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-
 # --- 常數 ---
-DOWNLOAD_DIR = './downloads'
-TRANSCRIPT_DIR = './transcripts'
-ANALYSIS_DIR = './analysis_outputs'
-TOY_FUNCTIONS_JSON = 'toys_funcs.json'
+LOG_MAX_LINES = 2000
+ENGINE_LABELS = {"LLM 分析 (OpenAI)": "llm", "規則引擎 (離線快速預覽)": "rules", "音訊包絡 (不需轉錄)": "audio"}
+MODE_LABELS = {"自動 (超過預算時分段)": "auto", "單次請求": "single", "分段並行 (長字幕)": "windowed",
+               "串流 (邊分析邊輸出事件)": "stream"}
+# 串流分析時每收到多少個事件在日誌中回報一次
+STREAM_PROGRESS_EVERY = 20
+# Tk 主執行緒檢查工作事件隊列的間隔 (毫秒)
+JOB_EVENT_POLL_MS = 50
+# 設置時，每個工作結束後在此目錄寫入 JSON 與 Prometheus 格式的指標報告
+METRICS_DIR = get_setting('METRICS_DIR')
 
 # --- 全域變數 ---
 toy_data = None
@@ -63,95 +72,13 @@ def load_toy_data(json_path):
         traceback.print_exc()
         return False, msg
 
-# --- 執行緒工作函數 (與之前版本類似，但輸出特定訊息) ---
-
-# Step 0: Download & Extract Audio
-def download_extract_thread_func(url, status_queue):
-    """下載 P**nhub 影片並提取音訊"""
-    try:
-        status_queue.put(f"INFO: 開始從 {url} 下載並提取音訊...")
-        downloader = PornhubAudioDownloader(save_dir=DOWNLOAD_DIR)
-        audio_file_path = downloader.download_audio(url) # This already extracts audio
-
-        if not audio_file_path:
-            msg = "錯誤：無法下載或提取音訊。請檢查 URL 或 ffmpeg/phub 是否安裝正確。"
-            status_queue.put(msg)
-            status_queue.put("DOWNLOAD_EXTRACT_FAILED")
-        else:
-            msg = f"成功：音訊文件已保存到 '{audio_file_path}'"
-            status_queue.put(msg)
-            status_queue.put(f"RESULT_AUDIO_PATH:{audio_file_path}") # Send path back
-            status_queue.put("DOWNLOAD_EXTRACT_COMPLETE")
-
-    except Exception as e:
-        error_msg = f"錯誤：下載提取過程中發生錯誤: {e}"
-        logger.error(error_msg + f"\n{traceback.format_exc()}")
-        status_queue.put(error_msg)
-        status_queue.put("DOWNLOAD_EXTRACT_FAILED")
-
-# Step 1: Transcribe Audio (Takes audio path)
-def transcribe_thread_func(audio_path, status_queue):
-    """將音訊檔案轉錄為 SRT 字幕"""
-    try:
-        # Basic check if path is valid (though AudioProcessor does it too)
-        if not audio_path or not os.path.exists(audio_path):
-             status_queue.put(f"錯誤：用於轉錄的音訊文件路徑無效或不存在: {audio_path}")
-             status_queue.put("TRANSCRIBE_FAILED")
-             return
-
-        status_queue.put(f"INFO: 開始轉錄音訊文件: {os.path.basename(audio_path)} (可能需要幾分鐘)...")
-        audio_processor = AudioProcessor()
-        timestamp_str = time.strftime('%Y%m%d_%H%M%S')
-        base_filename = os.path.splitext(os.path.basename(audio_path))[0]
-        final_transcript_path = os.path.join(TRANSCRIPT_DIR, f"{base_filename}_transcript_{timestamp_str}.srt")
-        transcript_content = audio_processor.transcribe_audio(audio_path) # Returns SRT string
-        audio_processor.save_transcript(final_transcript_path) # Saves the SRT string
-        msg = f"成功：音訊轉錄完成，SRT 保存到 '{final_transcript_path}'"
-        status_queue.put(msg)
-        status_queue.put(f"RESULT_SRT_PATH:{final_transcript_path}") # Send path back
-        status_queue.put(f"RESULT_SRT_CONTENT:{transcript_content}") # Send content for analysis
-        status_queue.put("TRANSCRIBE_COMPLETE")
-
-    except Exception as e:
-        error_msg = f"錯誤：轉錄過程中發生錯誤: {e}"
-        logger.error(error_msg + f"\n{traceback.format_exc()}")
-        status_queue.put(error_msg)
-        status_queue.put("TRANSCRIBE_FAILED")
-
-# Step 2: Analyze SRT Content (Takes SRT content string)
-def analyze_thread_func(srt_content_string, srt_input_path, toy_key, status_queue):
-    """分析 SRT 字幕內容生成分析檔案"""
-    try:
-        if not srt_content_string:
-            status_queue.put("錯誤：用於分析的 SRT 內容為空。")
-            status_queue.put("ANALYZE_FAILED")
-            return
-
-        status_queue.put(f"INFO: 開始分析 SRT 內容 (使用玩具: {toy_key})...")
-        analyzer = ContentAnalyzer(functions_json_path=TOY_FUNCTIONS_JSON)
-        timestamp_str_analysis = time.strftime('%Y%m%d_%H%M%S')
-
-        # Determine base filename for analysis output
-        if srt_input_path: # Prefer name based on input SRT file
-            base_filename = os.path.splitext(os.path.basename(srt_input_path))[0]
-        else: # Fallback if content came from transcription without saving path yet
-            base_filename = f"analysis_output_{timestamp_str_analysis}"
-
-        final_analysis_path = os.path.join(ANALYSIS_DIR, f"{base_filename}_analysis_{timestamp_str_analysis}.json")
-
-        analysis_result = analyzer.analyze_content(srt_content_string, toy_key) # Pass SRT string
-        analyzer.save_analysis(final_analysis_path)
-        event_count = len(analysis_result.get("events", [])) if analysis_result else 0
-        msg = f"成功：內容分析完成，生成 {event_count} 個事件，保存到 '{final_analysis_path}'"
-        status_queue.put(msg)
-        status_queue.put(f"RESULT_ANALYSIS_PATH:{final_analysis_path}")
-        status_queue.put("ANALYZE_COMPLETE")
-
-    except Exception as e:
-        error_msg = f"錯誤：分析過程中發生錯誤: {e}"
-        logger.error(error_msg + f"\n{traceback.format_exc()}")
-        status_queue.put(error_msg)
-        status_queue.put("ANALYZE_FAILED")
+# --- 階段名稱 (日誌顯示用) ---
+STAGE_LABELS = {
+    "download": "下載提取",
+    "extract": "音訊提取",
+    "transcribe": "轉錄",
+    "analyze": "分析",
+}
 
 
 # --- Tkinter GUI 類 ---
@@ -161,13 +88,10 @@ class App:
         self.root.title("音訊同步分析器 v3 - 多步驟")
         self.root.geometry("800x700") # 增加寬度和高度
 
-        # --- Check API Key & Load Toy Data ---
-        self.api_key = os.getenv('OPENAI_API_KEY')
-        if not self.api_key:
-            messagebox.showerror("API Key 錯誤", "找不到 OpenAI API Key。")
-            self.root.quit(); return
-        openai.api_key = self.api_key
-        logger.info("OpenAI API Key 已成功加載。")
+        # --- Load Toy Data ---
+        # API Key 只在轉錄及 LLM 分析時由 voice2text/ContentAnalyzer 檢查，規則與音訊包絡引擎可離線使用
+        if not get_setting('OPENAI_API_KEY'):
+            logger.warning("找不到 OpenAI API Key：只能使用不需要轉錄的離線分析引擎 (規則引擎處理 SRT、音訊包絡)。")
 
         loaded_ok, msg = load_toy_data(TOY_FUNCTIONS_JSON)
         if not loaded_ok:
@@ -175,18 +99,19 @@ class App:
             self.root.quit(); return
 
         # --- 創建資料夾 ---
-        os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-        os.makedirs(TRANSCRIPT_DIR, exist_ok=True)
-        os.makedirs(ANALYSIS_DIR, exist_ok=True)
+        ensure_output_dirs()
 
         # --- 狀態變數 ---
-        self.ph_url = tk.StringVar(value=os.getenv('PORNHUB_URL', ''))
+        self.ph_url = tk.StringVar(value=get_setting('PORNHUB_URL', ''))
         self.video_path = tk.StringVar()
         self.audio_path = tk.StringVar() # Path to the audio file for transcription
         self.srt_path = tk.StringVar()   # Path to the SRT file for analysis
-        self.srt_content_for_analysis = None # Store SRT content here
         self.analysis_result_path = tk.StringVar() # Path to the final analysis JSON
         self.selected_toy_name = tk.StringVar()
+        self.selected_engine = tk.StringVar()
+        self.selected_mode = tk.StringVar()
+        self.blend_audio = tk.BooleanVar(value=BLEND_AUDIO)
+        self.resume_download = tk.BooleanVar(value=DOWNLOAD_RESUME)
 
         # --- UI 框架 ---
         main_frame = ttk.Frame(root, padding="10")
@@ -229,11 +154,23 @@ class App:
         self.toy_names = sorted(self.toy_key_map.keys())
         self.toy_combobox = ttk.Combobox(input_frame, textvariable=self.selected_toy_name, values=self.toy_names, state="readonly", width=57)
         self.toy_combobox.grid(row=4, column=1, padx=5, pady=5, sticky=tk.EW)
-        default_toy_key = os.getenv('TOY_KEY', 'lush4')
+        default_toy_key = get_setting('TOY_KEY', 'lush4')
         default_name = next((name for name, key in self.toy_key_map.items() if key == default_toy_key), self.toy_names[0] if self.toy_names else "")
         if default_name:
             self.toy_combobox.set(default_name)
 
+        # Analysis Engine Selection
+        ttk.Label(input_frame, text="分析引擎:").grid(row=5, column=0, padx=5, pady=5, sticky=tk.W)
+        self.engine_combobox = ttk.Combobox(input_frame, textvariable=self.selected_engine, values=list(ENGINE_LABELS), state="readonly", width=57)
+        self.engine_combobox.grid(row=5, column=1, padx=5, pady=5, sticky=tk.EW)
+        self.engine_combobox.set(next((label for label, key in ENGINE_LABELS.items() if key == ANALYSIS_ENGINE), list(ENGINE_LABELS)[0]))
+        ttk.Label(input_frame, text="LLM 分析方式:").grid(row=6, column=0, padx=5, pady=5, sticky=tk.W)
+        self.mode_combobox = ttk.Combobox(input_frame, textvariable=self.selected_mode, values=list(MODE_LABELS), state="readonly", width=57)
+        self.mode_combobox.grid(row=6, column=1, padx=5, pady=5, sticky=tk.EW)
+        self.mode_combobox.set(next((label for label, key in MODE_LABELS.items() if key == ANALYSIS_MODE), list(MODE_LABELS)[0]))
+        ttk.Checkbutton(input_frame, text="以音訊包絡加密事件 (需要音訊)", variable=self.blend_audio).grid(row=7, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Checkbutton(input_frame, text="暫存下載分段 (中斷後可續傳)", variable=self.resume_download).grid(row=8, column=1, padx=5, pady=5, sticky=tk.W)
+
         # --- 按鈕區 ---
         button_frame = ttk.Frame(main_frame, padding="10")
         button_frame.pack(fill=tk.X, pady=10)
@@ -245,12 +182,27 @@ class App:
         # --- 狀態/日誌顯示區 ---
         log_frame = ttk.LabelFrame(main_frame, text="處理狀態與日誌", padding="10")
         log_frame.pack(fill=tk.BOTH, expand=True, pady=5)
-        self.log_text = scrolledtext.ScrolledText(log_frame, wrap=tk.WORD, state='disabled', height=15)
-        self.log_text.pack(fill=tk.BOTH, expand=True)
+        filter_frame = ttk.Frame(log_frame)
+        filter_frame.pack(fill=tk.X, pady=(0, 5))
+        ttk.Label(filter_frame, text="顯示等級:").pack(side=tk.LEFT)
+        self.log_level_name = tk.StringVar(value="INFO")
+        level_combobox = ttk.Combobox(filter_frame, textvariable=self.log_level_name, values=list(LEVEL_NAMES),
+                                      state="readonly", width=10)
+        level_combobox.pack(side=tk.LEFT, padx=5)
+        level_combobox.bind("<<ComboboxSelected>>",
+                            lambda _event: self.log_view.set_min_level(LEVEL_NAMES[self.log_level_name.get()]))
+        # 元件只保留最近 LOG_MAX_LINES 行，完整日誌寫入 app.log
+        self.log_view = LogView(log_frame, max_lines=LOG_MAX_LINES, logger=logger, wrap=tk.WORD, height=15)
+        self.log_view.pack(fill=tk.BOTH, expand=True)
 
         # --- 狀態管理 ---
-        self.processing_thread = None
-        self.status_queue = queue.Queue()
+        # 工作執行緒透過 JobEvent 回報進度；事件只放進隊列，由主執行緒以 root.after 定時取出
+        # (Tk 不是執行緒安全的，工作執行緒不可直接呼叫 event_generate 等 Tk 方法)
+        self.current_job = None
+        self.streamed_events = [] # 串流分析已交出的事件 (在完整結果保存前即可使用)
+        self.job_events = queue.Queue()
+        self.job_engine = JobEngine(on_event=self._on_job_event)
+        self.root.after(JOB_EVENT_POLL_MS, self._poll_job_events)
 
         # Initial button state update
         self.update_button_states()
@@ -267,7 +219,7 @@ class App:
             self.update_button_states()
 
     def select_audio_file(self):
-        filepath = filedialog.askopenfilename(title="選擇音訊檔 (MP3)", filetypes=[("MP3 檔案", "*.mp3"), ("所有檔案", "*.*")])
+        filepath = filedialog.askopenfilename(title="選擇音訊檔 (MP3/OGG)", filetypes=[("音訊檔案", "*.mp3 *.ogg *.m4a *.wav"), ("所有檔案", "*.*")])
         if filepath:
             self.audio_path.set(filepath)
             self.video_path.set("") # Clear video
@@ -298,67 +250,51 @@ class App:
         srt_input = self.srt_path.get()
         video_input = self.video_path.get()
         url_input = self.ph_url.get()
+        options = JobOptions(toy_key=toy_key, engine=ENGINE_LABELS.get(self.selected_engine.get(), "llm"),
+                             blend_audio=self.blend_audio.get(), resume=self.resume_download.get(),
+                             analysis_mode=MODE_LABELS.get(self.selected_mode.get(), "auto"))
 
         if audio_input and os.path.exists(audio_input):
             # 如果有音訊檔案，先轉錄
             self.log_message(f"INFO: 檢測到音訊輸入 '{os.path.basename(audio_input)}'，將先執行轉錄再分析。")
-            self._start_task(self.process_button, transcribe_thread_func, audio_input)
+            self._start_job(Job(audio_input, options, kind="audio"))
         elif srt_input and os.path.exists(srt_input):
             # 如果有SRT檔案，直接分析
             self.log_message(f"INFO: 檢測到 SRT 輸入 '{os.path.basename(srt_input)}'，將直接執行分析。")
-            try:
-                with open(srt_input, 'r', encoding='utf-8') as f:
-                    srt_content = f.read()
-                if not srt_content:
-                    messagebox.showwarning("檔案錯誤", f"選擇的 SRT 文件 '{srt_input}' 為空。")
-                    return
-                self._start_task(self.process_button, analyze_thread_func, srt_content, srt_input, toy_key)
-            except Exception as e:
-                messagebox.showerror("讀取錯誤", f"讀取 SRT 文件失敗:\n{e}")
-                logger.error(f"讀取 SRT 失敗: {traceback.format_exc()}")
+            if os.path.getsize(srt_input) == 0:
+                messagebox.showwarning("檔案錯誤", f"選擇的 SRT 文件 '{srt_input}' 為空。")
+                return
+            self._start_job(Job(srt_input, options, kind="srt"))
         elif video_input and os.path.exists(video_input):
             # 如果有視訊檔案，先提取音訊再轉錄
             self.log_message(f"INFO: 檢測到視訊輸入 '{os.path.basename(video_input)}'，將先提取音訊再轉錄分析。")
-            try:
-                import subprocess
-                audio_path = os.path.join(DOWNLOAD_DIR, f"{os.path.splitext(os.path.basename(video_input))[0]}.mp3")
-                subprocess.run(['ffmpeg', '-i', video_input, '-vn', '-acodec', 'libmp3lame', audio_path], check=True)
-                self.audio_path.set(audio_path)
-                self.log_message(f"INFO: 音訊提取完成，開始轉錄...")
-                self._start_task(self.process_button, transcribe_thread_func, audio_path)
-            except Exception as e:
-                messagebox.showerror("音訊提取錯誤", f"從視訊提取音訊失敗:\n{e}")
-                logger.error(f"音訊提取失敗: {traceback.format_exc()}")
+            self._start_job(Job(video_input, options, kind="video"))
         elif url_input and url_input.startswith("http"):
             # 如果有網址，先下載再處理
             self.log_message(f"INFO: 檢測到網址輸入，將開始下載並處理...")
-            self._start_task(self.process_button, download_extract_thread_func, url_input)
+            self._start_job(Job(url_input, options, kind="url"))
         else:
             messagebox.showwarning("缺少輸入", "請提供以下任一輸入：\n1. 視訊檔案\n2. 音訊檔案\n3. 字幕檔案\n4. 有效的網址")
 
-    def _start_task(self, button, target_func, *args):
-        """通用啟動執行緒的內部方法"""
+    def _start_job(self, job):
+        """提交工作並清除其後續步驟的舊結果"""
         self._set_all_buttons_state(tk.DISABLED)
-
-        # Clear subsequent results based on which function is being called
-        if target_func == download_extract_thread_func:
+        stages = job.stages
+        if "download" in stages or "extract" in stages:
             self.audio_path.set("")
+        if "transcribe" in stages:
             self.srt_path.set("")
-            self.analysis_result_path.set("")
-        elif target_func == transcribe_thread_func:
-            self.srt_path.set("")
-            self.analysis_result_path.set("")
-        elif target_func == analyze_thread_func:
-            self.analysis_result_path.set("")
-
-        self.log_message(f"INFO: 正在啟動 {target_func.__name__}...")
-        self.processing_thread = threading.Thread(
-            target=target_func,
-            args=args + (self.status_queue,),
-            daemon=True
-        )
-        self.processing_thread.start()
-        self.root.after(100, self.check_queue)
+        self.analysis_result_path.set("")
+
+        self.current_job = job
+        metrics.reset() # 一次只執行一個工作，指標報告以工作為單位
+        self.log_message(f"INFO: 工作 {job.job_id} 開始，步驟: {' → '.join(STAGE_LABELS[s] for s in stages)}")
+        try:
+            self.job_engine.submit(job)
+        except ValueError as e:
+            self.current_job = None
+            messagebox.showerror("輸入錯誤", str(e))
+            self.update_button_states()
 
     def _set_all_buttons_state(self, state):
         """啟用或禁用主要操作按鈕"""
@@ -371,7 +307,7 @@ class App:
 
     def update_button_states(self):
         """根據輸入更新按鈕啟用狀態"""
-        if self.processing_thread and self.processing_thread.is_alive():
+        if self.job_engine.busy:
             self.process_button.config(state=tk.DISABLED)
         else:
             # Enable button if any valid input is present
@@ -383,77 +319,80 @@ class App:
             )
             self.process_button.config(state=tk.NORMAL if has_valid_input else tk.DISABLED)
 
-    def log_message(self, message):
-        self.log_text.configure(state='normal')
-        self.log_text.insert(tk.END, message + '\n')
-        self.log_text.configure(state='disabled')
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+    def log_message(self, message, level=None):
+        """加入日誌訊息；畫面由 LogView 定時批次刷新"""
+        self.log_view.append(message, level)
 
-    def check_queue(self):
-        """檢查執行緒隊列中的訊息並更新 UI"""
-        process_ended = False
-        try:
-            while True:
-                message = self.status_queue.get_nowait()
-
-                # Handle process completion/failure flags
-                if message in ["DOWNLOAD_EXTRACT_COMPLETE", "DOWNLOAD_EXTRACT_FAILED",
-                               "TRANSCRIBE_COMPLETE", "TRANSCRIBE_FAILED",
-                               "ANALYZE_COMPLETE", "ANALYZE_FAILED"]:
-                    log_prefix = "✅" if "COMPLETE" in message else "❌"
-                    step_name = message.split("_")[0].capitalize()
-                    status = "完成" if "COMPLETE" in message else "失敗"
-                    self.log_message(f"{log_prefix} {step_name} 步驟 {status}！")
-                    process_ended = True # Mark that *a* process ended
-
-                # Handle results
-                elif message.startswith("RESULT_AUDIO_PATH:"):
-                    self.audio_path.set(message.split(":", 1)[1])
-                    self.log_message(f"音訊路徑已更新: {self.audio_path.get()}")
-                elif message.startswith("RESULT_SRT_PATH:"):
-                    self.srt_path.set(message.split(":", 1)[1])
-                    self.log_message(f"字幕路徑已更新: {self.srt_path.get()}")
-                elif message.startswith("RESULT_SRT_CONTENT:"):
-                    # Store content for potential analysis chain
-                    self.srt_content_for_analysis = message.split(":", 1)[1]
-                    # --- CHAINING LOGIC for Button 2 ---
-                    # If transcription just finished successfully, trigger analysis
-                    if not process_ended: # Avoid double triggering if already marked ended
-                         toy_key = self.toy_key_map.get(self.selected_toy_name.get())
-                         if toy_key and self.srt_content_for_analysis:
-                              self.log_message("INFO: 自動接續執行內容分析...")
-                              # No need to call _start_task again, just start the new thread
-                              # Re-disable buttons as a new task starts
-                              self._set_all_buttons_state(tk.DISABLED)
-                              self.processing_thread = threading.Thread(
-                                  target=analyze_thread_func,
-                                  args=(self.srt_content_for_analysis, self.srt_path.get(), toy_key, self.status_queue),
-                                  daemon=True
-                              )
-                              self.processing_thread.start()
-                         else:
-                              self.log_message("警告：無法自動接續分析（缺少玩具選擇或轉錄內容）。")
-                              process_ended = True # Mark process as ended here
-                elif message.startswith("RESULT_ANALYSIS_PATH:"):
-                    self.analysis_result_path.set(message.split(":", 1)[1])
-                    self.log_message(f"分析結果路徑: {self.analysis_result_path.get()}")
-                else:
-                    self.log_message(message) # Display general status/error messages
-
-        except queue.Empty:
-            pass # No messages in queue
-        finally:
-            # Keep checking if the thread is alive
-            if self.processing_thread and self.processing_thread.is_alive():
-                 self.root.after(100, self.check_queue)
-            else:
-                 # Thread finished (or never started), update button states
-                 self.update_button_states()
+    def _on_job_event(self, event: JobEvent):
+        """在工作執行緒中呼叫：只放入隊列，不觸碰 Tk"""
+        tracing.flow("job_event", id(event), start=True)
+        self.job_events.put(event)
+
+    def _poll_job_events(self):
+        """在主執行緒定時取出工作事件 (視窗關閉後 after 排程隨之取消)"""
+        self._process_job_events()
+        self.root.after(JOB_EVENT_POLL_MS, self._poll_job_events)
+
+    def _process_job_events(self):
+        """在主執行緒處理所有待處理的工作事件並更新 UI"""
+        while True:
+            try:
+                event = self.job_events.get_nowait()
+            except queue.Empty:
+                break
+            self._handle_job_event(event)
+
+    def _handle_job_event(self, event: JobEvent):
+        with tracing.span("ui.handle_job_event", cat="ui", type=event.type.value, stage=event.stage):
+            tracing.flow("job_event", id(event), start=False)
+            self._apply_job_event(event)
+
+    def _apply_job_event(self, event: JobEvent):
+        job = event.job
+        label = STAGE_LABELS.get(event.stage, event.stage)
+        if event.type == JobEventType.MESSAGE:
+            self.log_message(event.message)
+        elif event.type == JobEventType.ANALYSIS_EVENT:
+            self.streamed_events.append(event.data)
+            count = len(self.streamed_events)
+            if count == 1 or count % STREAM_PROGRESS_EVERY == 0:
+                self.log_message(f"INFO: 串流分析已收到 {count} 個事件 (最新 {event.data.get('timestamp')})")
+        elif event.type == JobEventType.STAGE_STARTED:
+            if event.stage == "analyze":
+                self.streamed_events = []
+            self.log_message(f"INFO: 正在執行 {label} 步驟...")
+        elif event.type == JobEventType.STAGE_COMPLETED:
+            if event.stage in ("download", "extract"):
+                self.audio_path.set(job.artifacts["audio"].path)
+                self.log_message(f"音訊路徑已更新: {self.audio_path.get()}")
+            elif event.stage == "transcribe":
+                self.srt_path.set(job.artifacts["transcript"].path)
+                self.log_message(f"字幕路徑已更新: {self.srt_path.get()}")
+            elif event.stage == "analyze":
+                self.analysis_result_path.set(job.artifacts["analysis"].path)
+                self.log_message(f"分析結果路徑: {self.analysis_result_path.get()}")
+            self.log_message(f"✅ {label} 步驟完成！(耗時 {event.elapsed:.1f} 秒)")
+        elif event.type == JobEventType.STAGE_FAILED:
+            self.log_message(f"錯誤：{label}過程中發生錯誤: {event.message}")
+            self.log_message(f"❌ {label} 步驟失敗！")
+        elif event.type in (JobEventType.JOB_COMPLETED, JobEventType.JOB_FAILED):
+            timings = "，".join(f"{STAGE_LABELS.get(name, name)} {seconds:.1f} 秒" for name, seconds in job.timings.items())
+            status = "完成" if event.type == JobEventType.JOB_COMPLETED else "失敗"
+            self.log_message(f"INFO: 工作 {job.job_id} {status} ({timings})")
+            if METRICS_DIR:
+                try:
+                    json_path, _ = metrics.write_reports(METRICS_DIR, f"metrics_{job.job_id}")
+                    self.log_message(f"INFO: 指標報告已寫入 {json_path}")
+                except OSError as e:
+                    self.log_message(f"警告：無法寫入指標報告: {e}")
+            if job is self.current_job:
+                self.current_job = None
+            self.update_button_states()
 
 
 # --- 啟動應用程式 ---
 if __name__ == "__main__":
+    tracing.enable_from_env()
     root = tk.Tk()
     app = App(root)
     root.mainloop()
\ No newline at end of file
@@ -0,0 +1,263 @@
+import logging
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from audio_utils import decode_pcm
+from event_utils import (make_event, sort_events, event_time, event_strengths, clamp_strength, fill_durations,
+                         MAX_STRENGTH)
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# 包絡分析不需要高頻，8 kHz 解碼較快且一小時音訊只佔約 115 MB
+SAMPLE_RATE = 8000
+HOP = 256                     # 每幀 32 ms (約 31 幀/秒)
+BLOCK_FRAMES = 16384          # 一次做 FFT 的幀數，限制記憶體用量
+DEFAULT_RESOLUTION = 1.0      # 強度曲線的時間解析度 (秒)
+ONSET_WINDOW = 2.0            # 計算起音密度的窗口 (秒)
+ONSET_THRESHOLD_WINDOW = 0.5  # 起音自適應門檻的平均窗口 (秒)
+MAX_ONSET_RATE = 6.0          # 視為最高密度的每秒起音數
+TEMPO_WINDOW = 6.0            # 估計節奏的窗口 (秒)
+MIN_BPM = 40.0
+MAX_BPM = 200.0
+SILENCE_LEVEL = 0.08          # 正規化響度低於此值視為靜音 (停止)
+SMOOTHING_SECONDS = 2.0       # 強度曲線的移動平均長度 (秒)
+MIN_CHANGE = 2                # 強度至少變化幾級才產生新事件
+HEARTBEAT_SECONDS = 10.0      # 強度不變時每隔多久重發一次事件
+DEFAULT_BLEND_WEIGHT = 0.4    # 與 LLM 事件混合時音訊曲線的權重
+
+# 各功能的強度組成：(響度, 起音密度, 節奏) 的權重
+FUNCTION_MIX = {
+    "Vibrate": (0.6, 0.4, 0.0),
+    "Rotate": (0.5, 0.2, 0.3),
+    "Thrusting": (0.3, 0.2, 0.5),
+    "Pump": (0.8, 0.2, 0.0),
+}
+
+
+def _moving_average(values: np.ndarray, size: int) -> np.ndarray:
+    """置中的移動平均 (以累積和計算，邊界使用實際的樣本數)"""
+    if size <= 1 or len(values) == 0:
+        return values.astype(np.float64)
+    half = size // 2
+    cumsum = np.concatenate(([0.0], np.cumsum(values, dtype=np.float64)))
+    idx = np.arange(len(values))
+    lo = np.clip(idx - half, 0, len(values))
+    hi = np.clip(idx + size - half, 0, len(values))
+    return (cumsum[hi] - cumsum[lo]) / (hi - lo)
+
+
+def frame_features(samples: np.ndarray, sample_rate: int = SAMPLE_RATE, hop: int = HOP):
+    """
+    計算每一幀的能量 (dBFS) 與頻譜通量 (起音強度)。
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (energy_db, flux)，每幀一個值。
+    """
+    n_frames = len(samples) // hop
+    if n_frames < 2:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    frames = samples[:n_frames * hop].reshape(n_frames, hop)
+    energy_db = (10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)).astype(np.float32)
+
+    window = np.hanning(hop).astype(np.float32)
+    flux = np.zeros(n_frames, dtype=np.float32)
+    previous = None
+    for start in range(0, n_frames, BLOCK_FRAMES):
+        block = frames[start:start + BLOCK_FRAMES]
+        magnitude = np.log1p(10.0 * np.abs(np.fft.rfft(block * window, axis=1)))
+        stacked = magnitude if previous is None else np.vstack((previous, magnitude))
+        # 頻譜通量：各頻帶幅度增加量的總和，起音 (打擊、喘息、節拍) 時最大
+        rise = np.maximum(np.diff(stacked, axis=0), 0.0).sum(axis=1)
+        offset = start + (1 if previous is None else 0)
+        flux[offset:offset + len(rise)] = rise
+        previous = magnitude[-1:]
+    return energy_db, flux
+
+
+def _per_step(values: np.ndarray, fps: float, resolution: float, n_steps: int) -> np.ndarray:
+    """將逐幀數值平均到每個解析度時間點"""
+    index = np.minimum((np.arange(len(values)) / fps / resolution).astype(np.int64), n_steps - 1)
+    counts = np.bincount(index, minlength=n_steps)
+    sums = np.bincount(index, weights=values, minlength=n_steps)
+    return sums / np.maximum(counts, 1)
+
+
+def _tempo(flux: np.ndarray, fps: float, resolution: float, n_steps: int):
+    """以滑動窗口內起音強度的自相關估計節奏 (BPM) 與週期性 (0-1)"""
+    width = max(8, int(TEMPO_WINDOW * fps))
+    # 先做 3 幀平滑，讓非整數幀長的節拍週期不會被拆到兩個相鄰的延遲上
+    padded = np.pad(_moving_average(flux, 3), (width // 2, width - width // 2))
+    centers = np.minimum((np.arange(n_steps) * resolution * fps).astype(np.int64), len(flux) - 1)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, width)[centers]
+    windows = windows - windows.mean(axis=1, keepdims=True)
+    spectrum = np.fft.rfft(windows, n=2 * width, axis=1)
+    autocorr = np.fft.irfft(spectrum * np.conj(spectrum), axis=1)[:, :width]
+    autocorr /= autocorr[:, :1] + 1e-9
+
+    lo = max(1, int(60.0 / MAX_BPM * fps))
+    hi = min(width - 1, int(60.0 / MIN_BPM * fps))
+    segment = autocorr[:, lo:hi + 1]
+    # 取接近最大值的最短週期，避免把 2 拍當成 1 拍 (八度誤差)
+    best = (segment >= 0.8 * segment.max(axis=1, keepdims=True)).argmax(axis=1)
+    periodicity = np.clip(segment[np.arange(n_steps), best], 0.0, 1.0)
+    tempo = 60.0 * fps / (best + lo)
+    return tempo, periodicity
+
+
+@traced("envelope.compute", cat="audio")
+def compute_envelopes(samples: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                      resolution: float = DEFAULT_RESOLUTION) -> Dict[str, np.ndarray]:
+    """
+    計算每個解析度時間點的訊號包絡。
+
+    Returns:
+        Dict[str, np.ndarray]: 'times' (秒)、'loudness' (0-1，依本曲的響度分布正規化)、
+        'onset_rate' (每秒起音數)、'tempo' (BPM)、'periodicity' (節奏穩定度 0-1)。
+    """
+    fps = sample_rate / float(HOP)
+    energy_db, flux = frame_features(samples, sample_rate)
+    n_steps = int(np.ceil(len(energy_db) / fps / resolution))
+    if n_steps == 0:
+        empty = np.zeros(0)
+        return {"times": empty, "loudness": empty, "onset_rate": empty, "tempo": empty, "periodicity": empty}
+
+    step_db = _per_step(energy_db, fps, resolution, n_steps)
+    floor, peak = np.percentile(energy_db, 10), np.percentile(energy_db, 98)
+    loudness = np.clip((step_db - floor) / max(peak - floor, 1e-6), 0.0, 1.0)
+
+    # 起音：超過局部平均 + 標準差的局部極大值
+    threshold = _moving_average(flux, int(ONSET_THRESHOLD_WINDOW * fps)) + flux.std()
+    peaks = (flux > threshold) & (flux >= np.roll(flux, 1)) & (flux > np.roll(flux, -1))
+    onset_counts = np.bincount(np.minimum((np.flatnonzero(peaks) / fps / resolution).astype(np.int64), n_steps - 1),
+                               minlength=n_steps).astype(np.float64)
+    onset_rate = _moving_average(onset_counts, max(1, int(round(ONSET_WINDOW / resolution)))) / resolution
+
+    tempo, periodicity = _tempo(flux, fps, resolution, n_steps)
+    return {
+        "times": np.arange(n_steps) * resolution,
+        "loudness": loudness,
+        "onset_rate": onset_rate,
+        "tempo": tempo,
+        "periodicity": periodicity,
+    }
+
+
+def strength_curves(envelopes: Dict[str, np.ndarray], functions: List[str],
+                    resolution: float = DEFAULT_RESOLUTION) -> Dict[str, np.ndarray]:
+    """
+    將包絡映射為各功能的強度曲線 (1-20；靜音處為 0 表示停止)。
+
+    Args:
+        functions (List[str]): 要產生曲線的功能，不在 FUNCTION_MIX 中的功能會被略過。
+    """
+    loudness = envelopes["loudness"]
+    density = np.clip(envelopes["onset_rate"] / MAX_ONSET_RATE, 0.0, 1.0)
+    # 只有節奏穩定時速度才有意義
+    rhythm = envelopes["periodicity"] * np.clip((envelopes["tempo"] - MIN_BPM) / (MAX_BPM - MIN_BPM), 0.0, 1.0)
+    silent = _moving_average(loudness, 3) < SILENCE_LEVEL
+    smoothing = max(1, int(round(SMOOTHING_SECONDS / resolution)))
+
+    curves = {}
+    for name in functions:
+        if name not in FUNCTION_MIX:
+            continue
+        w_loud, w_density, w_rhythm = FUNCTION_MIX[name]
+        mix = _moving_average(w_loud * loudness + w_density * density + w_rhythm * rhythm, smoothing)
+        curve = np.clip(np.rint(1 + (MAX_STRENGTH - 1) * mix), 1, MAX_STRENGTH)
+        curve[silent] = 0
+        curves[name] = curve.astype(np.int16)
+    return curves
+
+
+def _describe(envelopes: Dict[str, np.ndarray], k: int) -> str:
+    return (f"音訊包絡：響度 {envelopes['loudness'][k]:.2f}，起音 {envelopes['onset_rate'][k]:.1f}/秒，"
+            f"節奏 {envelopes['tempo'][k]:.0f} BPM (穩定度 {envelopes['periodicity'][k]:.2f})")
+
+
+def curves_to_events(envelopes: Dict[str, np.ndarray], curves: Dict[str, np.ndarray],
+                     min_change: int = MIN_CHANGE) -> List[Dict[str, Any]]:
+    """將強度曲線轉為事件：變化達 min_change 級、進出靜音或超過 HEARTBEAT_SECONDS 時產生"""
+    times = envelopes["times"]
+    if not curves or len(times) == 0:
+        return []
+    names = list(curves)
+    matrix = np.stack([curves[name] for name in names], axis=1)
+    events: List[Dict[str, Any]] = []
+    last: Optional[np.ndarray] = None
+    last_time = float("-inf")
+    for k in range(len(times)):
+        row = matrix[k]
+        silent = not row.any()
+        if last is not None:
+            was_silent = not last.any()
+            if silent and was_silent:
+                continue
+            if silent == was_silent and np.abs(row - last).max() < min_change \
+                    and times[k] - last_time < HEARTBEAT_SECONDS:
+                continue
+        strengths = {} if silent else {name: int(value) for name, value in zip(names, row)}
+        events.append(make_event(float(times[k]), strengths, 0, _describe(envelopes, k)))
+        last, last_time = row, times[k]
+    end_time = float(times[-1]) + (times[1] - times[0] if len(times) > 1 else DEFAULT_RESOLUTION)
+    return fill_durations(events, end_time)
+
+
+def densify_events(events: List[Dict[str, Any]], envelopes: Dict[str, np.ndarray], curves: Dict[str, np.ndarray],
+                   weight: float = DEFAULT_BLEND_WEIGHT, min_change: int = MIN_CHANGE) -> List[Dict[str, Any]]:
+    """
+    以音訊曲線加密既有事件 (例如 LLM 或規則引擎的結果)。
+
+    原事件全部保留並決定使用的功能與基準強度；在兩個事件之間插入跟隨音訊起伏的事件，
+    強度為 (1 - weight) × 原強度 + weight × 音訊強度。Stop 之後到下一個事件之間不插入。
+    有插入事件時，原事件的 timeSec 縮短為到第一個插入事件的間隔，避免與插入事件的時間窗重疊。
+    """
+    times = envelopes["times"]
+    anchors = sort_events(events)
+    result: List[Dict[str, Any]] = []
+    for i, anchor in enumerate(anchors):
+        anchor = dict(anchor, command=dict(anchor.get("command") or {}))
+        result.append(anchor)
+        base = event_strengths(anchor)
+        start = event_time(anchor)
+        if not base or not curves:
+            continue
+        if i + 1 < len(anchors):
+            end = event_time(anchors[i + 1])
+        else:
+            end = start + float((anchor.get("command") or {}).get("timeSec") or 0)
+
+        inserted = []
+        last = base
+        for k in np.flatnonzero((times > start) & (times < end)):
+            strengths = {}
+            for name, value in base.items():
+                curve = curves.get(name)
+                if curve is None:
+                    strengths[name] = value
+                else:
+                    strengths[name] = clamp_strength((1 - weight) * value + weight * max(1, int(curve[k])))
+            if max(abs(strengths[name] - last.get(name, 0)) for name in strengths) >= min_change:
+                inserted.append(make_event(float(times[k]), strengths, 0, "音訊加密：" + _describe(envelopes, k)))
+                last = strengths
+        if inserted:
+            anchor["command"]["timeSec"] = round(event_time(inserted[0]) - start, 3)
+            result.extend(fill_durations(inserted, end, min_seconds=0.0))
+    return result
+
+
+@traced("envelope.analyze", cat="audio")
+def analyze_audio(audio_path: str, functions: List[str], resolution: float = DEFAULT_RESOLUTION) -> Dict[str, Any]:
+    """
+    解碼音訊並以包絡產生事件。
+
+    Returns:
+        Dict[str, Any]: {"events": [...]}，另含 'envelopes' 與 'curves' (供混合使用，不會寫入分析文件)。
+    """
+    samples = decode_pcm(audio_path, SAMPLE_RATE)
+    envelopes = compute_envelopes(samples, SAMPLE_RATE, resolution)
+    curves = strength_curves(envelopes, functions, resolution)
+    events = curves_to_events(envelopes, curves)
+    logger.info(f"音訊包絡分析完成：{len(samples) / SAMPLE_RATE:.1f} 秒音訊，生成 {len(events)} 個事件")
+    return {"events": events, "envelopes": envelopes, "curves": curves}
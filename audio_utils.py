@@ -0,0 +1,260 @@
+import os
+import re
+import subprocess
+import logging
+import threading
+from typing import List, Tuple, Optional, Iterable, Callable
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 只在 PCM 解碼/訊號分析時需要
+    np = None
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# iter_pcm_blocks 每次讀取的長度 (秒)
+PCM_BLOCK_SECONDS = 30.0
+
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+
+
+@traced("ffprobe.duration", cat="ffmpeg")
+def probe_duration(audio_path: str) -> Optional[float]:
+    """使用 ffprobe 取得媒體文件長度 (秒)，失敗時返回 None"""
+    cmd = [
+        "ffprobe", "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        audio_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        return float(result.stdout.strip())
+    except (subprocess.CalledProcessError, ValueError, FileNotFoundError) as e:
+        logger.error(f"無法取得音訊長度 ({audio_path}): {e}")
+        return None
+
+
+@traced("ffmpeg.silencedetect", cat="ffmpeg")
+def detect_silences(audio_path: str, noise_db: float = -30.0, min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """
+    使用 ffmpeg silencedetect 濾鏡找出靜音區間。
+
+    Args:
+        audio_path (str): 音訊文件路徑。
+        noise_db (float): 視為靜音的音量門檻 (dB)。
+        min_silence (float): 最短靜音長度 (秒)。
+
+    Returns:
+        List[Tuple[float, float]]: (開始秒數, 結束秒數) 的列表。
+    """
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-i", audio_path,
+        "-af", f"silencedetect=noise={noise_db}dB:d={min_silence}",
+        "-f", "null", "-",
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.warning(f"靜音偵測失敗 (ffmpeg exit code: {result.returncode})，將使用固定長度切割。")
+        return []
+
+    silences = []
+    current_start = None
+    for line in result.stderr.splitlines():
+        start_match = _SILENCE_START.search(line)
+        if start_match:
+            current_start = max(0.0, float(start_match.group(1)))
+            continue
+        end_match = _SILENCE_END.search(line)
+        if end_match and current_start is not None:
+            silences.append((current_start, float(end_match.group(1))))
+            current_start = None
+    return silences
+
+
+def plan_split_points(duration: float, chunk_seconds: float, silences: List[Tuple[float, float]],
+                      tolerance: float = 0.25) -> List[float]:
+    """
+    根據目標分段長度和靜音區間決定切割點。
+
+    每個切割點優先選在目標位置附近 (± chunk_seconds * tolerance) 的靜音中點，
+    找不到時直接在目標位置切割。
+
+    Returns:
+        List[float]: 各分段的起始秒數 (第一個永遠是 0.0)。
+    """
+    points = [0.0]
+    window = chunk_seconds * tolerance
+    midpoints = [(start + end) / 2.0 for start, end in silences]
+    while duration - points[-1] > chunk_seconds + window:
+        target = points[-1] + chunk_seconds
+        candidates = [m for m in midpoints if abs(m - target) <= window and m > points[-1]]
+        split = min(candidates, key=lambda m: abs(m - target)) if candidates else target
+        points.append(split)
+    return points
+
+
+@traced("ffmpeg.cut", cat="ffmpeg")
+def cut_segment(audio_path: str, output_path: str, start: float, duration: Optional[float]) -> None:
+    """使用 ffmpeg 無損切出 [start, start + duration) 的音訊片段"""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-ss", f"{start:.3f}", "-i", audio_path]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += ["-vn", "-acodec", "copy", output_path]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        raise RuntimeError(f"切割音訊片段失敗 (ffmpeg exit code: {result.returncode}): {result.stderr.strip()}")
+
+
+def _mp3_output_args(output_path: str) -> List[str]:
+    return ["-vn", "-acodec", "libmp3lame", "-q:a", "2", "-f", "mp3", output_path]
+
+
+@traced("ffmpeg.extract_stream", cat="ffmpeg")
+def extract_audio_stream(chunks: Iterable[bytes], output_path: str,
+                         output_args: Optional[Callable[[str], List[str]]] = None,
+                         input_args: Optional[List[str]] = None) -> int:
+    """
+    將媒體位元組串流直接送進 ffmpeg 的 stdin，只把音訊寫入磁碟。
+
+    下載與轉碼同時進行，不需要先保存完整的影片檔。輸出先寫到暫存檔，
+    ffmpeg 成功結束後才改名為 output_path。
+
+    Args:
+        chunks (Iterable[bytes]): 依序產生的媒體資料 (例如 HLS 分段)。
+        output_path (str): 音訊輸出路徑。
+        output_args (Optional[Callable]): 接收輸出路徑並返回 ffmpeg 輸出參數的函數，預設為 MP3。
+        input_args (Optional[List[str]]): 放在 -i 之前的輸入參數 (例如原始 PCM 的格式說明)。
+
+    Returns:
+        int: 送進 ffmpeg 的位元組總數。
+
+    Raises:
+        RuntimeError: ffmpeg 返回非零狀態碼時，附上 stderr 的最後幾行。
+    """
+    temp_path = output_path + ".part"
+    args = (output_args or _mp3_output_args)(temp_path)
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"] + (input_args or []) + ["-i", "pipe:0"] + args
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    # 在背景讀取 stderr，避免管線緩衝區塞滿造成死結
+    stderr_lines: List[bytes] = []
+    stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    stderr_thread.start()
+
+    total = 0
+    broken_pipe = False
+    try:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            try:
+                process.stdin.write(chunk)
+            except BrokenPipeError:
+                broken_pipe = True
+                break
+            total += len(chunk)
+    except BaseException:
+        process.kill()
+        process.wait()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            broken_pipe = True
+
+    return_code = process.wait()
+    stderr_thread.join(timeout=5)
+    stderr_text = b"".join(stderr_lines).decode("utf-8", errors="replace").strip()
+    if return_code != 0 or broken_pipe or not os.path.exists(temp_path):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        tail = "\n".join(stderr_text.splitlines()[-5:])
+        raise RuntimeError(f"ffmpeg 串流轉檔失敗 (exit code: {return_code}): {tail}")
+    os.replace(temp_path, output_path)
+    logger.info(f"串流轉檔完成：輸入 {total / 1024 / 1024:.1f} MB，輸出 {os.path.getsize(output_path) / 1024 / 1024:.1f} MB")
+    return total
+
+
+@traced("ffmpeg.extract_file", cat="ffmpeg")
+def extract_audio_file(input_path: str, output_path: str,
+                       output_args: Optional[Callable[[str], List[str]]] = None):
+    """從本地媒體文件提取音訊，失敗時拋出帶 stderr 內容的 RuntimeError"""
+    args = (output_args or _mp3_output_args)(output_path)
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-i", input_path] + args
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0 or not os.path.exists(output_path):
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        tail = "\n".join(result.stderr.strip().splitlines()[-5:])
+        raise RuntimeError(f"音訊提取失敗 (ffmpeg exit code: {result.returncode}): {tail}")
+
+
+@traced("ffmpeg.decode_pcm", cat="ffmpeg")
+def decode_pcm(input_path: str, sample_rate: int = 16000):
+    """
+    使用 ffmpeg 將媒體文件解碼為單聲道 float32 PCM。
+
+    Returns:
+        np.ndarray: 範圍 [-1, 1] 的取樣值。
+    """
+    if np is None:
+        raise ImportError("PCM 解碼需要 NumPy，請運行 'pip install numpy'")
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", input_path,
+           "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"]
+    result = subprocess.run(cmd, capture_output=True)
+    if result.returncode != 0:
+        tail = "\n".join(result.stderr.decode("utf-8", errors="replace").strip().splitlines()[-5:])
+        raise RuntimeError(f"PCM 解碼失敗 (ffmpeg exit code: {result.returncode}): {tail}")
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 32768.0
+
+
+def iter_pcm_blocks(input_path: str, sample_rate: int = 16000, block_seconds: float = PCM_BLOCK_SECONDS):
+    """
+    使用 ffmpeg 將媒體文件解碼為單聲道 s16le PCM，逐塊產生 int16 取樣。
+
+    與 decode_pcm 不同，不會一次把整個文件轉成 float32 陣列；呼叫端可以逐塊分析。
+
+    Raises:
+        RuntimeError: ffmpeg 返回非零狀態碼時，附上 stderr 的最後幾行。
+    """
+    if np is None:
+        raise ImportError("PCM 解碼需要 NumPy，請運行 'pip install numpy'")
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", input_path,
+           "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    # 在背景讀取 stderr，避免管線緩衝區塞滿造成死結
+    stderr_lines: List[bytes] = []
+    stderr_thread = threading.Thread(target=lambda: stderr_lines.extend(process.stderr), daemon=True)
+    stderr_thread.start()
+
+    block_bytes = max(2, int(block_seconds * sample_rate) * 2)
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                finished = True
+                break
+            yield np.frombuffer(data[:len(data) // 2 * 2], dtype="<i2")
+    finally:
+        if not finished:
+            # 呼叫端提前結束迭代或處理時發生例外
+            process.kill()
+        process.stdout.close()
+        return_code = process.wait()
+        stderr_thread.join(timeout=5)
+    if return_code != 0:
+        tail = "\n".join(b"".join(stderr_lines).decode("utf-8", errors="replace").strip().splitlines()[-5:])
+        raise RuntimeError(f"PCM 解碼失敗 (ffmpeg exit code: {return_code}): {tail}")
+
+
+def pcm_input_args(sample_rate: int = 16000) -> List[str]:
+    """將 s16le 單聲道 PCM 送進 ffmpeg stdin 時使用的輸入參數"""
+    return ["-f", "s16le", "-ar", str(sample_rate), "-ac", "1"]
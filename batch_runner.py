@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+from typing import List, Dict, Any, Optional, Callable
+
+import metrics
+import tracing
+import pipeline_tasks
+from config import get_setting, setup_logging
+from jobs import Job, JobEvent, JobEventType, JobOptions, run_stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 2
+DEFAULT_STAGE_WORKERS = {"download": 2, "extract": 2, "transcribe": 2, "analyze": 2}
+
+_STOP = object()
+
+
+class PipelineStage:
+    """
+    管線中的一個階段：固定數量的工作執行緒從有界隊列取出項目處理後交給下一階段。
+
+    有界隊列提供背壓：下游較慢時上游會阻塞，不會無限制地堆積已下載的文件。
+    """
+
+    def __init__(self, name: str, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            name (str): 階段名稱 (見 jobs.STAGE_ROUTES)。
+            workers (int): 此階段的並行數。
+            queue_size (int): 輸入隊列的容量。
+        """
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self.next_stage: Optional["PipelineStage"] = None
+        self.on_event: Optional[Callable[[JobEvent], None]] = None
+        self.on_done: Optional[Callable[[Job], None]] = None
+        self._producers = 1  # 送入項目的來源 (輸入端) 數量
+        self._running = self.workers
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+
+    def connect(self, next_stage: "PipelineStage"):
+        """將此階段的輸出接到 next_stage"""
+        self.next_stage = next_stage
+        with next_stage._lock:
+            next_stage._producers += 1
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, job: Job):
+        self.queue.put(job)
+
+    def producer_done(self):
+        """某個上游不會再送入項目；所有上游結束後通知工作執行緒退出"""
+        with self._lock:
+            self._producers -= 1
+            finished = self._producers == 0
+        if finished:
+            for _ in range(self.workers):
+                self.queue.put(_STOP)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                break
+            if run_stage(job, self.name, self.on_event) and job.status == "running":
+                self.next_stage.put(job)
+            else:
+                self.on_done(job)
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.next_stage is not None:
+            self.next_stage.producer_done()
+
+
+class BatchPipeline:
+    """
+    無介面的批次處理管線：下載 → 提取 → 轉錄 → 分析。
+
+    各階段並行運作，因此第 N+1 個項目下載時，第 N 個項目在轉錄、第 N-1 個項目在分析。
+    項目依輸入類型從對應的階段進入 (網址 → 下載、視訊 → 提取、音訊 → 轉錄、SRT → 分析)。
+    """
+
+    def __init__(self, toy_key: str, stage_workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, profile: str = pipeline_tasks.TRANSCODE_PROFILE,
+                 use_vad: bool = pipeline_tasks.USE_VAD, engine: str = pipeline_tasks.ANALYSIS_ENGINE,
+                 blend_audio: bool = pipeline_tasks.BLEND_AUDIO, resume: bool = pipeline_tasks.DOWNLOAD_RESUME,
+                 analysis_mode: str = pipeline_tasks.ANALYSIS_MODE):
+        """
+        Args:
+            toy_key (str): 分析使用的玩具型號 (toys_funcs.json 的鍵)。
+            stage_workers (Optional[Dict[str, int]]): 各階段的並行數，未指定的使用 DEFAULT_STAGE_WORKERS。
+            queue_size (int): 各階段輸入隊列的容量。
+            profile (str): 轉碼設定檔。
+            use_vad (bool): 轉錄前是否使用語音活動偵測。
+            engine (str): 分析引擎 ('llm'、'rules' 或 'audio')。
+            blend_audio (bool): 是否以音訊包絡加密字幕分析的事件。
+            resume (bool): 網址下載是否暫存分段以便中斷後續傳。
+            analysis_mode (str): LLM 分析方式 (見 pipeline_tasks.ANALYSIS_MODES)。
+        """
+        self.options = JobOptions(toy_key=toy_key, profile=profile, use_vad=use_vad, engine=engine,
+                                  blend_audio=blend_audio, resume=resume, analysis_mode=analysis_mode)
+        workers = dict(DEFAULT_STAGE_WORKERS, **(stage_workers or {}))
+        self.jobs: List[Job] = []
+
+        self.stages = {name: PipelineStage(name, count, queue_size) for name, count in workers.items()}
+        # 音訊包絡引擎不需要轉錄，取得音訊後直接進入分析
+        after_audio = self.stages["analyze" if engine == "audio" else "transcribe"]
+        self.stages["download"].connect(after_audio)
+        self.stages["extract"].connect(after_audio)
+        self.stages["transcribe"].connect(self.stages["analyze"])
+        for stage in self.stages.values():
+            stage.on_event = self._on_event
+            stage.on_done = self._finish
+
+    def _on_event(self, event: JobEvent):
+        name = os.path.basename(event.job.source)
+        if event.type == JobEventType.MESSAGE:
+            logger.info(f"[{name}] {event.message}")
+        elif event.type == JobEventType.STAGE_COMPLETED:
+            logger.info(f"[{name}] {event.stage} 完成 ({event.elapsed:.1f} 秒)")
+
+    def _finish(self, job: Job):
+        logger.info(f"[{os.path.basename(job.source)}] {job.status} ({job.total_seconds:.1f} 秒)")
+
+    # --- 執行 ---
+    def run(self, sources: List[str]) -> List[Job]:
+        """
+        處理所有輸入並等待完成。
+
+        Returns:
+            List[Job]: 每個輸入一個工作 (依輸入順序)，包含狀態、各階段耗時和產出文件。
+        """
+        pipeline_tasks.ensure_output_dirs()
+        for stage in self.stages.values():
+            stage.start()
+
+        for source in sources:
+            job = Job(source, self.options)
+            self.jobs.append(job)
+            if not job.stages or (job.kind != "url" and not os.path.exists(source)):
+                job.status = "failed"
+                job.error = "無法辨識的輸入或文件不存在"
+                job.finished_at = time.perf_counter()
+                self._finish(job)
+                continue
+            job.status = "running"
+            self.stages[job.next_stage(None)].put(job)
+
+        # 輸入端結束：依拓撲順序關閉各階段
+        for stage in self.stages.values():
+            stage.producer_done()
+        for stage in self.stages.values():
+            stage.join()
+        return self.jobs
+
+
+def read_sources(args_sources: List[str], list_file: Optional[str]) -> List[str]:
+    """合併命令列參數與清單文件 (每行一個來源，# 開頭為註解) 中的輸入"""
+    sources = list(args_sources)
+    if list_file:
+        with open(list_file, 'r', encoding='utf-8') as f:
+            sources += [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+    return sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批次處理網址、視訊、音訊或 SRT 文件 (下載/提取/轉錄/分析管線)")
+    parser.add_argument("sources", nargs="*", help="網址或本地文件路徑")
+    parser.add_argument("--input-list", help="每行一個來源的清單文件")
+    parser.add_argument("--toy", default=get_setting('TOY_KEY', 'lush4'), help="目標玩具型號 (toys_funcs.json 的鍵)")
+    parser.add_argument("--profile", default=pipeline_tasks.TRANSCODE_PROFILE, help="轉碼設定檔")
+    parser.add_argument("--vad", action="store_true", default=pipeline_tasks.USE_VAD, help="轉錄前使用語音活動偵測")
+    parser.add_argument("--engine", choices=("llm", "rules", "audio"), default=pipeline_tasks.ANALYSIS_ENGINE,
+                        help="分析引擎：llm (OpenAI)、rules (本地規則引擎，離線且快速) 或 audio (音訊包絡，不需要轉錄)")
+    parser.add_argument("--blend-audio", action="store_true", default=pipeline_tasks.BLEND_AUDIO,
+                        help="以音訊包絡加密 llm/rules 的事件")
+    parser.add_argument("--analysis-mode", choices=pipeline_tasks.ANALYSIS_MODES, default=pipeline_tasks.ANALYSIS_MODE,
+                        help="LLM 分析方式：single (單次請求)、windowed (重疊窗口並行分析)、stream (串流，事件邊解析邊交出) "
+                             "或 auto (超過預算時改用窗口)")
+    parser.add_argument("--resume", action="store_true", default=pipeline_tasks.DOWNLOAD_RESUME,
+                        help="網址下載時將分段暫存到磁碟，中斷後重新執行可從檢查點續傳")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE, help="各階段輸入隊列容量")
+    for stage, default in DEFAULT_STAGE_WORKERS.items():
+        parser.add_argument(f"--{stage}-workers", type=int, default=default, help=f"{stage} 階段並行數")
+    parser.add_argument("--report", help="將結果摘要寫入 JSON 文件")
+    parser.add_argument("--trace", default=get_setting('TRACE_FILE'),
+                        help="將 Chrome/Perfetto 追蹤 (trace-event JSON) 寫入此文件")
+    parser.add_argument("--metrics-dir", default=get_setting('METRICS_DIR'),
+                        help="在此目錄寫入本次執行的指標報告 (JSON 與 Prometheus 文字格式)")
+    args = parser.parse_args()
+
+    setup_logging(fmt='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+
+    sources = read_sources(args.sources, args.input_list)
+    if not sources:
+        parser.error("請提供至少一個來源")
+
+    stage_workers = {stage: getattr(args, f"{stage}_workers") for stage in DEFAULT_STAGE_WORKERS}
+    pipeline = BatchPipeline(args.toy, stage_workers, args.queue_size, args.profile, args.vad, args.engine,
+                             args.blend_audio, args.resume, args.analysis_mode)
+    metrics.reset()
+    if args.trace:
+        tracing.enable()
+    started = time.perf_counter()
+    jobs = pipeline.run(sources)
+    if args.trace:
+        tracing.export(args.trace)
+    summary = {
+        "total_seconds": round(time.perf_counter() - started, 3),
+        "succeeded": sum(1 for job in jobs if job.status == "done"),
+        "failed": sum(1 for job in jobs if job.status != "done"),
+        "jobs": [job.to_dict() for job in jobs],
+        "metrics": metrics.report()["derived"],
+    }
+    if args.metrics_dir:
+        json_path, prom_path = metrics.write_reports(args.metrics_dir, time.strftime("metrics_%Y%m%d_%H%M%S"))
+        logger.info(f"指標報告已寫入 {json_path} 與 {prom_path}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+    sys.exit(0 if summary["failed"] == 0 else 1)
+
+if __name__ == "__main__":
+    main()
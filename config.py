@@ -0,0 +1,73 @@
+import os
+import logging
+import threading
+from typing import Optional
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+_lock = threading.Lock()
+_env_loaded = False
+_logging_configured = False
+
+
+def load_env():
+    """載入 .env (整個行程只執行一次)；python-dotenv 未安裝時只使用系統環境變數"""
+    global _env_loaded
+    with _lock:
+        if _env_loaded:
+            return
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
+        _env_loaded = True
+
+
+def setup_logging(filename: Optional[str] = None, level: int = logging.INFO, fmt: str = LOG_FORMAT):
+    """
+    設定根 logger (整個行程只執行一次，由各程式入口呼叫；函式庫模組只取得自己的 logger)。
+
+    Args:
+        filename (Optional[str]): 日誌文件 (附加模式)；None 表示輸出到 stderr。
+        level (int): 日誌等級。
+        fmt (str): 日誌格式。
+    """
+    global _logging_configured
+    with _lock:
+        if _logging_configured:
+            return
+        if filename:
+            logging.basicConfig(level=level, format=fmt, filename=filename, filemode='a')
+        else:
+            logging.basicConfig(level=level, format=fmt)
+        _logging_configured = True
+
+
+def get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """讀取設定 (環境變數或 .env)"""
+    load_env()
+    return os.getenv(name, default)
+
+
+def get_bool_setting(name: str, default: bool = False) -> bool:
+    value = get_setting(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def require_openai_api_key() -> str:
+    """
+    取得 OpenAI API Key，並設定給 openai 模組 (只在真正需要呼叫 API 時使用)。
+
+    Raises:
+        ValueError: 未設置 OPENAI_API_KEY 時。
+    """
+    api_key = get_setting('OPENAI_API_KEY')
+    if not api_key:
+        logging.getLogger(__name__).error("OpenAI API Key 未在環境變數中設置！")
+        raise ValueError("請設置 OPENAI_API_KEY 環境變數或將其放入 .env 文件")
+    import openai
+    openai.api_key = api_key
+    return api_key
@@ -1,47 +1,185 @@
 import json
+import time
+import asyncio
 import openai
 import logging
 import os  # Import os
+import textwrap
 import traceback # Import traceback
-from typing import List, Dict, Any, Optional
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple, Callable, AsyncIterator
 import re
-from dotenv import load_dotenv
+from disk_cache import DiskCache, hash_text
+from srt_utils import parse_srt, split_into_windows, compact_cues, compact_srt, format_compact
+from token_budget import estimate_tokens, estimate_messages_tokens, check_budget, usage_to_dict, add_usage
+import metrics
+import tracing
+from rule_analyzer import analyze_transcript, resolve_functions
+from event_utils import event_time, dedupe_events, smooth_events, IncrementalEventParser
+from timeline_format import write_timeline
+from config import require_openai_api_key
+
+# 取得 logger (日誌設定由程式入口透過 config.setup_logging 負責)
+logger = logging.getLogger(__name__)
 
-load_dotenv() # <--- 確保這一行在讀取 API Key 之前被呼叫
+DEFAULT_MODEL = "o4-mini"
+DEFAULT_MAX_COMPLETION_TOKENS = 14000
+# 單次請求的輸入 token 預算 (系統提示 + 字幕)；None 或 0 表示不限制
+DEFAULT_MAX_INPUT_TOKENS = 120000
+DEFAULT_WINDOW_SECONDS = 300
+DEFAULT_OVERLAP_SECONDS = 30
+DEFAULT_MAX_CONCURRENCY = 4
+# 分析引擎：'llm' 呼叫 OpenAI；'rules' 為本地規則引擎 (離線、不到一秒，適合預覽)；
+# 'audio' 直接從音訊的響度/起音/節奏包絡產生強度曲線 (不需要字幕)
+ENGINE_LLM = "llm"
+ENGINE_RULES = "rules"
+ENGINE_AUDIO = "audio"
+ANALYSIS_ENGINES = (ENGINE_LLM, ENGINE_RULES, ENGINE_AUDIO)
+
+# --- SYSTEM PROMPT for major events (transitions are added locally by smooth_events) ---
+# 靜態部分放在最前面且不隨玩具改變，讓 API 的提示快取 (相同前綴) 可以命中；玩具功能說明附加在最後。
+# 修改此提示會改變 PROMPT_VERSION，舊的分析快取會自動失效
+SYSTEM_PROMPT = """
+你是一個高度專業的內容分析助手，負責對成人內容的字幕文本記錄進行 **仔細且細膩** 的分析。
+輸入的文本是精簡字幕，記錄了對話和聲音：每行一條，格式為 "HH:MM:SS,mmm 文字"；
+"×N (至 HH:MM:SS,mmm)" 表示同一句話或聲音連續重複 N 次直到該時間。
+
+**只輸出主要事件。** 過渡事件、漸強/漸弱、停止前後的漸變、維持狀態的重複事件以及持續時間
+都由本地程式自動補上，請 **不要** 輸出這些事件。每個事件的強度會持續到下一個事件；要停止請輸出 Stop。
+
+請仔細分析字幕內容，找出以下主要事件：
+
+1. **說話者給出的直接指令** (最優先):
+   - 留意文本中任何關於 **如何操作玩具** 的明確指示（例如："開大一點"、"停下"、"用 XX 強度"、"加快"等）
+   - 當偵測到這類指令時，生成的 `command` **必須直接反映該指令**
+   - 具體強度按指令執行（如"用 15 級"）；相對指令（如"開大點"）要基於當前強度調整
+
+2. **情緒和動作的轉折點**:
+   - 在沒有直接指令的區間，找出轉折點、情緒波動、關鍵動作描述、節奏或強度的明顯變化
+   - 注意聲音、呼吸、語氣等細節暗示的情緒變化
+   - 狀態沒有改變時不需要重複輸出事件
+
+基礎可用的控制功能類型包括（但請 **嚴格優先** 使用本提示最後為特定玩具指定的功能，**並優先執行直接指令**）：
+- Vibrate: 震動 (強度 1-20)
+- Rotate: 旋轉 (強度 1-20)
+- Pump: 泵送/收縮 (強度 1-20)
+- Thrusting: 抽插 (強度 1-20)
+- All: 設置其他功能 (強度 1-20)
+- Stop: 停止
+
+對於每一個主要事件，請提供：
+
+1. **精確的開始時間戳 (timestamp)**: 使用對應字幕行開頭的 **開始時間** (格式 "HH:MM:SS,mmm")
+2. **簡短的描述 (description)**: 一句話說明判斷依據（直接指令/情緒/動作）
+3. **功能控制 (action)**: 例如 "Vibrate:12" 或 "Vibrate:10,Rotate:6"
+   - 低強度 (1-8): 溫柔、挑逗、緩和
+   - 中強度 (9-15): 興奮上升、節奏加快
+   - 高強度 (16-20): 高潮、激烈動作
+   - 充分利用玩具支援的功能組合
+4. **循環模式設置**（可選，適用於重複性動作或節奏感強的場景）: loopRunningSec、loopPauseSec
+
+以JSON格式返回分析結果 (**確保 timestamp 是精確的 "HH:MM:SS,mmm" 開始時間格式**):
+{
+    "events": [
+        {
+            "timestamp": "HH:MM:SS,mmm",
+            "description": "簡短描述...",
+            "command": {
+                "command": "Function",
+                "action": "指令...",
+                "loopRunningSec": 運行秒數(數字, 可選),
+                "loopPauseSec": 暫停秒數(數字, 可選),
+                "apiVer": 1
+            }
+        }
+    ]
+}
+
+請特別注意：
+1. 強度值必須在 1-20 範圍內
+2. command 字典結構必須完整
+3. 只輸出主要事件，不要輸出過渡事件或重複的維持事件
+"""
+
+PROMPT_VERSION = hash_text(SYSTEM_PROMPT)[:12]
+
+
+@lru_cache(maxsize=32)
+def build_system_prompt(capabilities_prompt: str) -> str:
+    """將玩具功能說明附加在靜態系統提示之後 (結果會被快取)"""
+    capabilities_prompt = textwrap.dedent(capabilities_prompt).strip()
+    if not capabilities_prompt:
+        return SYSTEM_PROMPT.strip()
+    return f"{SYSTEM_PROMPT.strip()}\n\n{capabilities_prompt}"
+
+
+def format_run_stats(stats: Dict[str, Any]) -> str:
+    """將 ContentAnalyzer.last_run_stats 格式化為一行摘要"""
+    if stats.get("from_cache"):
+        return "分析結果來自快取，未送出請求。"
+    if stats.get("mode") == ENGINE_RULES:
+        return f"規則引擎分析，生成 {stats.get('events', 0)} 個事件，耗時 {stats.get('latency_seconds', 0.0):.3f} 秒"
+    if stats.get("mode") == ENGINE_AUDIO:
+        return (f"音訊包絡分析 {stats.get('audio_seconds', 0.0):.0f} 秒音訊，生成 {stats.get('events', 0)} 個事件，"
+                f"耗時 {stats.get('latency_seconds', 0.0):.2f} 秒")
+    raw, compact = stats.get("raw_transcript_tokens", 0), stats.get("compact_transcript_tokens", 0)
+    saved_pct = (1 - compact / raw) * 100 if raw else 0.0
+    return (f"字幕精簡 {raw} → {compact} tokens (節省 {saved_pct:.0f}%)，"
+            f"實際輸入 {stats.get('prompt_tokens', 0)} tokens (提示快取命中 {stats.get('cached_tokens', 0)})，"
+            f"輸出 {stats.get('completion_tokens', 0)} tokens ({stats.get('major_events', 0)} 個主要事件 → "
+            f"平滑後 {stats.get('events', 0)} 個)，{stats.get('requests', 0)} 次請求，"
+            f"耗時 {stats.get('latency_seconds', 0.0):.1f} 秒")
+
+
+def merge_window_events(windows: List[Dict[str, Any]], window_events: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    合併各窗口的分析事件。
+
+    每個窗口只保留落在自身負責區間內的事件，並去除重疊區的重複事件；
+    窗口交界處的過渡由 smooth_events 統一補上。
+    """
+    merged: List[Dict[str, Any]] = []
+    for window, events in zip(windows, window_events):
+        merged.extend(e for e in events
+                      if event_time(e) is not None and window["own_start"] <= event_time(e) < window["own_end"])
+    return dedupe_events(merged)
 
-# 取得 logger
-# 建議在主腳本中配置 logger，這裡只獲取
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s') # Added basicConfig for standalone testing
-logger = logging.getLogger(__name__)
 
 class ContentAnalyzer:
     """分析轉錄文本內容並生成玩具控制建議的類 (可根據玩具名稱查詢功能)"""
 
-    def __init__(self, functions_json_path: str = 'toys_funcs.json'): # Corrected default path if needed
+    def __init__(self, functions_json_path: str = 'toys_funcs.json', # Corrected default path if needed
+                 model: str = DEFAULT_MODEL, cache: Optional[DiskCache] = None,
+                 max_input_tokens: Optional[int] = DEFAULT_MAX_INPUT_TOKENS,
+                 max_completion_tokens: int = DEFAULT_MAX_COMPLETION_TOKENS, engine: str = ENGINE_LLM):
         """
         初始化 ContentAnalyzer 並加載玩具功能數據。
 
         Args:
             functions_json_path (str): 包含玩具功能數據的 JSON 文件路徑。
+            model (str): 用於分析的 OpenAI 模型名稱。
+            cache (Optional[DiskCache]): 分析結果快取；None 表示不使用快取。
+            max_input_tokens (Optional[int]): 單次請求的輸入 token 預算，超過時拋出 TokenBudgetExceeded。
+            max_completion_tokens (int): 單次請求的輸出 token 上限。
+            engine (str): 分析引擎，'llm'、'rules' 或 'audio' (後兩者不需要 API Key)。
         """
+        if engine not in ANALYSIS_ENGINES:
+            raise ValueError(f"未知的分析引擎: {engine} (可用: {', '.join(ANALYSIS_ENGINES)})")
+        self.engine = engine
         self.analysis_result = {}
+        self.model = model
+        self.max_input_tokens = max_input_tokens
+        self.max_completion_tokens = max_completion_tokens
+        self.cache = cache
+        self.last_from_cache = False
+        self.last_run_stats: Dict[str, Any] = {}
         self.toy_functions_data = self._load_toy_functions(functions_json_path)
         if not self.toy_functions_data:
              logger.warning(f"未能從 {functions_json_path} 加載玩具功能數據。分析將不考慮特定玩具功能。")
 
-        # Removed hardcoded API key setting
-        # os.environ["OPENAI_API_KEY"] = "sk-proj-..."
-
-        # Ensure dotenv is loaded before this point (typically in the main script or at the top)
-        # Load the API key from environment variable
-        OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-        if not OPENAI_API_KEY:
-            # Optionally, make this less strict if the class might be used without analysis
-            logger.error("OpenAI API Key 未在環境變數中設置！")
-            raise ValueError("請設置 OPENAI_API_KEY 環境變數或將其放入 .env 文件")
-
-        # Set the API key for the openai library
-        openai.api_key = OPENAI_API_KEY
+        # API Key 由 config 統一讀取 (.env 只載入一次)，並設定給 openai 模組
+        if engine == ENGINE_LLM:
+            require_openai_api_key()
 
     def _load_toy_functions(self, json_path: str) -> Optional[Dict[str, Any]]:
         """從 JSON 文件加載玩具功能數據"""
@@ -67,21 +205,11 @@ class ContentAnalyzer:
             traceback.print_exc()
             return None
 
-    def analyze_content(self, transcript: str, toy_key: Optional[str] = None) -> Dict[str, Any]:
-        """
-        使用 OpenAI GPT 分析轉錄文本，根據提供的玩具 key (名稱) 查找其功能，並給出控制建議。
-
-        Args:
-            transcript (str): 要分析的文本記錄。
-            toy_key (Optional[str]): 在 JSON 文件中定義的玩具 key (例如 "nora", "lush4")。
-
-        Returns:
-            Dict[str, Any]: 包含分析結果的字典。
-        """
+    def _resolve_capabilities(self, toy_key: Optional[str]) -> Tuple[Optional[List[str]], str]:
+        """根據 toy_key 查找玩具功能，返回 (功能列表, 用於提示的功能說明)"""
         toy_capabilities: Optional[List[str]] = None
         capabilities_prompt = ""
 
-        # --- 根據 toy_key 查找功能 ---
         if toy_key and self.toy_functions_data:
             toy_data = self.toy_functions_data.get(toy_key)
             if toy_data and "functions" in toy_data:
@@ -100,155 +228,224 @@ class ContentAnalyzer:
                 logger.warning(f"在功能數據中未找到名為 '{toy_key}' 的玩具或其功能列表。")
         elif toy_key:
              logger.warning(f"提供了玩具 key '{toy_key}' 但未能加載功能數據。")
-        # -----------------------------
+        return toy_capabilities, capabilities_prompt
+
+    def _cache_key(self, transcript: str, toy_capabilities: Optional[List[str]], *variant: str) -> str:
+        """分析快取鍵：SRT 內容 + 玩具功能集合 + 模型 + 系統提示版本 (+ 分析模式)"""
+        capability_set = ",".join(sorted(toy_capabilities)) if toy_capabilities else ""
+        return hash_text(transcript, capability_set, self.model, PROMPT_VERSION, *variant)
+
+    def _parse_analysis_response(self, raw_response_content: str) -> Dict[str, Any]:
+        """解析並驗證 AI 返回的 JSON 內容"""
+        try:
+            # Log the raw response before attempting to parse or validate
+            logger.debug(f"從 AI 收到的原始回應內容: {raw_response_content}") 
+            result = json.loads(raw_response_content)
+        except json.JSONDecodeError as json_err:
+            logger.error(f"解析 AI 返回的 JSON 失敗: {json_err}")
+            logger.error(f"導致解析失敗的原始回應內容: {raw_response_content}") # Log content that failed parsing
+            traceback.print_exc()
+            raise ValueError("無法解析 AI 的回應") from json_err
+
+        # Basic validation
+        if "events" not in result or not isinstance(result["events"], list):
+            logger.error(f"分析結果缺少 'events' 列表或格式錯誤。收到的結構: {result}") # Log the problematic structure
+            raise ValueError("分析結果格式錯誤")
+
+        # Validate timestamp format
+        for event in result.get("events", []):
+            ts = event.get("timestamp")
+            if not isinstance(ts, str) or not re.match(r"\d{2}:\d{2}:\d{2},\d{3}", ts):
+                logger.warning(f"事件的時間戳格式可能不正確: {ts}")
+        return result
+
+    def _start_run(self, mode: str):
+        self.last_run_stats = {
+            "mode": mode,
+            "from_cache": False,
+            "raw_transcript_tokens": 0,
+            "compact_transcript_tokens": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "requests": 0,
+            "latency_seconds": 0.0,
+        }
+        self._run_started = time.perf_counter()
+        self._live_prev = None
+
+    def _prepare_transcript(self, transcript: str) -> str:
+        """將 SRT 精簡為每行一條的緊湊格式 (去除序號、結束時間、空白及重複條目)"""
+        compact, stats = compact_srt(transcript)
+        if not compact:
+            compact = transcript.strip() # 不是 SRT 格式時原樣送出
+        self.last_run_stats["raw_transcript_tokens"] = estimate_tokens(transcript)
+        self.last_run_stats["compact_transcript_tokens"] = estimate_tokens(compact)
+        self.last_run_stats["removed_cues"] = stats["cues"] - stats["compact_cues"]
+        return compact
+
+    def _build_messages(self, system_prompt: str, user_content: str, what: str = "分析請求") -> List[Dict[str, str]]:
+        """組合請求訊息並檢查輸入 token 預算"""
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_content}
+        ]
+        check_budget(estimate_messages_tokens(messages), self.max_input_tokens, what)
+        return messages
+
+    def _record_usage(self, usage: Any, started: float):
+        latency = time.perf_counter() - started
+        tokens = usage_to_dict(usage)
+        add_usage(self.last_run_stats, tokens)
+        self.last_run_stats["requests"] += 1
+        metrics.inc("llm_requests_total", model=self.model)
+        metrics.inc("llm_prompt_tokens_total", tokens["prompt_tokens"], model=self.model)
+        metrics.inc("llm_completion_tokens_total", tokens["completion_tokens"], model=self.model)
+        metrics.inc("llm_cached_tokens_total", tokens["cached_tokens"], model=self.model)
+        metrics.observe("llm_request_seconds", latency, model=self.model, mode=self.last_run_stats["mode"])
+
+    def _smooth_result(self):
+        """模型只輸出主要事件；在本地補上過渡、維持事件並修正強度與持續時間"""
+        majors = self.analysis_result.get("events", [])
+        with tracing.span("postprocess.smooth", cat="analysis", events=len(majors)):
+            self.analysis_result = dict(self.analysis_result, events=smooth_events(majors))
+        self.last_run_stats["major_events"] = len(majors)
+
+    def _live_events(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """串流時將新的主要事件連同之前的過渡/維持事件一起交出 (前一個事件的持續時間無法回頭修正)"""
+        prev, self._live_prev = self._live_prev, event
+        return smooth_events([prev, event])[1:] if prev is not None else smooth_events([event])
+
+    def _finish_run(self):
+        self.last_run_stats["latency_seconds"] = round(time.perf_counter() - self._run_started, 3)
+        self.last_run_stats["events"] = len(self.analysis_result.get("events", []))
+        metrics.inc("analysis_events_total", self.last_run_stats["events"])
+        logger.info(f"分析請求統計: {format_run_stats(self.last_run_stats)}")
+
+    def _analyze_with_rules(self, transcript: str, toy_key: Optional[str]) -> Dict[str, Any]:
+        """以本地規則引擎分析 (不呼叫 API，也不使用快取)"""
+        self._start_run(ENGINE_RULES)
+        self.last_from_cache = False
+        toy_capabilities, _ = self._resolve_capabilities(toy_key)
+        with tracing.span("rules.analyze", cat="analysis"):
+            self.analysis_result = analyze_transcript(transcript, toy_capabilities)
+        self._finish_run()
+        return self.analysis_result
+
+    def _require_transcript_engine(self):
+        if self.engine == ENGINE_AUDIO:
+            raise ValueError("音訊包絡引擎不分析字幕，請改用 analyze_audio()。")
+
+    def analyze_audio(self, audio_path: str, toy_key: Optional[str] = None,
+                      resolution: Optional[float] = None) -> Dict[str, Any]:
+        """
+        以音訊包絡引擎直接分析音訊文件 (不需要字幕，也不呼叫 API)。
+
+        Args:
+            audio_path (str): 音訊或影片文件路徑。
+            toy_key (Optional[str]): 在 JSON 文件中定義的玩具 key。
+            resolution (Optional[float]): 強度曲線的時間解析度 (秒)，None 時使用預設值。
+
+        Returns:
+            Dict[str, Any]: 包含 'events' 的分析結果。
+        """
+        import audio_envelope
+
+        self._start_run(ENGINE_AUDIO)
+        self.last_from_cache = False
+        toy_capabilities, _ = self._resolve_capabilities(toy_key)
+        result = audio_envelope.analyze_audio(audio_path, resolve_functions(toy_capabilities),
+                                              resolution or audio_envelope.DEFAULT_RESOLUTION)
+        self.analysis_result = {"events": result["events"]}
+        times = result["envelopes"]["times"]
+        self.last_run_stats["audio_seconds"] = float(times[-1]) if len(times) else 0.0
+        self._finish_run()
+        return self.analysis_result
+
+    def blend_audio(self, audio_path: str, toy_key: Optional[str] = None, weight: Optional[float] = None,
+                    resolution: Optional[float] = None) -> Dict[str, Any]:
+        """
+        以音訊包絡加密目前的分析結果 (LLM 或規則引擎)：原事件全部保留，
+        事件之間插入跟隨音訊響度/節奏起伏的強度變化。
+
+        Args:
+            weight (Optional[float]): 音訊曲線的混合權重 (0-1)，None 時使用預設值。
+
+        Returns:
+            Dict[str, Any]: 加密後的分析結果 (同時更新 self.analysis_result)。
+        """
+        import audio_envelope
+
+        events = self.analysis_result.get("events") if self.analysis_result else None
+        if not events:
+            raise ValueError("沒有可加密的分析結果，請先執行分析。")
+        toy_capabilities, _ = self._resolve_capabilities(toy_key)
+        started = time.perf_counter()
+        with tracing.span("envelope.blend", cat="analysis", anchors=len(events)):
+            result = audio_envelope.analyze_audio(audio_path, resolve_functions(toy_capabilities),
+                                                  resolution or audio_envelope.DEFAULT_RESOLUTION)
+            blended = audio_envelope.densify_events(events, result["envelopes"], result["curves"],
+                                                    audio_envelope.DEFAULT_BLEND_WEIGHT if weight is None else weight)
+        self.analysis_result = dict(self.analysis_result, events=blended)
+        added = len(blended) - len(events)
+        self.last_run_stats["audio_blended_events"] = added
+        metrics.inc("analysis_events_total", added)
+        logger.info(f"音訊包絡加密：{len(events)} 個事件之間插入 {added} 個事件，"
+                    f"耗時 {time.perf_counter() - started:.2f} 秒")
+        return self.analysis_result
+
+    def analyze_content(self, transcript: str, toy_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        使用 OpenAI GPT 分析轉錄文本，根據提供的玩具 key (名稱) 查找其功能，並給出控制建議。
+
+        Args:
+            transcript (str): 要分析的文本記錄。
+            toy_key (Optional[str]): 在 JSON 文件中定義的玩具 key (例如 "nora", "lush4")。
+
+        Returns:
+            Dict[str, Any]: 包含分析結果的字典。
+        """
+        self._require_transcript_engine()
+        if self.engine == ENGINE_RULES:
+            return self._analyze_with_rules(transcript, toy_key)
+        self._start_run("single")
+        toy_capabilities, capabilities_prompt = self._resolve_capabilities(toy_key)
+
+        cache_key = self._cache_key(transcript, toy_capabilities) if self.cache is not None else None
+        cached = self._load_cached_result(cache_key)
+        if cached is not None:
+            return cached
 
         try:
             logger.info(f"開始對 SRT 內容進行詳細分析並遵循指令 (玩具 key: {toy_key or '未指定'})")
 
-            # --- MODIFIED SYSTEM PROMPT for more detailed events and transitions ---
-            system_prompt = f"""
-            你是一個高度專業的內容分析助手，負責對成人內容的 SRT 格式文本記錄進行 **極其詳細和細膩** 的分析。
-            輸入的文本是 SRT (SubRip Text) 字幕格式，記錄了對話和聲音。
-
-            {capabilities_prompt}
-
-            請 **極其仔細且細膩地分析** 以下 SRT 文本內容。你需要做三件事：
-
-            1. **識別並優先執行說話者給出的直接指令**: 
-               - 留意文本中任何關於 **如何操作玩具** 的明確指示（例如："開大一點"、"停下"、"用 XX 強度"、"加快"等）
-               - 當偵測到這類指令時，生成的 `command` **必須直接反映該指令**
-               - 在執行指令前後要加入過渡事件，讓強度變化更自然
-
-            2. **捕捉情緒和動作變化，並加入過渡**: 
-               - 在沒有直接指令的區間，找出 **所有可能的** 轉折點、情緒波動、關鍵動作描述、節奏或強度變化
-               - **即使是細微的變化也要捕捉**
-               - 每個主要變化之間都應該加入 2-3 個過渡事件，讓強度變化更加平滑
-               - 注意聲音、呼吸、語氣等細節暗示的情緒變化
-
-            3. **創建豐富的事件序列**:
-               - 每個明顯的情緒/動作變化點都應該生成一個主要事件
-               - 在主要事件之間加入過渡事件，使強度變化更加自然流暢
-               - 即使是相同的動作/情緒持續，也要每 5-10 秒生成一個微調事件
-               - 確保不同功能之間的切換有適當的過渡期
-               - 在停止指令前後都要加入漸變事件
-
-            基礎可用的控制功能類型包括（但請 **嚴格優先** 使用上面為特定玩具指定的功能，**並優先執行直接指令**）：
-            - Vibrate: 震動 (強度 1-20)
-            - Rotate: 旋轉 (強度 1-20)
-            - Pump: 泵送/收縮 (強度 1-20)
-            - Thrusting: 抽插 (強度 1-20)
-            - All: 設置其他功能 (強度 1-20)
-            - Stop: 停止
-
-            對於 **每一個** 識別出的事件點（包括主要事件和過渡事件），請提供：
-
-            1. **精確的開始時間戳 (timestamp)**:
-               - 從對應的 SRT 時間行提取 **開始時間** (格式 "HH:MM:SS,ms")
-               - 過渡事件的時間戳應該均勻分布在兩個主要事件之間
-
-            2. **詳細的描述 (description)**:
-               - 主要事件：清楚說明是基於什麼觀察做出的判斷（情緒/動作/指令）
-               - 過渡事件：描述如何平滑過渡到下一個狀態
-               - 包含任何細微的情緒、聲音或動作變化
-
-            3. **精確的功能控制 (action)**:
-               - **直接指令情況**:
-                 * 必須執行指令的具體要求
-                 * 在指令前後加入強度漸變
-                 * 具體強度按指令執行（如"用 15 級"）
-                 * 相對指令（如"開大點"）要基於當前強度調整
-                 * "停止"指令前要有漸弱過程
-               
-               - **非指令情況**:
-                 * 根據情緒/動作推斷合適的功能組合
-                 * 強度變化必須非常細緻且漸進
-                 * 低強度 (1-8): 溫柔、挑逗、緩和
-                 * 中強度 (9-15): 興奮上升、節奏加快
-                 * 高強度 (16-20): 高潮、激烈動作
-                 * 在相鄰事件之間的強度差不應超過 3-4 級
-                 * 充分利用玩具支援的功能組合
-
-            4. **合理的持續時間 (timeSec)**:
-               - 主要事件：根據情境決定，通常 5-15 秒
-               - 過渡事件：通常 2-5 秒
-               - 高潮階段可以更短促密集
-               - 溫和階段可以更長
-               - Stop 指令的 timeSec 為 0
-
-            5. **循環模式設置**（適用時）:
-               - loopRunningSec: 循環運行時間
-               - loopPauseSec: 循環暫停時間
-               - 用於重複性動作或節奏感強的場景
-
-            以JSON格式返回分析結果 (**確保 timestamp 是精確的 SRT 開始時間格式**):
-            {{
-                "events": [
-                    {{
-                        "timestamp": "HH:MM:SS,ms",
-                        "description": "詳細描述(包含是否為直接指令、過渡說明等)...",
-                        "command": {{
-                            "command": "Function",
-                            "action": "指令(優先執行文本中的指令)...",
-                            "timeSec": 持續時間(數字),
-                            "loopRunningSec": 運行秒數(數字, 可選),
-                            "loopPauseSec": 暫停秒數(數字, 可選),
-                            "apiVer": 1
-                        }}
-                    }},
-                    // ... 預期會有大量事件，包括主要事件和過渡事件 ...
-                ]
-            }}
-
-            請特別注意：
-            1. 強度值必須在 1-20 範圍內
-            2. 時間值必須為合理的數字
-            3. command 字典結構必須完整
-            4. 相鄰事件之間的強度變化要平滑
-            5. 每個明顯的變化點前後都要有過渡事件
-            6. 即使是穩定階段也要有微調事件
-            7. 總體事件數量應該很多，確保體驗流暢
-
-            **最終目標是生成一個事件密集、強度變化細膩、過渡自然、能夠完美體現內容情緒起伏的控制序列。**
-            """
-            # --- END OF MODIFIED SYSTEM PROMPT ---
-
-            response = openai.chat.completions.create(
-                model="o4-mini",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": transcript}
-                ],
-                max_completion_tokens=14000,
-                response_format={"type": "json_object"}
-            )
+            messages = self._build_messages(build_system_prompt(capabilities_prompt),
+                                            self._prepare_transcript(transcript))
+            started = time.perf_counter()
+            with tracing.span("openai.chat", cat="openai", model=self.model):
+                response = openai.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_completion_tokens=self.max_completion_tokens,
+                    response_format={"type": "json_object"}
+                )
+            self._record_usage(response.usage, started)
 
             # 嘗試解析 JSON 結果
-            try:
-                raw_response_content = response.choices[0].message.content
-                # Log the raw response before attempting to parse or validate
-                logger.debug(f"從 AI 收到的原始回應內容: {raw_response_content}") 
-
-                self.analysis_result = json.loads(raw_response_content)
-                logger.info("詳細文本分析（含指令遵循）完成")
-                
-                # Basic validation
-                if "events" not in self.analysis_result or not isinstance(self.analysis_result["events"], list):
-                    logger.error(f"分析結果缺少 'events' 列表或格式錯誤。收到的結構: {self.analysis_result}") # Log the problematic structure
-                    raise ValueError("分析結果格式錯誤")
-                
-                # Validate timestamp format
-                for event in self.analysis_result.get("events", []):
-                    ts = event.get("timestamp")
-                    if not isinstance(ts, str) or not re.match(r"\d{2}:\d{2}:\d{2},\d{3}", ts):
-                        logger.warning(f"事件的時間戳格式可能不正確: {ts}")
-                
-                logger.info(f"分析生成了 {len(self.analysis_result.get('events', []))} 個事件。")
-                return self.analysis_result
-            except json.JSONDecodeError as json_err:
-                logger.error(f"解析 AI 返回的 JSON 失敗: {json_err}")
-                logger.error(f"導致解析失敗的原始回應內容: {raw_response_content}") # Log content that failed parsing
-                traceback.print_exc()
-                raise ValueError("無法解析 AI 的回應") from json_err
+            self.analysis_result = self._parse_analysis_response(response.choices[0].message.content)
+            logger.info("詳細文本分析（含指令遵循）完成")
+            self._smooth_result()
+            logger.info(f"分析生成了 {self.last_run_stats['major_events']} 個主要事件，"
+                        f"平滑後共 {len(self.analysis_result['events'])} 個事件。")
+            self._finish_run()
+
+            if cache_key is not None:
+                self.cache.put(cache_key, json.dumps(self.analysis_result, ensure_ascii=False), meta={
+                    "toy_key": toy_key,
+                    "model": self.model,
+                    "prompt_version": PROMPT_VERSION,
+                })
+            return self.analysis_result
 
         except openai.APIError as api_err:
              logger.error(f"OpenAI API 返回錯誤: {api_err}")
@@ -259,8 +456,280 @@ class ContentAnalyzer:
             traceback.print_exc()
             raise
 
-    def save_analysis(self, output_path: str):
-        """保存分析結果到文件"""
+    def analyze_content_windowed(self, transcript: str, toy_key: Optional[str] = None,
+                                 window_seconds: float = DEFAULT_WINDOW_SECONDS,
+                                 overlap_seconds: float = DEFAULT_OVERLAP_SECONDS,
+                                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                                 base_url: Optional[str] = None) -> Dict[str, Any]:
+        """
+        將長篇 SRT 切分為互相重疊的時間窗口並行分析，再合併各窗口的事件。
+
+        重疊區內的事件只採用負責該時間點的窗口，並去除重複事件；
+        窗口交界處強度落差過大時會插入過渡事件，保持強度連續。
+
+        Args:
+            transcript (str): 要分析的 SRT 文本。
+            toy_key (Optional[str]): 在 JSON 文件中定義的玩具 key。
+            window_seconds (float): 每個窗口的長度 (秒)。
+            overlap_seconds (float): 相鄰窗口的重疊長度 (秒)。
+            max_concurrency (int): 同時進行的 API 請求數上限。
+            base_url (Optional[str]): 自訂 API 端點 (例如本地模擬服務)。
+
+        Returns:
+            Dict[str, Any]: 包含合併後 'events' 的分析結果。
+        """
+        self._require_transcript_engine()
+        if self.engine == ENGINE_RULES:
+            return self._analyze_with_rules(transcript, toy_key) # 規則引擎本身就很快，不需要切分窗口
+        self._start_run("windowed")
+        toy_capabilities, capabilities_prompt = self._resolve_capabilities(toy_key)
+
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self._cache_key(transcript, toy_capabilities, f"windowed:{window_seconds}:{overlap_seconds}")
+        cached = self._load_cached_result(cache_key)
+        if cached is not None:
+            return cached
+
+        windows = split_into_windows(parse_srt(transcript), window_seconds, overlap_seconds)
+        if not windows:
+            raise ValueError("SRT 內容中沒有可分析的字幕")
+        logger.info(f"開始窗口化分析：共 {len(windows)} 個窗口 (長度 {window_seconds} 秒，重疊 {overlap_seconds} 秒，並行上限 {max_concurrency})")
+
+        system_prompt = build_system_prompt(capabilities_prompt)
+        window_messages = []
+        for i, window in enumerate(windows):
+            compact = format_compact(compact_cues(window["cues"]))
+            self.last_run_stats["compact_transcript_tokens"] += estimate_tokens(compact)
+            window_messages.append(self._build_messages(system_prompt, compact, f"窗口 {i + 1}"))
+        self.last_run_stats["raw_transcript_tokens"] = estimate_tokens(transcript)
+
+        try:
+            window_results = asyncio.run(
+                self._analyze_windows_async(windows, window_messages, max_concurrency, base_url)
+            )
+        except openai.APIError as api_err:
+             logger.error(f"OpenAI API 返回錯誤: {api_err}")
+             traceback.print_exc()
+             raise
+
+        self.analysis_result = {"events": merge_window_events(windows, window_results)}
+        self._smooth_result()
+        logger.info(f"窗口化分析完成，合併後共 {len(self.analysis_result['events'])} 個事件。")
+        self._finish_run()
+
+        if cache_key is not None:
+            self.cache.put(cache_key, json.dumps(self.analysis_result, ensure_ascii=False), meta={
+                "toy_key": toy_key,
+                "model": self.model,
+                "prompt_version": PROMPT_VERSION,
+                "windowed": True,
+            })
+        return self.analysis_result
+
+    async def _analyze_windows_async(self, windows: List[Dict[str, Any]], window_messages: List[List[Dict[str, str]]],
+                                     max_concurrency: int, base_url: Optional[str]) -> List[List[Dict[str, Any]]]:
+        """使用 AsyncOpenAI 並行分析所有窗口，返回各窗口的事件列表"""
+        client = openai.AsyncOpenAI(api_key=openai.api_key, base_url=base_url)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def analyze_window(i: int, window: Dict[str, Any]) -> List[Dict[str, Any]]:
+            async with semaphore:
+                logger.info(f"分析窗口 {i + 1}/{len(windows)} ({window['start']:.0f}s - {window['end']:.0f}s)")
+                started = time.perf_counter()
+                # 同一事件迴圈中的請求會互相重疊，以非同步事件記錄
+                with tracing.span("openai.chat", cat="openai", async_id=f"window-{i}", model=self.model, window=i):
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        messages=window_messages[i],
+                        max_completion_tokens=self.max_completion_tokens,
+                        response_format={"type": "json_object"}
+                    )
+                self._record_usage(response.usage, started)
+                return self._parse_analysis_response(response.choices[0].message.content)["events"]
+
+        try:
+            return await asyncio.gather(*(analyze_window(i, w) for i, w in enumerate(windows)))
+        finally:
+            await client.close()
+
+    def analyze_content_stream(self, transcript: str, toy_key: Optional[str] = None,
+                               on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        以串流方式分析 SRT，每個事件物件一完成就透過 on_event 回呼交出，
+        讓播放或保存可以在請求開始後數秒內就開始。
+
+        Args:
+            transcript (str): 要分析的 SRT 文本。
+            toy_key (Optional[str]): 在 JSON 文件中定義的玩具 key。
+            on_event (Optional[Callable]): 每解析出一個事件時呼叫的回呼函數。
+
+        Returns:
+            Dict[str, Any]: 串流結束後的完整分析結果。
+        """
+        self._require_transcript_engine()
+        if self.engine == ENGINE_RULES:
+            result = self._analyze_with_rules(transcript, toy_key)
+            for event in result["events"]:
+                if on_event:
+                    on_event(event)
+            return result
+        self._start_run("stream")
+        toy_capabilities, capabilities_prompt = self._resolve_capabilities(toy_key)
+        cache_key = self._cache_key(transcript, toy_capabilities) if self.cache is not None else None
+        cached = self._load_cached_result(cache_key)
+        if cached is not None:
+            for event in cached.get("events", []):
+                if on_event:
+                    on_event(event)
+            return cached
+
+        try:
+            logger.info(f"開始串流分析 SRT 內容 (玩具 key: {toy_key or '未指定'})")
+            messages = self._build_messages(build_system_prompt(capabilities_prompt),
+                                            self._prepare_transcript(transcript))
+            started = time.perf_counter()
+            stream = openai.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_completion_tokens=self.max_completion_tokens,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            parser = IncrementalEventParser()
+            raw_parts = []
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(chunk.usage, started) # 最後一個 chunk 只帶 usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                raw_parts.append(delta)
+                for major in parser.feed(delta):
+                    for event in self._live_events(major):
+                        if on_event:
+                            on_event(event)
+            tracing.complete("openai.chat.stream", started, cat="openai", model=self.model)
+            return self._finish_stream("".join(raw_parts), parser, cache_key, toy_key)
+
+        except openai.APIError as api_err:
+             logger.error(f"OpenAI API 返回錯誤: {api_err}")
+             traceback.print_exc()
+             raise
+        except Exception as e:
+            logger.error(f"串流分析過程中發生未知錯誤: {str(e)}")
+            traceback.print_exc()
+            raise
+
+    async def astream_events(self, transcript: str, toy_key: Optional[str] = None,
+                             base_url: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        analyze_content_stream 的非同步迭代器版本：
+        `async for event in analyzer.astream_events(srt, toy_key): ...`
+
+        串流結束後，完整結果可從 self.analysis_result 取得。
+        """
+        self._require_transcript_engine()
+        if self.engine == ENGINE_RULES:
+            for event in self._analyze_with_rules(transcript, toy_key)["events"]:
+                yield event
+            return
+        self._start_run("stream")
+        toy_capabilities, capabilities_prompt = self._resolve_capabilities(toy_key)
+        cache_key = self._cache_key(transcript, toy_capabilities) if self.cache is not None else None
+        cached = self._load_cached_result(cache_key)
+        if cached is not None:
+            for event in cached.get("events", []):
+                yield event
+            return
+
+        messages = self._build_messages(build_system_prompt(capabilities_prompt), self._prepare_transcript(transcript))
+        client = openai.AsyncOpenAI(api_key=openai.api_key, base_url=base_url)
+        try:
+            logger.info(f"開始非同步串流分析 SRT 內容 (玩具 key: {toy_key or '未指定'})")
+            started = time.perf_counter()
+            stream = await client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                max_completion_tokens=self.max_completion_tokens,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            parser = IncrementalEventParser()
+            raw_parts = []
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    self._record_usage(chunk.usage, started)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                raw_parts.append(delta)
+                for major in parser.feed(delta):
+                    for event in self._live_events(major):
+                        yield event
+            tracing.complete("openai.chat.stream", started, cat="openai", async_id=f"astream-{id(stream)}", model=self.model)
+            self._finish_stream("".join(raw_parts), parser, cache_key, toy_key)
+        finally:
+            await client.close()
+
+    def _load_cached_result(self, cache_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """讀取快取的分析結果，未命中或損壞時返回 None"""
+        self.last_from_cache = False
+        if cache_key is None:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        try:
+            self.analysis_result = json.loads(cached)
+        except json.JSONDecodeError:
+            logger.warning(f"分析快取內容損壞，將重新分析: {cache_key}")
+            self.cache.invalidate(cache_key)
+            return None
+        self.last_from_cache = True
+        self.last_run_stats["from_cache"] = True
+        metrics.inc("cache_hits_total", kind="analysis")
+        logger.info(f"分析快取命中 ({cache_key[:12]})，略過 LLM 請求。")
+        return self.analysis_result
+
+    def _finish_stream(self, raw_response_content: str, parser: IncrementalEventParser,
+                       cache_key: Optional[str], toy_key: Optional[str]) -> Dict[str, Any]:
+        """串流結束後驗證完整回應、更新結果並寫入快取"""
+        try:
+            self.analysis_result = self._parse_analysis_response(raw_response_content)
+        except ValueError:
+            if not parser.events:
+                raise
+            # 回應被截斷時，保留已經完整解析出的事件
+            logger.warning(f"串流回應不完整，保留已解析的 {len(parser.events)} 個事件。")
+            self.analysis_result = {"events": list(parser.events)}
+            self._smooth_result()
+            self._finish_run()
+            return self.analysis_result
+        self._smooth_result()
+        logger.info(f"串流分析完成，共 {len(self.analysis_result['events'])} 個事件。")
+        self._finish_run()
+        if cache_key is not None:
+            self.cache.put(cache_key, json.dumps(self.analysis_result, ensure_ascii=False), meta={
+                "toy_key": toy_key,
+                "model": self.model,
+                "prompt_version": PROMPT_VERSION,
+            })
+        return self.analysis_result
+
+    def save_analysis(self, output_path: str, timeline_path: Optional[str] = None):
+        """保存分析結果到文件
+
+        Args:
+            output_path (str): JSON 輸出路徑。
+            timeline_path (Optional[str]): 若指定，另外寫出二進位時間軸 (.lvtl) 供播放器快速載入。
+        """
         try:
             if not self.analysis_result:
                  logger.warning("分析結果為空，無法保存。")
@@ -269,6 +738,8 @@ class ContentAnalyzer:
             with open(output_path, 'w', encoding='utf-8') as f:
                 json.dump(self.analysis_result, f, ensure_ascii=False, indent=4)
             logger.info(f"分析結果已保存到: {output_path}")
+            if timeline_path:
+                write_timeline(self.analysis_result.get("events", []), timeline_path)
         except Exception as e:
             logger.error(f"保存分析結果失敗: {str(e)}")
             traceback.print_exc()
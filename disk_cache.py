@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import atexit
+import hashlib
+import logging
+import threading
+import traceback
+from typing import Dict, Any, Optional, Iterable
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "index.json"
+# 只更新存取時間/命中次數時，索引最多每隔此秒數寫回一次 (寫入、淘汰、移除條目仍立即寫入)
+INDEX_FLUSH_SECONDS = 30.0
+
+
+def hash_file(path: str, extra: Iterable[str] = (), block_size: int = 1024 * 1024) -> str:
+    """
+    計算文件內容 (以及額外字串) 的 SHA-256 雜湊值。
+
+    Args:
+        path (str): 要計算的文件路徑。
+        extra (Iterable[str]): 附加到雜湊中的字串 (例如模型名稱)。
+        block_size (int): 每次讀取的區塊大小。
+
+    Returns:
+        str: 十六進位雜湊字串。
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    for item in extra:
+        digest.update(b"\0")
+        digest.update(str(item).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def hash_text(*parts: str) -> str:
+    """計算多段字串的 SHA-256 雜湊值"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    以內容雜湊為鍵、帶索引文件和大小上限 (LRU 淘汰) 的本地文字快取。
+
+    命中時只在記憶體中更新 last_access/hits，索引在 put/淘汰時寫回，
+    或距離上次寫回超過 flush_interval 秒時隨命中寫回；行程結束時寫回未保存的變更。
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = 200 * 1024 * 1024, suffix: str = ".txt",
+                 flush_interval: float = INDEX_FLUSH_SECONDS):
+        """
+        Args:
+            cache_dir (str): 快取文件存放目錄。
+            max_bytes (int): 快取總大小上限 (位元組)，超過時淘汰最久未使用的條目。
+            suffix (str): 快取文件的副檔名。
+            flush_interval (float): 命中時寫回索引的最短間隔 (秒)。
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.flush_interval = flush_interval
+        self.index_path = os.path.join(cache_dir, INDEX_FILENAME)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._index: Dict[str, Dict[str, Any]] = self._load_index()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            entries = data.get("entries", {}) if isinstance(data, dict) else {}
+            # 移除索引中存在但文件已遺失的條目
+            return {key: entry for key, entry in entries.items()
+                    if os.path.exists(os.path.join(self.cache_dir, entry.get("file", "")))}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"快取索引 {self.index_path} 讀取失敗，將重建索引: {e}")
+            return {}
+
+    def _save_index(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"entries": self._index}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.index_path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def flush(self):
+        """將記憶體中尚未寫回的存取資訊寫入索引"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                self._save_index()
+            except OSError as e:
+                logger.warning(f"寫回快取索引失敗 {self.index_path}: {e}")
+
+    def _entry_path(self, entry: Dict[str, Any]) -> str:
+        return os.path.join(self.cache_dir, entry["file"])
+
+    def get(self, key: str) -> Optional[str]:
+        """讀取快取內容，未命中時返回 None"""
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return None
+            try:
+                with open(self._entry_path(entry), 'r', encoding='utf-8') as f:
+                    content = f.read()
+            except OSError:
+                logger.warning(f"快取文件遺失，移除條目: {key}")
+                self._index.pop(key, None)
+                self._save_index()
+                return None
+            entry["last_access"] = time.time()
+            entry["hits"] = entry.get("hits", 0) + 1
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= self.flush_interval:
+                self._save_index()
+            return content
+
+    def get_meta(self, key: str) -> Optional[Dict[str, Any]]:
+        """讀取快取條目的附加資訊"""
+        with self._lock:
+            entry = self._index.get(key)
+            return dict(entry.get("meta", {})) if entry else None
+
+    def put(self, key: str, content: str, meta: Optional[Dict[str, Any]] = None):
+        """寫入快取內容，並在超過大小上限時淘汰最久未使用的條目"""
+        with self._lock:
+            try:
+                filename = f"{key}{self.suffix}"
+                path = os.path.join(self.cache_dir, filename)
+                temp_path = path + ".tmp"
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    f.write(content)
+                os.replace(temp_path, path)
+                now = time.time()
+                self._index[key] = {
+                    "file": filename,
+                    "size": os.path.getsize(path),
+                    "created": now,
+                    "last_access": now,
+                    "hits": 0,
+                    "meta": meta or {},
+                }
+                self._evict()
+                self._save_index()
+            except Exception as e:
+                logger.error(f"寫入快取失敗 ({key}): {e}")
+                traceback.print_exc()
+
+    def _evict(self):
+        total = sum(entry.get("size", 0) for entry in self._index.values())
+        if total <= self.max_bytes:
+            return
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1].get("last_access", 0)):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._entry_path(entry))
+            except OSError:
+                pass
+            total -= entry.get("size", 0)
+            del self._index[key]
+            logger.info(f"快取超過上限，已淘汰條目: {key}")
+
+    def invalidate(self, key: str):
+        """移除單一快取條目"""
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry:
+                try:
+                    os.remove(self._entry_path(entry))
+                except OSError:
+                    pass
+                self._save_index()
+
+    def total_size(self) -> int:
+        """目前快取的總大小 (位元組)"""
+        with self._lock:
+            return sum(entry.get("size", 0) for entry in self._index.values())
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._index
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._index)
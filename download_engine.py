@@ -0,0 +1,291 @@
+import os
+import json
+import time
+import shutil
+import logging
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILENAME = "checkpoint.json"
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RANGE_SIZE = 4 * 1024 * 1024
+DEFAULT_TIMEOUT = 30
+SEGMENT_RETRIES = 3           # 分段在傳輸途中斷線時的重試次數 (連線與 5xx 由 session 的 Retry 處理)
+READ_BLOCK = 64 * 1024
+
+
+def create_session(pool_size: int = DEFAULT_MAX_WORKERS, retries: int = 3,
+                   base: Optional[requests.Session] = None) -> requests.Session:
+    """
+    建立帶連線池與自動重試的 HTTP session。
+
+    指定 base (例如 phub 的 session) 時只複製其 headers、cookies、代理與驗證設定，
+    不會在共用的 session 上掛載 adapter，避免影響其他使用者。
+    """
+    session = requests.Session()
+    if base is not None:
+        session.headers.update(base.headers)
+        session.cookies.update(base.cookies)
+        session.proxies.update(base.proxies)
+        session.auth = base.auth
+        session.verify = base.verify
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class ProgressTracker:
+    """統計已下載位元組與下載速度，並定期回呼"""
+
+    def __init__(self, total_bytes: Optional[int] = None,
+                 callback: Optional[Callable[[int, Optional[int], float], None]] = None,
+                 interval: float = 0.5):
+        """
+        Args:
+            total_bytes (Optional[int]): 預期總大小 (未知時為 None)。
+            callback (Optional[Callable]): callback(已下載位元組, 總位元組, 每秒位元組)。
+            interval (float): 回呼的最短間隔 (秒)。
+        """
+        self.total_bytes = total_bytes
+        self.callback = callback
+        self.interval = interval
+        self.downloaded = 0
+        self.resumed_bytes = 0
+        self.started_at = time.monotonic()
+        self._last_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, count: int, resumed: bool = False):
+        with self._lock:
+            self.downloaded += count
+            if resumed:
+                self.resumed_bytes += count
+            now = time.monotonic()
+            if self.callback and now - self._last_report >= self.interval:
+                self._last_report = now
+                self.callback(self.downloaded, self.total_bytes, self.rate)
+
+    def discard(self, count: int):
+        """扣除失敗請求已計入的位元組 (重試時重新下載，避免進度超過 100%)"""
+        with self._lock:
+            self.downloaded -= count
+
+    @property
+    def rate(self) -> float:
+        """本次實際下載的平均速度 (位元組/秒，不含續傳前已完成的部分)"""
+        elapsed = max(1e-6, time.monotonic() - self.started_at)
+        return (self.downloaded - self.resumed_bytes) / elapsed
+
+    def finish(self):
+        if self.callback:
+            self.callback(self.downloaded, self.total_bytes, self.rate)
+
+
+class SegmentedDownloader:
+    """
+    並行分段下載器，支援 HLS 分段列表或 HTTP Range 分塊。
+
+    resume 為 True 時每個分段先寫入工作目錄下的 .part 文件並記錄於檢查點，
+    中斷後以相同 job_id 重新執行即可跳過已完成的分段；否則分段只保留在記憶體中，
+    同時下載或等待交出的分段最多 2 × max_workers 個，不寫入磁碟。
+    iter_* 方法依原始順序產生分段內容，可直接串流給 ffmpeg。
+    """
+
+    def __init__(self, work_dir: str, max_workers: int = DEFAULT_MAX_WORKERS,
+                 session: Optional[requests.Session] = None, range_size: int = DEFAULT_RANGE_SIZE,
+                 timeout: float = DEFAULT_TIMEOUT,
+                 progress_callback: Optional[Callable[[int, Optional[int], float], None]] = None,
+                 resume: bool = True, segment_retries: int = SEGMENT_RETRIES):
+        """
+        Args:
+            work_dir (str): 存放分段與檢查點的目錄。
+            max_workers (int): 同時下載的分段數。
+            session (Optional[requests.Session]): 要複製 cookies 與 headers 的 session (例如 phub 的 session)。
+            range_size (int): Range 模式下每塊的大小 (位元組)。
+            timeout (float): 單一請求逾時 (秒)。
+            progress_callback (Optional[Callable]): 進度回呼，參數為 (已下載, 總大小, 每秒位元組)。
+            resume (bool): 是否將分段寫入磁碟並記錄檢查點以便續傳。
+            segment_retries (int): 分段傳輸途中斷線時最多嘗試的次數。
+        """
+        self.work_dir = work_dir
+        self.max_workers = max(1, max_workers)
+        self.session = create_session(self.max_workers, base=session)
+        self.range_size = range_size
+        self.timeout = timeout
+        self.progress_callback = progress_callback
+        self.resume = resume
+        self.segment_retries = max(1, segment_retries)
+        self.progress: Optional[ProgressTracker] = None
+        self._lock = threading.Lock()
+
+    # --- 檢查點 ---
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.work_dir, job_id)
+
+    def _load_checkpoint(self, job_id: str, plan: List[Dict[str, Any]]) -> Dict[str, int]:
+        path = os.path.join(self._job_dir(job_id), CHECKPOINT_FILENAME)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            logger.warning(f"檢查點 {path} 損壞，將重新下載。")
+            return {}
+        if data.get("plan") != plan:
+            logger.info("下載計畫已改變，忽略舊的檢查點。")
+            return {}
+        completed = {}
+        for index, size in data.get("completed", {}).items():
+            part = self._part_path(job_id, int(index))
+            if os.path.exists(part) and os.path.getsize(part) == size:
+                completed[index] = size
+        return completed
+
+    def _save_checkpoint(self, job_id: str, plan: List[Dict[str, Any]], completed: Dict[str, int]):
+        path = os.path.join(self._job_dir(job_id), CHECKPOINT_FILENAME)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"plan": plan, "completed": completed}, f)
+        os.replace(temp_path, path)
+
+    def _part_path(self, job_id: str, index: int) -> str:
+        return os.path.join(self._job_dir(job_id), f"seg_{index:06d}.part")
+
+    # --- 下載 ---
+    def _fetch(self, index: int, item: Dict[str, Any], part_path: Optional[str] = None) -> Optional[bytes]:
+        """下載單一分段；傳輸途中斷線時重試，並扣除失敗嘗試已計入的進度"""
+        for attempt in range(1, self.segment_retries + 1):
+            try:
+                return self._fetch_once(index, item, part_path)
+            except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                if attempt == self.segment_retries:
+                    raise
+                logger.warning(f"分段 {index} 下載中斷 ({e})，第 {attempt} 次重試")
+
+    def _fetch_once(self, index: int, item: Dict[str, Any], part_path: Optional[str]) -> Optional[bytes]:
+        """下載一次分段：指定 part_path 時寫入 .part 文件，否則返回內容"""
+        headers = {}
+        if item.get("range"):
+            start, end = item["range"]
+            headers["Range"] = f"bytes={start}-{end}"
+        temp_path = part_path + ".tmp" if part_path else None
+        blocks: List[bytes] = []
+        size = 0
+        try:
+            with tracing.span("download.fetch", cat="download", index=index) as span, \
+                    self.session.get(item["url"], headers=headers, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                if item.get("range") and response.status_code != 206:
+                    raise RuntimeError(f"伺服器未回應分塊內容 (HTTP {response.status_code}): {item['url']}")
+                with (open(temp_path, "wb") if temp_path else contextlib.nullcontext()) as f:
+                    for block in response.iter_content(READ_BLOCK):
+                        if f is not None:
+                            f.write(block)
+                        else:
+                            blocks.append(block)
+                        size += len(block)
+                        self.progress.add(len(block))
+                span.set(bytes=size)
+        except BaseException:
+            self.progress.discard(size)
+            raise
+        if part_path:
+            os.replace(temp_path, part_path)
+            return None
+        return b"".join(blocks)
+
+    def _run(self, job_id: str, plan: List[Dict[str, Any]], total_bytes: Optional[int]) -> Iterator[bytes]:
+        completed: Dict[str, int] = {}
+        if self.resume:
+            os.makedirs(self._job_dir(job_id), exist_ok=True)
+            completed = self._load_checkpoint(job_id, plan)
+        self.progress = ProgressTracker(total_bytes, self.progress_callback)
+        for size in completed.values():
+            self.progress.add(size, resumed=True)
+        if completed:
+            logger.info(f"從檢查點續傳：已完成 {len(completed)}/{len(plan)} 個分段")
+
+        def task(index: int) -> Optional[bytes]:
+            if not self.resume:
+                return self._fetch(index, plan[index])
+            part_path = self._part_path(job_id, index)
+            self._fetch(index, plan[index], part_path)
+            with self._lock:
+                completed[str(index)] = os.path.getsize(part_path)
+                self._save_checkpoint(job_id, plan, completed)
+            return None
+
+        # 依序交出分段；只預先提交有限數量的分段，限制記憶體中等待交出的內容
+        todo = [i for i in range(len(plan)) if str(i) not in completed]
+        window = self.max_workers * 2
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+            try:
+                for i in range(len(plan)):
+                    while todo and todo[0] < i + window:
+                        index = todo.pop(0)
+                        futures[index] = executor.submit(task, index)
+                    data = futures.pop(i).result() if i in futures else None
+                    if data is None:
+                        with open(self._part_path(job_id, i), "rb") as f:
+                            data = f.read()
+                    yield data
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                raise
+        self.progress.finish()
+        metrics.inc("download_bytes_total", self.progress.downloaded - self.progress.resumed_bytes)
+        metrics.observe("download_seconds", time.monotonic() - self.progress.started_at)
+        logger.info(f"下載完成：{self.progress.downloaded / 1024 / 1024:.1f} MB，"
+                    f"平均 {self.progress.rate / 1024 / 1024:.2f} MB/s")
+
+    def iter_segments(self, urls: List[str], job_id: str) -> Iterator[bytes]:
+        """並行下載 HLS 分段列表，依序產生各分段內容"""
+        plan = [{"url": url} for url in urls]
+        return self._run(job_id, plan, None)
+
+    def iter_ranges(self, url: str, job_id: str) -> Iterator[bytes]:
+        """以 HTTP Range 分塊並行下載單一文件，依序產生各分塊內容"""
+        total_bytes, plan = self._plan_ranges(url)
+        return self._run(job_id, plan, total_bytes)
+
+    def _plan_ranges(self, url: str) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        response = self.session.head(url, allow_redirects=True, timeout=self.timeout)
+        response.raise_for_status()
+        length = response.headers.get("Content-Length")
+        accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+        if not length or not accepts_ranges:
+            logger.info("伺服器不支援分塊下載，改為單一請求。")
+            return (int(length) if length else None), [{"url": url}]
+        total = int(length)
+        plan = [{"url": url, "range": [start, min(start + self.range_size, total) - 1]}
+                for start in range(0, total, self.range_size)]
+        return total, plan
+
+    def download_to_file(self, chunks: Iterator[bytes], output_path: str):
+        """將 iter_* 產生的內容寫入單一文件"""
+        temp_path = output_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(temp_path, output_path)
+
+    def cleanup(self, job_id: str):
+        """刪除工作目錄中該任務的分段與檢查點"""
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
@@ -0,0 +1,295 @@
+import re
+import json
+from typing import List, Dict, Any, Optional
+
+from srt_utils import srt_time_to_seconds, seconds_to_srt_time
+
+MIN_STRENGTH = 1
+MAX_STRENGTH = 20
+# 相鄰事件之間允許的最大強度差，超過時由 smooth_events 插入過渡事件
+MAX_STRENGTH_STEP = 4
+# smooth_events 的預設值
+RAMP_STEP_SECONDS = 2.0      # 過渡事件之間的間隔
+HOLD_SECONDS = 15.0          # 單一事件的最長持續時間，間隔更長時重發相同指令維持狀態
+COALESCE_SECONDS = 0.05      # 間隔小於此值的事件視為同一時間點，只保留後者
+
+_ACTION_PART = re.compile(r"^\s*([A-Za-z]+)\s*(?::\s*(-?\d+(?:\.\d+)?))?\s*$")
+
+
+def parse_action(action: str) -> Dict[str, int]:
+    """
+    將 Lovense action 字串解析為 {功能: 強度} 字典。
+
+    例如 "Vibrate:10,Rotate:5" -> {"Vibrate": 10, "Rotate": 5}；"Stop" -> {}。
+    無法解析的片段會被忽略。
+    """
+    result: Dict[str, int] = {}
+    if not action:
+        return result
+    for part in str(action).split(","):
+        match = _ACTION_PART.match(part)
+        if not match:
+            continue
+        name, value = match.groups()
+        if name.lower() == "stop":
+            return {}
+        if value is None:
+            continue
+        result[name] = int(round(float(value)))
+    return result
+
+
+def format_action(strengths: Dict[str, int]) -> str:
+    """將 {功能: 強度} 字典轉回 action 字串，空字典表示 Stop"""
+    parts = [f"{name}:{int(value)}" for name, value in strengths.items() if int(value) > 0]
+    return ",".join(parts) if parts else "Stop"
+
+
+def clamp_strength(value: float) -> int:
+    """將強度限制在 1-20 範圍內"""
+    return int(max(MIN_STRENGTH, min(MAX_STRENGTH, round(value))))
+
+
+def event_time(event: Dict[str, Any]) -> Optional[float]:
+    """取得事件的開始秒數，時間戳無效時返回 None"""
+    try:
+        return srt_time_to_seconds(event.get("timestamp", ""))
+    except ValueError:
+        return None
+
+
+def event_strengths(event: Dict[str, Any]) -> Dict[str, int]:
+    """取得事件 command 中的 {功能: 強度}"""
+    return parse_action((event.get("command") or {}).get("action", ""))
+
+
+def sort_events(events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """依時間戳排序事件，時間戳無效的事件會被丟棄"""
+    timed = [(event_time(e), i, e) for i, e in enumerate(events)]
+    return [e for t, _, e in sorted((item for item in timed if item[0] is not None), key=lambda item: item[:2])]
+
+
+def dedupe_events(events: List[Dict[str, Any]], tolerance: float = 0.5) -> List[Dict[str, Any]]:
+    """移除時間相近 (tolerance 秒內) 且 action 相同的重複事件"""
+    result: List[Dict[str, Any]] = []
+    for event in sort_events(events):
+        t = event_time(event)
+        duplicate = any(
+            abs(t - event_time(prev)) <= tolerance and event_strengths(prev) == event_strengths(event)
+            for prev in result[-4:]
+        )
+        if not duplicate:
+            result.append(event)
+    return result
+
+
+def make_event(seconds: float, strengths: Dict[str, int], time_sec: float, description: str) -> Dict[str, Any]:
+    """建立符合分析結果 schema 的事件字典"""
+    return {
+        "timestamp": seconds_to_srt_time(seconds),
+        "description": description,
+        "command": {
+            "command": "Function",
+            "action": format_action(strengths),
+            "timeSec": round(max(0.0, time_sec), 3),
+            "apiVer": 1,
+        },
+    }
+
+
+def fill_durations(events: List[Dict[str, Any]], end_time: float, min_seconds: float = 2.0,
+                   max_seconds: float = 15.0) -> List[Dict[str, Any]]:
+    """
+    將每個事件的 timeSec 設為到下一個事件的間隔 (限制在 min_seconds-max_seconds)；
+    Stop 事件的 timeSec 為 0，最後一個事件持續到 end_time。
+    """
+    times = [event_time(e) or 0.0 for e in events]
+    for i, event in enumerate(events):
+        command = event["command"]
+        if command.get("action") == "Stop":
+            command["timeSec"] = 0
+            continue
+        next_time = times[i + 1] if i + 1 < len(events) else max(end_time, times[i] + min_seconds)
+        command["timeSec"] = round(min(max_seconds, max(min_seconds, next_time - times[i])), 3)
+    return events
+
+
+def _clamped_copy(event: Dict[str, Any]) -> Dict[str, Any]:
+    """複製事件並將強度限制在 1-20 (保留 loopRunningSec 等其他欄位)；強度為 0 的功能視為停止"""
+    command = dict(event.get("command") or {})
+    strengths = {name: clamp_strength(value) for name, value in event_strengths(event).items() if value > 0}
+    command.setdefault("command", "Function")
+    command.setdefault("apiVer", 1)
+    command["action"] = format_action(strengths)
+    return dict(event, command=command)
+
+
+def _ramp(prev: Dict[str, int], nxt: Dict[str, int], start: float, end: float, max_step: int,
+          step_seconds: float) -> List[Dict[str, Any]]:
+    """
+    產生從 prev 到 nxt 的過渡事件 (Stop 以強度 0 計算)，每步強度差不超過 max_step。
+    過渡集中在 end 之前，每步間隔 step_seconds；間隔不足時在 start-end 之間均分。
+    """
+    names = list(dict.fromkeys(list(prev) + list(nxt)))
+    biggest = max((abs(nxt.get(n, 0) - prev.get(n, 0)) for n in names), default=0)
+    steps = -(-biggest // max_step)
+    if steps <= 1 or end <= start:
+        return []
+    interval = min(step_seconds, (end - start) / steps)
+    if not nxt:
+        description = "過渡事件：停止前漸弱"
+    elif not prev:
+        description = "過渡事件：停止後漸強"
+    else:
+        description = "過渡事件：平滑銜接相鄰強度"
+    ramp = []
+    for k in range(1, steps):
+        ratio = k / steps
+        strengths = {n: clamp_strength(prev.get(n, 0) + (nxt.get(n, 0) - prev.get(n, 0)) * ratio) for n in names}
+        ramp.append(make_event(end - (steps - k) * interval, strengths, interval, description))
+    return ramp
+
+
+def smooth_events(events: List[Dict[str, Any]], end_time: Optional[float] = None,
+                  max_step: int = MAX_STRENGTH_STEP, step_seconds: float = RAMP_STEP_SECONDS,
+                  hold_seconds: float = HOLD_SECONDS) -> List[Dict[str, Any]]:
+    """
+    將主要事件整理為平滑的控制序列 (本地、確定性的後處理，讓 LLM 不必輸出過渡事件)。
+
+    1. 依時間排序並丟棄時間戳或指令無效的事件；同一時間點只保留最後一個事件
+    2. 強度限制在 1-20；強度為 0 的功能移除，全部為 0 時成為 Stop
+    3. 相鄰事件強度差超過 max_step 時，在後一個事件之前插入線性過渡 (含 Stop 前漸弱、Stop 後漸強)
+    4. 非 Stop 事件持續到下一個事件；間隔超過 hold_seconds 時重發相同指令
+    5. timeSec 設為到下一個事件的間隔 (不重疊)，Stop 為 0；最後一個事件保留原值或持續到 end_time
+
+    Returns:
+        List[Dict[str, Any]]: 新的事件列表 (輸入的事件不會被修改)。
+    """
+    majors: List[Dict[str, Any]] = []
+    for event in sort_events(events):
+        action = str((event.get("command") or {}).get("action", "")).strip()
+        if not event_strengths(event) and action.lower() != "stop":
+            continue
+        if majors and event_time(event) - event_time(majors[-1]) < COALESCE_SECONDS:
+            majors[-1] = _clamped_copy(event)
+        else:
+            majors.append(_clamped_copy(event))
+
+    ramped: List[Dict[str, Any]] = []
+    for i, event in enumerate(majors):
+        if i > 0:
+            prev = majors[i - 1]
+            ramped.extend(_ramp(event_strengths(prev), event_strengths(event), event_time(prev), event_time(event),
+                                max_step, step_seconds))
+        ramped.append(event)
+
+    result: List[Dict[str, Any]] = []
+    for i, event in enumerate(ramped):
+        result.append(event)
+        if not event_strengths(event):
+            continue
+        if i + 1 < len(ramped):
+            next_t = event_time(ramped[i + 1])
+        elif end_time is not None:
+            next_t = end_time  # 最後一個事件同樣以維持事件延續到 end_time
+        else:
+            continue
+        t = event_time(event)
+        hold = t + hold_seconds
+        while next_t - hold > COALESCE_SECONDS:
+            result.append(make_event(hold, event_strengths(event), 0, "維持事件：延續前一狀態"))
+            hold += hold_seconds
+
+    times = [event_time(event) for event in result]
+    for i, event in enumerate(result):
+        command = event["command"]
+        if command.get("action") == "Stop":
+            command["timeSec"] = 0
+        elif i + 1 < len(result):
+            command["timeSec"] = round(times[i + 1] - times[i], 3)
+        elif end_time is not None and end_time > times[i]:
+            command["timeSec"] = round(min(hold_seconds, end_time - times[i]), 3)
+        else:
+            original = command.get("timeSec")
+            valid = isinstance(original, (int, float)) and 0 < original <= hold_seconds
+            command["timeSec"] = original if valid else hold_seconds
+    return result
+
+
+class IncrementalEventParser:
+    """
+    增量解析串流中的 {"events": [...]} JSON 文件。
+
+    每次 feed() 一段文字，返回本次新完成的事件物件；
+    事件在其右大括號出現時即可取得，不需等待整份文件結束。
+    """
+
+    _EVENTS_KEY = re.compile(r'"events"\s*:\s*\[')
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0             # 下一個要掃描的字元位置
+        self._in_array = False
+        self._done = False
+        self._depth = 0           # 事件物件內的大括號/中括號深度
+        self._obj_start = None
+        self._in_string = False
+        self._escape = False
+        self.events: List[Dict[str, Any]] = []
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        """輸入新的文字片段，返回新完成的事件列表"""
+        if self._done or not text:
+            return []
+        self._buffer += text
+        if not self._in_array:
+            match = self._EVENTS_KEY.search(self._buffer)
+            if not match:
+                return []
+            self._in_array = True
+            self._pos = match.end()
+        return self._scan()
+
+    def _scan(self) -> List[Dict[str, Any]]:
+        completed = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 0 and ch == "{":
+                    self._obj_start = i
+                self._depth += 1
+            elif ch in "}]":
+                if self._depth == 0 and ch == "]":
+                    self._done = True
+                    i += 1
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    event = json.loads(buffer[self._obj_start:i + 1])
+                    completed.append(event)
+                    self._obj_start = None
+            i += 1
+        # 丟棄已處理且不再需要的內容，避免緩衝區無限成長
+        keep_from = self._obj_start if self._obj_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._obj_start is not None:
+            self._obj_start = 0
+        self.events.extend(completed)
+        return completed
+
+    @property
+    def finished(self) -> bool:
+        """events 陣列是否已經結束"""
+        return self._done
@@ -0,0 +1,242 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from enum import Enum
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable
+
+import metrics
+import tracing
+import pipeline_tasks
+from pipeline_tasks import classify_input
+
+logger = logging.getLogger(__name__)
+
+# 各種輸入類型要經過的階段
+STAGE_ROUTES: Dict[str, List[str]] = {
+    "url": ["download", "transcribe", "analyze"],
+    "video": ["extract", "transcribe", "analyze"],
+    "audio": ["transcribe", "analyze"],
+    "srt": ["analyze"],
+}
+
+
+class JobEventType(str, Enum):
+    JOB_STARTED = "job_started"
+    STAGE_STARTED = "stage_started"
+    MESSAGE = "message"
+    ANALYSIS_EVENT = "analysis_event"  # 串流分析交出的單一玩具事件 (data 為事件字典)
+    STAGE_COMPLETED = "stage_completed"
+    STAGE_FAILED = "stage_failed"
+    JOB_COMPLETED = "job_completed"
+    JOB_FAILED = "job_failed"
+
+
+@dataclass
+class Artifact:
+    """階段產生的文件引用；內容只在需要時讀取一次，不在執行緒間複製"""
+    kind: str  # 'audio' | 'transcript' | 'analysis' | 'timeline'
+    path: str
+    _content: Optional[str] = field(default=None, repr=False)
+
+    def read(self) -> str:
+        if self._content is None:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self._content = f.read()
+        return self._content
+
+    def release(self):
+        """釋放已載入的內容 (文件仍保留在磁碟上)"""
+        self._content = None
+
+
+@dataclass
+class JobOptions:
+    toy_key: str
+    profile: str = pipeline_tasks.TRANSCODE_PROFILE
+    use_vad: bool = pipeline_tasks.USE_VAD
+    engine: str = pipeline_tasks.ANALYSIS_ENGINE
+    blend_audio: bool = pipeline_tasks.BLEND_AUDIO
+    resume: bool = pipeline_tasks.DOWNLOAD_RESUME
+    analysis_mode: str = pipeline_tasks.ANALYSIS_MODE
+
+
+@dataclass
+class Job:
+    """一個輸入來源從進入管線到產生分析結果的處理狀態"""
+    source: str
+    options: JobOptions
+    kind: Optional[str] = None
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+    status: str = "pending"  # pending | running | done | failed
+    stage: Optional[str] = None
+    artifacts: Dict[str, Artifact] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    event_count: Optional[int] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    def __post_init__(self):
+        if self.kind is None:
+            self.kind = classify_input(self.source)
+        if self.kind == "audio":
+            self.artifacts["audio"] = Artifact("audio", self.source)
+        elif self.kind == "srt":
+            self.artifacts["transcript"] = Artifact("transcript", self.source)
+
+    @property
+    def stages(self) -> List[str]:
+        stages = STAGE_ROUTES.get(self.kind, [])
+        if self.options.engine == "audio":
+            # 音訊包絡引擎直接分析音訊，不需要轉錄；SRT 輸入沒有音訊可分析
+            return [] if self.kind == "srt" else [stage for stage in stages if stage != "transcribe"]
+        return stages
+
+    def next_stage(self, stage: Optional[str]) -> Optional[str]:
+        """返回 stage 之後的階段；stage 為 None 時返回第一個階段"""
+        stages = self.stages
+        if stage is None:
+            return stages[0] if stages else None
+        index = stages.index(stage) + 1
+        return stages[index] if index < len(stages) else None
+
+    @property
+    def total_seconds(self) -> Optional[float]:
+        return round(self.finished_at - self.created_at, 3) if self.finished_at else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "source": self.source,
+            "kind": self.kind,
+            "status": self.status,
+            "error": self.error,
+            "artifacts": {name: artifact.path for name, artifact in self.artifacts.items()},
+            "event_count": self.event_count,
+            "timings": dict(self.timings),
+            "total_seconds": self.total_seconds,
+        }
+
+
+@dataclass(frozen=True)
+class JobEvent:
+    job: Job
+    type: JobEventType
+    stage: Optional[str] = None
+    message: str = ""
+    elapsed: Optional[float] = None
+    data: Optional[Dict[str, Any]] = None
+
+
+EventCallback = Callable[[JobEvent], None]
+
+
+def _run_stage_func(job: Job, stage: str, notify: Callable[[str], None],
+                    on_analysis_event: Optional[Callable[[Dict[str, Any]], None]] = None):
+    options = job.options
+    if stage == "download":
+        audio_path = pipeline_tasks.download_extract(job.source, notify, options.profile, options.resume)
+        job.artifacts["audio"] = Artifact("audio", audio_path)
+    elif stage == "extract":
+        job.artifacts["audio"] = Artifact("audio", pipeline_tasks.extract_video(job.source, notify, options.profile))
+    elif stage == "transcribe":
+        srt_path, srt_content = pipeline_tasks.transcribe(job.artifacts["audio"].path, notify, options.use_vad)
+        job.artifacts["transcript"] = Artifact("transcript", srt_path, srt_content)
+    elif stage == "analyze":
+        transcript = job.artifacts.get("transcript")
+        audio = job.artifacts.get("audio")
+        analysis_path, event_count = pipeline_tasks.analyze(transcript.read() if transcript else None,
+                                                           transcript.path if transcript else None,
+                                                           options.toy_key, notify, options.engine,
+                                                           audio.path if audio else None, options.blend_audio,
+                                                           options.analysis_mode, on_analysis_event)
+        if transcript:
+            transcript.release()
+        job.artifacts["analysis"] = Artifact("analysis", analysis_path)
+        timeline_path = os.path.splitext(analysis_path)[0] + ".lvtl"
+        if os.path.exists(timeline_path):
+            job.artifacts["timeline"] = Artifact("timeline", timeline_path)
+        job.event_count = event_count
+    else:
+        raise ValueError(f"未知的階段: {stage}")
+
+
+def run_stage(job: Job, stage: str, on_event: Optional[EventCallback] = None) -> bool:
+    """
+    執行單一階段並記錄耗時，透過 on_event 回報進度。
+
+    Returns:
+        bool: 階段成功時為 True；失敗時 job.status 設為 'failed' 並記錄錯誤。
+    """
+    emit = on_event or (lambda event: None)
+    job.status = "running"
+    job.stage = stage
+    emit(JobEvent(job, JobEventType.STAGE_STARTED, stage))
+    started = time.perf_counter()
+    try:
+        with tracing.span(f"stage.{stage}", cat="stage", job=job.job_id):
+            _run_stage_func(job, stage, lambda message: emit(JobEvent(job, JobEventType.MESSAGE, stage, message)),
+                            lambda data: emit(JobEvent(job, JobEventType.ANALYSIS_EVENT, stage, data=data)))
+    except Exception as e:
+        elapsed = job.timings[stage] = round(time.perf_counter() - started, 3)
+        metrics.observe("stage_seconds", elapsed, stage=stage, status="failed")
+        job.status = "failed"
+        job.error = f"{stage}: {e}"
+        job.finished_at = time.perf_counter()
+        logger.error(f"[{job.job_id}] {stage} 階段失敗: {e}", exc_info=True)
+        emit(JobEvent(job, JobEventType.STAGE_FAILED, stage, str(e), elapsed))
+        emit(JobEvent(job, JobEventType.JOB_FAILED, stage, job.error))
+        return False
+    elapsed = job.timings[stage] = round(time.perf_counter() - started, 3)
+    metrics.observe("stage_seconds", elapsed, stage=stage, status="done")
+    emit(JobEvent(job, JobEventType.STAGE_COMPLETED, stage, elapsed=elapsed))
+    if job.next_stage(stage) is None:
+        job.status = "done"
+        job.finished_at = time.perf_counter()
+        emit(JobEvent(job, JobEventType.JOB_COMPLETED, stage, elapsed=job.total_seconds))
+    return True
+
+
+class JobEngine:
+    """
+    在背景執行緒中依序執行工作的所有階段。
+
+    進度以 JobEvent 透過 on_event 回呼送出 (在工作執行緒中呼叫)；
+    回呼不可直接操作 Tk 元件，GUI 將事件放入隊列，由主執行緒定時取出處理。
+    """
+
+    def __init__(self, on_event: EventCallback):
+        self.on_event = on_event
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, job: Job) -> Job:
+        if not job.stages:
+            if job.kind == "srt" and job.options.engine == "audio":
+                raise ValueError("音訊包絡引擎需要音訊、視訊或網址輸入，無法分析 SRT 文件。")
+            raise ValueError(f"無法辨識的輸入: {job.source}")
+        job.status = "running"
+        with self._lock:
+            self._jobs[job.job_id] = job
+        threading.Thread(target=self._run, args=(job,), name=f"job-{job.job_id}", daemon=True).start()
+        return job
+
+    def _run(self, job: Job):
+        try:
+            with tracing.span("job", cat="job", job=job.job_id, source=job.source):
+                self.on_event(JobEvent(job, JobEventType.JOB_STARTED))
+                stage = job.next_stage(None)
+                while stage is not None and run_stage(job, stage, self.on_event):
+                    stage = job.next_stage(stage)
+        finally:
+            with self._lock:
+                self._jobs.pop(job.job_id, None)
+
+    @property
+    def busy(self) -> bool:
+        """是否有尚未結束的工作 (以工作狀態判斷，不受執行緒收尾時間影響)"""
+        with self._lock:
+            return any(job.status in ("pending", "running") for job in self._jobs.values())
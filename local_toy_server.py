@@ -0,0 +1,131 @@
+import time
+import asyncio
+import logging
+import multiprocessing
+from typing import List, Dict, Any, Optional, Tuple
+
+import socketio
+
+from lovense import COMMAND_EVENT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+# 關閉時等待仍在處理的 HTTP 請求 (長輪詢) 的時間上限 (秒)
+SHUTDOWN_TIMEOUT = 0.5
+# 伺服器 ping 間隔與逾時 (秒)；同步客戶端斷線時會等到長輪詢與 ping 逾時結束，預設值會讓每次斷線耗時 20 秒以上
+PING_INTERVAL = 1.0
+
+
+class LocalToyServer:
+    """
+    本地 socket.io 模擬玩具伺服器，供負載測試與播放測試使用 (需要 aiohttp)。
+
+    記錄每個指令的到達時間 (time.monotonic)，並在 ack_delay 秒後回覆確認；
+    ack_delays 可為個別 toy 指定不同的確認延遲，用來模擬慢速玩具。
+    可在目前的事件迴圈中 start()，或以 start_in_process() 在子行程中運行
+    (負載測試及同步的 LovenseController 使用，伺服器不佔用被測端的 CPU 時間)。
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = 0, ack_delay: float = 0.0,
+                 ack_delays: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            host (str): 監聽地址。
+            port (int): 監聽埠；0 表示自動選擇。
+            ack_delay (float): 回覆確認前的延遲 (秒)。
+            ack_delays (Optional[Dict[str, float]]): 個別 toy 的確認延遲，覆寫 ack_delay。
+        """
+        self.host = host
+        self.port = port
+        self.ack_delay = ack_delay
+        self.ack_delays = ack_delays or {}
+        self.received: List[Tuple[Optional[str], Dict[str, Any], float]] = []  # (toy, 指令, 到達時間)
+        self.url: Optional[str] = None
+        self._sio: Optional[socketio.AsyncServer] = None
+        self._runner = None
+        self._process: Optional[multiprocessing.Process] = None
+        self._conn = None
+
+    async def _on_command(self, sid, data):
+        self.received.append((data.get("toy"), data, time.monotonic()))
+        delay = self.ack_delays.get(data.get("toy"), self.ack_delay)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return {"code": 200}
+
+    async def start(self) -> str:
+        """在目前的事件迴圈中啟動伺服器，返回可連接的 URL"""
+        from aiohttp import web
+
+        self._sio = socketio.AsyncServer(async_mode="aiohttp", ping_interval=PING_INTERVAL,
+                                         ping_timeout=PING_INTERVAL)
+        self._sio.on(COMMAND_EVENT, self._on_command)
+        app = web.Application()
+        self._sio.attach(app)
+        self._runner = web.AppRunner(app, shutdown_timeout=SHUTDOWN_TIMEOUT)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{self.host}:{port}"
+        logger.info(f"本地玩具伺服器已啟動: {self.url}")
+        return self.url
+
+    async def stop(self):
+        # 先停止 socket.io 的背景工作，再關閉 HTTP 伺服器 (未結束的長輪詢最多等待 SHUTDOWN_TIMEOUT 秒)
+        if self._sio is not None:
+            await self._sio.shutdown()
+            self._sio = None
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_process(self, timeout: float = 10.0) -> str:
+        """
+        在子行程中啟動伺服器，返回 URL。
+
+        伺服器不與呼叫端共用事件迴圈或 GIL，處理指令不會影響被測端的發送時間；
+        收到的指令在 stop_process() 時傳回 self.received (到達時間同樣是系統的單調時鐘)。
+        """
+        parent_conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.get_context("spawn").Process(
+            target=_serve_in_process, args=(child_conn, self.host, self.port, self.ack_delay, self.ack_delays),
+            name="local-toy-server", daemon=True)
+        self._process.start()
+        if not parent_conn.poll(timeout):
+            self._process.terminate()
+            self._process = None
+            raise RuntimeError("本地玩具伺服器啟動逾時")
+        self._conn = parent_conn
+        self.url = parent_conn.recv()
+        return self.url
+
+    def stop_process(self, timeout: float = 10.0):
+        """停止 start_in_process() 啟動的伺服器並取回收到的指令"""
+        if self._process is None:
+            return
+        self._conn.send("stop")
+        if self._conn.poll(timeout):
+            self.received = self._conn.recv()
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        self._process = None
+
+    def arrivals(self, toy: Optional[str] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """返回 (指令, 到達時間) 列表；指定 toy 時只返回該玩具的指令"""
+        return [(command, at) for t, command, at in self.received if toy is None or t == toy]
+
+
+def _serve_in_process(conn, host: str, port: int, ack_delay: float, ack_delays: Dict[str, float]):
+    """子行程入口：啟動伺服器、回報 URL，收到停止訊息後傳回收到的指令"""
+    async def serve():
+        server = LocalToyServer(host, port, ack_delay, ack_delays)
+        conn.send(await server.start())
+        await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+        await server.stop()
+        conn.send(server.received)
+
+    asyncio.run(serve())
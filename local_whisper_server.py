@@ -0,0 +1,93 @@
+import time
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = "127.0.0.1"
+TRANSCRIPTIONS_PATH = "/v1/audio/transcriptions"
+# 模擬的固定處理延遲 (秒) 與上傳頻寬 (位元組/秒)，讓延遲隨上傳大小增加
+DEFAULT_BASE_LATENCY = 0.05
+DEFAULT_UPLOAD_BYTES_PER_SECOND = 2 * 1024 * 1024
+STUB_SRT = "1\n00:00:00,000 --> 00:00:01,000\n(本地模擬轉錄)\n"
+
+
+class LocalWhisperServer:
+    """
+    本地 Whisper 模擬端點，供 transcode_profiles.benchmark_profiles 比較設定檔時使用。
+
+    只實作 POST /v1/audio/transcriptions：讀取上傳內容後依大小等待
+    base_latency + 位元組數 / upload_bytes_per_second 秒，再返回固定的 SRT，
+    不需要 API Key 也不產生費用。只使用標準函式庫，在背景執行緒中運行。
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = 0, base_latency: float = DEFAULT_BASE_LATENCY,
+                 upload_bytes_per_second: float = DEFAULT_UPLOAD_BYTES_PER_SECOND):
+        """
+        Args:
+            host (str): 監聽地址。
+            port (int): 監聽埠；0 表示自動選擇。
+            base_latency (float): 每個請求的固定延遲 (秒)。
+            upload_bytes_per_second (float): 模擬的上傳頻寬；0 表示不依大小增加延遲。
+        """
+        self.host = host
+        self.port = port
+        self.base_latency = base_latency
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.received: List[int] = []  # 每個請求的上傳位元組數
+        self.url: Optional[str] = None
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _delay(self, size: int) -> float:
+        if self.upload_bytes_per_second <= 0:
+            return self.base_latency
+        return self.base_latency + size / self.upload_bytes_per_second
+
+    def start(self) -> str:
+        """啟動伺服器，返回可作為 openai base_url 的網址 (含 /v1)"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                size = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(size)
+                if self.path.rstrip("/") != TRANSCRIPTIONS_PATH:
+                    self.send_error(404)
+                    return
+                stub.received.append(size)
+                time.sleep(stub._delay(size))
+                body = STUB_SRT.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, fmt, *args):
+                logger.debug("本地 Whisper 模擬端點: " + fmt % args)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="local-whisper", daemon=True)
+        self._thread.start()
+        self.url = f"http://{self.host}:{port}/v1"
+        logger.info(f"本地 Whisper 模擬端點已啟動: {self.url}")
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
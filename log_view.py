@@ -0,0 +1,130 @@
+import logging
+import tkinter as tk
+from collections import deque
+from tkinter import scrolledtext
+from typing import Deque, Tuple
+
+DEFAULT_MAX_LINES = 2000
+DEFAULT_FLUSH_INTERVAL_MS = 50  # 約 20 FPS，足夠即時又不會每則訊息都重繪
+
+LEVEL_NAMES = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+LEVEL_COLORS = {
+    logging.WARNING: "#b26a00",
+    logging.ERROR: "#c62828",
+}
+
+
+def infer_level(message: str) -> int:
+    """依訊息前綴推斷日誌等級 (沿用 GUI 既有的 '錯誤：'/'警告：'/'INFO:' 格式)"""
+    if message.startswith(("錯誤", "❌")):
+        return logging.ERROR
+    if message.startswith("警告"):
+        return logging.WARNING
+    if message.startswith("DEBUG"):
+        return logging.DEBUG
+    return logging.INFO
+
+
+class LogView:
+    """
+    有行數上限、批次刷新的日誌顯示區。
+
+    append() 只把訊息放進緩衝區，由定時器每 flush_interval_ms 一次性寫入元件；
+    元件只保留最後 max_lines 行 (完整日誌仍寫入 logger)。等級過濾在刷新時套用，
+    更改過濾等級時才重繪整個元件。所有方法都必須在 Tk 主執行緒中呼叫。
+    """
+
+    def __init__(self, parent, max_lines: int = DEFAULT_MAX_LINES,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS, min_level: int = logging.INFO,
+                 logger: logging.Logger = None, **text_kwargs):
+        """
+        Args:
+            parent: 父元件。
+            max_lines (int): 元件中保留的最大行數。
+            flush_interval_ms (int): 批次刷新的間隔 (毫秒)。
+            min_level (int): 顯示的最低等級。
+            logger (logging.Logger): 同時寫入的 logger (例如寫到 app.log)，None 表示不寫入。
+            **text_kwargs: 傳給 ScrolledText 的參數。
+        """
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self.min_level = min_level
+        self.logger = logger
+        self.text = scrolledtext.ScrolledText(parent, state='disabled', **text_kwargs)
+        for level, color in LEVEL_COLORS.items():
+            self.text.tag_configure(logging.getLevelName(level), foreground=color)
+
+        # 所有等級的最近訊息，供更改過濾等級時重繪
+        self._history: Deque[Tuple[int, str]] = deque(maxlen=max_lines)
+        self._pending: Deque[Tuple[int, str]] = deque(maxlen=max_lines)
+        self._line_count = 0
+        self._flush_scheduled = False
+        self.dropped = 0  # 因超過上限而未顯示過的訊息數
+
+    def pack(self, **kwargs):
+        self.text.pack(**kwargs)
+
+    def append(self, message: str, level: int = None):
+        """加入一則訊息 (不立即重繪)"""
+        if level is None:
+            level = infer_level(message)
+        if self.logger is not None:
+            self.logger.log(level, message)
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        entry = (level, message)
+        self._history.append(entry)
+        self._pending.append(entry)
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.text.after(self.flush_interval_ms, self.flush)
+
+    def flush(self):
+        """將緩衝區中的訊息一次寫入元件並裁剪超出上限的舊行"""
+        self._flush_scheduled = False
+        entries = [entry for entry in self._pending if entry[0] >= self.min_level]
+        self._pending.clear()
+        if entries:
+            self._insert(entries)
+
+    def set_min_level(self, level: int):
+        """更改過濾等級並以保留的訊息重繪元件"""
+        if level == self.min_level:
+            return
+        self.min_level = level
+        self._pending.clear()
+        self._flush_scheduled = False
+        self.text.configure(state='normal')
+        self.text.delete("1.0", tk.END)
+        self.text.configure(state='disabled')
+        self._line_count = 0
+        self._insert([entry for entry in self._history if entry[0] >= level])
+
+    def clear(self):
+        self._history.clear()
+        self._pending.clear()
+        self.text.configure(state='normal')
+        self.text.delete("1.0", tk.END)
+        self.text.configure(state='disabled')
+        self._line_count = 0
+
+    def _insert(self, entries):
+        # 只有使用者停在底部時才自動捲動，避免打斷往上翻閱
+        at_bottom = self.text.yview()[1] >= 0.999
+        self.text.configure(state='normal')
+        for level, message in entries:
+            tag = logging.getLevelName(level) if level in LEVEL_COLORS else ()
+            self.text.insert(tk.END, message + '\n', tag)
+            self._line_count += message.count('\n') + 1
+        excess = self._line_count - self.max_lines
+        if excess > 0:
+            self.text.delete("1.0", f"{excess + 1}.0")
+            self._line_count -= excess
+        self.text.configure(state='disabled')
+        if at_bottom:
+            self.text.see(tk.END)
@@ -1,14 +1,75 @@
+import time
+import threading
 import requests
 import hashlib
 import socketio
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+import metrics
+import tracing
+
+COMMAND_EVENT = "basicapi_send_toy_command_ts"
+# 同一玩具两次发送之间的最短间隔 (秒)，间隔内的更新会被合并
+DEFAULT_MIN_INTERVAL = 0.1
+# 每个连接的指令速率上限 (每秒) 及突发容量
+DEFAULT_MAX_RATE = 10.0
+DEFAULT_BURST = 5
+# 重复指令的判定容差 (秒)：新指令的持续时间超出当前指令不到此值时视为重复
+DUPLICATE_MARGIN = 0.02
+
+class TokenBucket:
+    """令牌桶限速器"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self) -> bool:
+        """尝试取得一个令牌"""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """距离下一个令牌可用的秒数"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
 
 class LovenseController:
-    def __init__(self, developer_token: str):
+    def __init__(self, developer_token: str, min_interval: float = DEFAULT_MIN_INTERVAL,
+                 max_rate: float = DEFAULT_MAX_RATE, burst: int = DEFAULT_BURST):
+        """
+        Args:
+            developer_token: Lovense 开发者令牌
+            min_interval: 同一玩具两次发送之间的最短间隔 (秒)
+            max_rate: 每秒最多发送的指令数
+            burst: 令牌桶容量 (允许的突发指令数)
+        """
         self.developer_token = developer_token
         self.socket = None
         self.domain = None
         self.https_port = None
+        # 单程网络延迟估计 (秒)，由带确认的 emit 测量并以 EWMA 平滑
+        self.latency_estimate = 0.0
+        self.latency_samples = 0
+        # 发送层: 去重、合并与限速
+        self.min_interval = min_interval
+        self.rate_limiter = TokenBucket(max_rate, burst)
+        self.stats = {"sent": 0, "merged": 0, "dropped": 0}
+        self._send_lock = threading.RLock()
+        self._last_state: Dict[Any, tuple] = {}     # toy -> (状态, 过期时间)
+        self._last_sent_at: Dict[Any, float] = {}   # toy -> 上次发送时间
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._flush_timer: Optional[threading.Timer] = None
     
     def get_qr_code(self, user_id: str, username: str) -> Dict[str, Any]:
         """获取二维码供用户扫描连接玩具"""
@@ -52,7 +113,7 @@ class LovenseController:
         if toy_id:
             command["toy"] = toy_id
             
-        self.socket.emit("basicapi_send_toy_command_ts", command)
+        self.send_command(command)
     
     def stop_all(self):
         """停止所有玩具"""
@@ -62,7 +123,135 @@ class LovenseController:
             "timeSec": 0,
             "apiVer": 1
         }
-        self.socket.emit("basicapi_send_toy_command_ts", command)
+        self.send_command(command)
+
+    def send_command(self, command: Dict[str, Any], measure_latency: bool = True):
+        """发送任意玩具指令 (经过去重、合并与限速)
+
+        - 与玩具当前状态相同、且当前指令的持续时间已涵盖新指令的指令会被丢弃
+          (到期前稍早送达的维持指令会延长持续时间，因此照常发送)
+        - 在 min_interval 内或超出速率限制的更新会被合并，只发送最后一个
+        - Stop 指令不受合并与限速影响，立即发送
+
+        Args:
+            command: Lovense 指令字典
+            measure_latency: 是否请求服务器确认以测量往返延迟
+        """
+        toy = command.get("toy")
+        now = time.monotonic()
+        with self._send_lock:
+            if command.get("action") == "Stop":
+                self._drop_pending(toy)
+                self._dispatch(command, measure_latency, now)
+                return
+
+            if self._is_duplicate(command, now) and toy not in self._pending:
+                self._count("dropped")
+                return
+
+            since_last = now - self._last_sent_at.get(toy, float("-inf"))
+            if since_last >= self.min_interval and toy not in self._pending and self.rate_limiter.try_acquire():
+                self._dispatch(command, measure_latency, now)
+                return
+
+            if self._pending.get(toy) is not None:
+                self._count("merged")
+            self._pending[toy] = command
+            delay = max(self.min_interval - since_last, self.rate_limiter.wait_time(), 0.0)
+            self._schedule_flush(delay)
+
+    def flush(self):
+        """立即发送所有等待中的合并指令"""
+        with self._send_lock:
+            pending, self._pending = self._pending, {}
+            for command in pending.values():
+                self._dispatch(command, True, time.monotonic())
+
+    def _flush_due(self):
+        """定时器回调: 在速率允许时发送等待中的指令"""
+        with self._send_lock:
+            self._flush_timer = None
+            now = time.monotonic()
+            for toy in list(self._pending):
+                since_last = now - self._last_sent_at.get(toy, float("-inf"))
+                if self._is_duplicate(self._pending[toy], now):
+                    # 合并后的最终状态与当前状态相同，无需发送
+                    del self._pending[toy]
+                    self._count("dropped")
+                    continue
+                if since_last < self.min_interval or not self.rate_limiter.try_acquire():
+                    continue
+                self._dispatch(self._pending.pop(toy), True, now)
+            if self._pending:
+                self._schedule_flush(max(self.rate_limiter.wait_time(), self.min_interval / 2))
+
+    def _drop_pending(self, toy: Any):
+        """Stop 之前丢弃等待中的合并指令，避免 Stop 之后又被 _flush_due 发出而重新启动玩具
+
+        不指定玩具的 Stop (例如 stop_all) 会停止所有玩具，因此清空全部等待中的指令；
+        指定玩具时丢弃该玩具及发给所有玩具 (toy 为 None) 的指令。
+        """
+        toys = list(self._pending) if toy is None else [toy, None]
+        for key in toys:
+            if self._pending.pop(key, None) is not None:
+                self._count("merged")
+        if not self._pending and self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(delay, self._flush_due)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _is_duplicate(self, command: Dict[str, Any], now: float) -> bool:
+        """玩具已处于相同状态，且当前指令的到期时间涵盖新指令的持续时间"""
+        state, expires_at = self._last_state.get(command.get("toy"), (None, 0.0))
+        return self._command_state(command) == state and self._expiry(command, now) <= expires_at + DUPLICATE_MARGIN
+
+    @staticmethod
+    def _expiry(command: Dict[str, Any], now: float) -> float:
+        time_sec = command.get("timeSec") or 0
+        return now + time_sec if time_sec > 0 else float("inf")
+
+    @staticmethod
+    def _command_state(command: Dict[str, Any]) -> tuple:
+        return (command.get("command"), command.get("action"),
+                command.get("loopRunningSec"), command.get("loopPauseSec"),
+                command.get("rule"), command.get("strength"))
+
+    def _dispatch(self, command: Dict[str, Any], measure_latency: bool, now: float):
+        """实际发出指令并更新状态与计数器"""
+        self._last_state[command.get("toy")] = (self._command_state(command), self._expiry(command, now))
+        self._last_sent_at[command.get("toy")] = now
+        self._count("sent")
+        self._emit(command, measure_latency)
+
+    def _emit(self, command: Dict[str, Any], measure_latency: bool = True):
+        tracing.instant("lovense.emit", cat="lovense", action=command.get("action"), toy=command.get("toy"))
+        if measure_latency:
+            sent_at = time.monotonic()
+            self.socket.emit(COMMAND_EVENT, command,
+                             callback=lambda *args: self._record_latency(time.monotonic() - sent_at))
+        else:
+            self.socket.emit(COMMAND_EVENT, command)
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        metrics.inc("lovense_commands_total", result=result, client="sync")
+
+    def _record_latency(self, rtt: float, alpha: float = 0.2):
+        """以 EWMA 更新单程延迟估计"""
+        tracing.instant("lovense.ack", cat="lovense", rtt_ms=round(rtt * 1000, 1))
+        metrics.observe("lovense_ack_seconds", rtt, client="sync")
+        one_way = rtt / 2.0
+        if self.latency_samples == 0:
+            self.latency_estimate = one_way
+        else:
+            self.latency_estimate = (1 - alpha) * self.latency_estimate + alpha * one_way
+        self.latency_samples += 1
 
 # 使用示例
 def main():
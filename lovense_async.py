@@ -0,0 +1,199 @@
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, Optional, List
+
+import socketio
+
+from lovense import COMMAND_EVENT
+import metrics
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ACK_TIMEOUT = 5.0
+DEFAULT_MAX_QUEUE = 100
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 30.0
+
+class AsyncLovenseController:
+    """基于 socketio.AsyncClient 的异步玩具控制器
+
+    - 每条指令使用带确认的 emit，并测量往返延迟
+    - 断线后以带抖动的指数退避自动重连
+    - 断线期间的指令进入有界队列，重连后依序补发 (队列满时丢弃最旧的指令)
+    - 多个控制器可以在同一个事件循环中运行，不需要为每个连接开线程
+    """
+
+    def __init__(self, socket_url: str, ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+                 max_queue: int = DEFAULT_MAX_QUEUE, backoff_base: float = DEFAULT_BACKOFF_BASE,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX, transports: Optional[List[str]] = None):
+        """
+        Args:
+            socket_url: 玩具 WebSocket 服务器地址 (例如 https://domain:port)
+            ack_timeout: 等待指令确认的超时时间 (秒)
+            max_queue: 断线期间最多缓存的指令数
+            backoff_base: 重连退避的初始等待时间 (秒)
+            backoff_max: 重连退避的最长等待时间 (秒)
+            transports: socket.io 传输方式，默认只使用 websocket
+        """
+        self.socket_url = socket_url
+        self.ack_timeout = ack_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.transports = transports or ["websocket"]
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("disconnect", self._on_disconnect)
+        self.queue: deque = deque(maxlen=max_queue)
+        self.latency_estimate = 0.0   # 单程延迟估计 (秒)
+        self.rtt_samples: deque = deque(maxlen=1000)
+        self.stats = {"sent": 0, "acked": 0, "timeouts": 0, "queued": 0, "queue_dropped": 0, "reconnects": 0}
+        self._closing = False
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._connected = asyncio.Event()
+
+    @classmethod
+    def from_domain(cls, domain: str, port: str, **kwargs) -> "AsyncLovenseController":
+        """使用 Lovense 回调提供的 domain 与 port 创建控制器"""
+        return cls(f"https://{domain}:{port}", **kwargs)
+
+    @property
+    def connected(self) -> bool:
+        return self.sio.connected
+
+    async def connect(self):
+        """建立连接；失败时转入后台自动重连"""
+        self._closing = False
+        try:
+            await self.sio.connect(self.socket_url, transports=self.transports)
+            self._connected.set()
+            logger.info(f"已连接到 {self.socket_url}")
+            await self._drain_queue()
+        except socketio.exceptions.ConnectionError as e:
+            logger.warning(f"连接 {self.socket_url} 失败: {e}，将在后台重连")
+            self._start_reconnect()
+
+    async def close(self):
+        """关闭连接并停止重连"""
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+    async def wait_connected(self, timeout: Optional[float] = None):
+        """等待连接建立"""
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def _on_disconnect(self, *args):
+        self._connected.clear()
+        if not self._closing:
+            logger.warning(f"与 {self.socket_url} 的连接中断，开始自动重连")
+            self._start_reconnect()
+
+    def _start_reconnect(self):
+        if self._closing or (self._reconnect_task and not self._reconnect_task.done()):
+            return
+        self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        attempt = 0
+        while not self._closing and not self.sio.connected:
+            # 指数退避 + 全抖动，避免大量会话同时重连
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+            await asyncio.sleep(delay)
+            attempt += 1
+            try:
+                await self.sio.connect(self.socket_url, transports=self.transports)
+            except socketio.exceptions.ConnectionError as e:
+                logger.debug(f"第 {attempt} 次重连失败: {e}")
+                continue
+            self.stats["reconnects"] += 1
+            self._connected.set()
+            logger.info(f"第 {attempt} 次重连成功: {self.socket_url}")
+            await self._drain_queue()
+
+    async def _drain_queue(self):
+        while self.queue and self.sio.connected:
+            await self._emit(self.queue.popleft())
+
+    def _enqueue(self, command: Dict[str, Any]):
+        if len(self.queue) == self.queue.maxlen:
+            self.stats["queue_dropped"] += 1
+        self.queue.append(command)
+        self.stats["queued"] += 1
+
+    async def _emit(self, command: Dict[str, Any]) -> Optional[float]:
+        sent_at = time.monotonic()
+        self.stats["sent"] += 1
+        try:
+            with tracing.span("lovense.call", cat="lovense", async_id=f"lovense-{self.stats['sent']}",
+                              action=command.get("action")):
+                await self.sio.call(COMMAND_EVENT, command, timeout=self.ack_timeout)
+        except socketio.exceptions.TimeoutError:
+            self.stats["timeouts"] += 1
+            metrics.inc("lovense_commands_total", result="timeout", client="async")
+            logger.warning(f"指令确认超时 ({self.ack_timeout} 秒): {command.get('action')}")
+            return None
+        except socketio.exceptions.BadNamespaceError:
+            # 发送途中断线，放回队列等待重连
+            self.stats["sent"] -= 1
+            self._enqueue(command)
+            return None
+        rtt = time.monotonic() - sent_at
+        self.stats["acked"] += 1
+        self.rtt_samples.append(rtt)
+        metrics.inc("lovense_commands_total", result="acked", client="async")
+        metrics.observe("lovense_ack_seconds", rtt, client="async")
+        one_way = rtt / 2.0
+        self.latency_estimate = one_way if self.stats["acked"] == 1 else 0.8 * self.latency_estimate + 0.2 * one_way
+        return rtt
+
+    async def send_command(self, command: Dict[str, Any]) -> Optional[float]:
+        """发送指令并等待确认
+
+        Returns:
+            往返延迟 (秒)；断线入队或确认超时时返回 None
+        """
+        if not self.sio.connected:
+            self._enqueue(command)
+            self._start_reconnect()
+            return None
+        return await self._emit(command)
+
+    async def vibrate(self, strength: int, duration: int, toy_id: str = None) -> Optional[float]:
+        """控制玩具振动 (参数同 LovenseController.vibrate)"""
+        command = {
+            "command": "Function",
+            "action": f"Vibrate:{strength}",
+            "timeSec": duration,
+            "apiVer": 1
+        }
+        if toy_id:
+            command["toy"] = toy_id
+        return await self.send_command(command)
+
+    async def stop_all(self) -> Optional[float]:
+        """停止所有玩具"""
+        return await self.send_command({
+            "command": "Function",
+            "action": "Stop",
+            "timeSec": 0,
+            "apiVer": 1
+        })
+
+    def latency_stats(self) -> Dict[str, float]:
+        """往返延迟统计 (毫秒)"""
+        samples = sorted(r * 1000.0 for r in self.rtt_samples)
+        if not samples:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0}
+        return {
+            "count": len(samples),
+            "mean_ms": sum(samples) / len(samples),
+            "p50_ms": samples[len(samples) // 2],
+            "p95_ms": samples[min(len(samples) - 1, int(0.95 * (len(samples) - 1) + 0.5))],
+            "max_ms": samples[-1],
+        }
@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Tuple
+
+# 指標名稱 → (類型, 說明)；名稱沿用 Prometheus 慣例 (計數器以 _total 結尾，單位寫在名稱中)
+METRICS = {
+    "download_bytes_total": ("counter", "實際下載的位元組數 (不含續傳前已完成的部分)"),
+    "download_seconds": ("summary", "下載耗時 (秒)"),
+    "ffmpeg_seconds": ("summary", "ffmpeg 轉碼/提取的牆鐘時間 (秒)"),
+    "ffmpeg_output_bytes_total": ("counter", "ffmpeg 輸出的音訊位元組數"),
+    "whisper_requests_total": ("counter", "Whisper 轉錄請求數"),
+    "whisper_upload_bytes_total": ("counter", "上傳到 Whisper 的位元組數"),
+    "whisper_request_seconds": ("summary", "Whisper 請求延遲 (秒)"),
+    "llm_requests_total": ("counter", "LLM 分析請求數"),
+    "llm_prompt_tokens_total": ("counter", "LLM 輸入 token 數"),
+    "llm_completion_tokens_total": ("counter", "LLM 輸出 token 數"),
+    "llm_cached_tokens_total": ("counter", "命中提示快取的輸入 token 數"),
+    "llm_request_seconds": ("summary", "LLM 請求延遲 (秒，串流為到最後一個 chunk 的時間)"),
+    "analysis_events_total": ("counter", "分析生成的事件數"),
+    "cache_hits_total": ("counter", "本地結果快取命中次數"),
+    "stage_seconds": ("summary", "工作階段耗時 (秒)"),
+    "lovense_commands_total": ("counter", "玩具指令數 (依結果: sent/merged/dropped)"),
+    "lovense_ack_seconds": ("summary", "玩具指令送出到伺服器確認的往返延遲 (秒)"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (key + '="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    執行緒安全的行程內指標登錄表。
+
+    只有計數器 (inc) 與摘要 (observe: 次數/總和/最小/最大) 兩種類型，
+    足夠計算吞吐量、平均延遲和成本；可匯出為 JSON 報告或 Prometheus 文字格式。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """清除所有數值並重新開始計時 (例如每次執行開始時)"""
+        with self._lock:
+            self._counters: Dict[Tuple[str, Labels], float] = {}
+            self._summaries: Dict[Tuple[str, Labels], Dict[str, float]] = {}
+            self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, _labels(labels))
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is None:
+                self._summaries[key] = {"count": 1, "sum": value, "min": value, "max": value}
+            else:
+                summary["count"] += 1
+                summary["sum"] += value
+                summary["min"] = min(summary["min"], value)
+                summary["max"] = max(summary["max"], value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """以 with 區塊量測耗時並記錄到摘要 (例外時也會記錄)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter_value(self, name: str, **labels) -> float:
+        """返回計數器的值；不指定標籤時為所有標籤的總和"""
+        wanted = set(_labels(labels))
+        with self._lock:
+            return sum(value for (key, key_labels), value in self._counters.items()
+                       if key == name and wanted <= set(key_labels))
+
+    def summary_value(self, name: str) -> Dict[str, float]:
+        """返回摘要在所有標籤上合併後的 count/sum"""
+        with self._lock:
+            items = [summary for (key, _), summary in self._summaries.items() if key == name]
+        return {"count": sum(s["count"] for s in items), "sum": sum(s["sum"] for s in items)}
+
+    # --- 匯出 ---
+    def report(self) -> Dict[str, Any]:
+        """產生 JSON 報告：原始指標加上吞吐量、平均延遲等衍生值"""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in sorted(self._counters.items())]
+            summaries = [{"name": name, "labels": dict(labels), **{k: round(v, 6) for k, v in summary.items()},
+                          "avg": round(summary["sum"] / summary["count"], 6)}
+                         for (name, labels), summary in sorted(self._summaries.items())]
+            started_at = self.started_at
+
+        download = self.summary_value("download_seconds")
+        whisper = self.summary_value("whisper_request_seconds")
+        llm = self.summary_value("llm_request_seconds")
+        prompt_tokens = self.counter_value("llm_prompt_tokens_total")
+        derived = {
+            "download_throughput_bytes_per_second":
+                round(self.counter_value("download_bytes_total") / download["sum"], 1) if download["sum"] else None,
+            "whisper_avg_seconds": round(whisper["sum"] / whisper["count"], 3) if whisper["count"] else None,
+            "llm_avg_seconds": round(llm["sum"] / llm["count"], 3) if llm["count"] else None,
+            "llm_cached_token_ratio":
+                round(self.counter_value("llm_cached_tokens_total") / prompt_tokens, 3) if prompt_tokens else None,
+        }
+        return {
+            "started_at": started_at,
+            "duration_seconds": round(time.time() - started_at, 3),
+            "counters": counters,
+            "summaries": summaries,
+            "derived": derived,
+        }
+
+    def to_prometheus(self) -> str:
+        """以 Prometheus 文字格式 (exposition format) 輸出所有指標"""
+        with self._lock:
+            series: Dict[str, list] = {}
+            for (name, labels), value in self._counters.items():
+                series.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:g}")
+            for (name, labels), summary in self._summaries.items():
+                series.setdefault(name, []).extend([
+                    f"{name}_count{_format_labels(labels)} {summary['count']:g}",
+                    f"{name}_sum{_format_labels(labels)} {summary['sum']:.6f}",
+                ])
+
+        lines = []
+        for name in sorted(series):
+            kind, help_text = METRICS.get(name, ("untyped", ""))
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(sorted(series[name]))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """寫入報告；副檔名為 .prom 時使用 Prometheus 文字格式，否則為 JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            if path.endswith('.prom'):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+
+# 行程共用的登錄表；各模組直接呼叫下列函數
+REGISTRY = MetricsRegistry()
+
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+reset = REGISTRY.reset
+report = REGISTRY.report
+to_prometheus = REGISTRY.to_prometheus
+write = REGISTRY.write
+
+
+def write_reports(directory: str, name: str = "metrics") -> Tuple[str, str]:
+    """在 directory 中寫入 <name>.json 與 <name>.prom，返回兩個路徑"""
+    os.makedirs(directory, exist_ok=True)
+    json_path = os.path.join(directory, f"{name}.json")
+    prom_path = os.path.join(directory, f"{name}.prom")
+    write(json_path)
+    write(prom_path)
+    return json_path, prom_path
@@ -0,0 +1,144 @@
+import math
+import logging
+from typing import List, Dict, Any, Optional
+
+from event_utils import sort_events, event_time, event_strengths, clamp_strength
+from srt_utils import seconds_to_srt_time
+
+logger = logging.getLogger(__name__)
+
+# Lovense Pattern 指令的功能代碼
+PATTERN_FEATURE_CODES = {
+    "Vibrate": "v",
+    "Rotate": "r",
+    "Pump": "p",
+    "Thrusting": "t",
+    "Fingering": "f",
+    "Suction": "s",
+    "Depth": "d",
+    "Oscillate": "o",
+}
+# Pattern 的強度序列最多 50 個值，步進間隔最少 100 ms
+MAX_PATTERN_STEPS = 50
+MIN_STEP_MS = 100
+DEFAULT_STEP_MS = 500
+# 少於此數量的連續事件不值得編譯為 Pattern
+MIN_RUN_EVENTS = 3
+# 前一事件結束到下一事件開始之間超過此秒數視為不連續
+MAX_GAP_SECONDS = 1.0
+# 比較取樣時間與事件時間時的浮點容差 (秒)
+TIME_EPSILON = 1e-6
+
+
+def _is_patternable(event: Dict[str, Any]) -> bool:
+    command = event.get("command") or {}
+    if command.get("command", "Function") != "Function":
+        return False
+    if command.get("loopRunningSec") or command.get("loopPauseSec"):
+        return False
+    strengths = event_strengths(event)
+    return len(strengths) == 1 and next(iter(strengths)) in PATTERN_FEATURE_CODES
+
+
+def _split_runs(events: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """將事件切分為可編譯的連續段落 (同一玩具、同一功能、無循環參數、無時間缺口)"""
+    runs: List[List[Dict[str, Any]]] = []
+    current: List[Dict[str, Any]] = []
+    for event in events:
+        if not _is_patternable(event):
+            if current:
+                runs.append(current)
+                current = []
+            runs.append([event])
+            continue
+        if current:
+            prev = current[-1]
+            same_function = set(event_strengths(prev)) == set(event_strengths(event))
+            same_toy = (prev.get("command") or {}).get("toy") == (event.get("command") or {}).get("toy")
+            prev_end = event_time(prev) + float((prev.get("command") or {}).get("timeSec") or 0)
+            gap = event_time(event) - prev_end
+            if not same_function or not same_toy or gap > MAX_GAP_SECONDS:
+                runs.append(current)
+                current = []
+        current.append(event)
+    if current:
+        runs.append(current)
+    return runs
+
+
+def _sample_run(run: List[Dict[str, Any]], step_seconds: float) -> List[int]:
+    """
+    以 step_seconds 取樣得到強度序列。
+
+    保持原本的階梯語意：每個取樣點重複當時生效事件的強度 (不在事件之間插值)，
+    事件的 timeSec 結束後到下一事件開始前為 0 (timeSec 為 0 表示持續到下一事件)。
+    """
+    times = [event_time(e) for e in run]
+    values = [next(iter(event_strengths(e).values())) for e in run]
+    durations = [float((e.get("command") or {}).get("timeSec") or 0) for e in run]
+    ends = [t + d if d > 0 else math.inf for t, d in zip(times, durations)]
+    end = times[-1] + (durations[-1] or step_seconds)
+    count = max(1, int(math.ceil((end - times[0]) / step_seconds - TIME_EPSILON)))
+    samples = []
+    j = 0
+    for k in range(count):
+        t = times[0] + k * step_seconds
+        while j + 1 < len(times) and times[j + 1] <= t + TIME_EPSILON:
+            j += 1
+        samples.append(clamp_strength(values[j]) if t < ends[j] - TIME_EPSILON else 0)
+    return samples
+
+
+def build_pattern_command(feature: str, strengths: List[int], step_ms: int,
+                          toy: Optional[str] = None) -> Dict[str, Any]:
+    """建立 Lovense Pattern 指令字典"""
+    if len(strengths) > MAX_PATTERN_STEPS:
+        raise ValueError(f"Pattern 強度序列最多 {MAX_PATTERN_STEPS} 個值")
+    command = {
+        "command": "Pattern",
+        "rule": f"V:1;F:{PATTERN_FEATURE_CODES[feature]};S:{step_ms}#",
+        "strength": ";".join(str(s) for s in strengths),
+        "timeSec": round(len(strengths) * step_ms / 1000.0, 3),
+        "apiVer": 2,
+    }
+    if toy:
+        command["toy"] = toy
+    return command
+
+
+def compile_events(events: List[Dict[str, Any]], step_ms: int = DEFAULT_STEP_MS,
+                   min_run_events: int = MIN_RUN_EVENTS) -> List[Dict[str, Any]]:
+    """
+    將分析事件編譯為較少的網路訊息。
+
+    同一玩具、同一功能的連續事件會以步進間隔取樣 (保持各事件的強度) 並打包為 Pattern 指令 (每則最多 50 步)，
+    只在不連續處 (Stop、功能或玩具切換、循環模式、時間缺口) 保留原本的 Function 指令。
+
+    Args:
+        events (List[Dict[str, Any]]): ContentAnalyzer 產生的事件列表。
+        step_ms (int): Pattern 的步進間隔 (毫秒，最少 100)。
+        min_run_events (int): 至少多少個連續事件才編譯為 Pattern。
+
+    Returns:
+        List[Dict[str, Any]]: 與輸入相同 schema 的事件列表，可直接交給 EventPlayer 播放。
+    """
+    step_ms = max(MIN_STEP_MS, int(step_ms))
+    step_seconds = step_ms / 1000.0
+    compiled: List[Dict[str, Any]] = []
+    for run in _split_runs(sort_events(events)):
+        if len(run) < min_run_events:
+            compiled.extend(run)
+            continue
+        feature = next(iter(event_strengths(run[0])))
+        toy = (run[0].get("command") or {}).get("toy")
+        samples = _sample_run(run, step_seconds)
+        start = event_time(run[0])
+        for offset in range(0, len(samples), MAX_PATTERN_STEPS):
+            chunk = samples[offset:offset + MAX_PATTERN_STEPS]
+            compiled.append({
+                "timestamp": seconds_to_srt_time(start + offset * step_seconds),
+                "description": f"Pattern: {feature} {len(chunk)} 步 (合併自 {len(run)} 個事件)",
+                "command": build_pattern_command(feature, chunk, step_ms, toy),
+            })
+    logger.info(f"Pattern 編譯完成：{len(events)} 個事件 -> {len(compiled)} 則訊息")
+    return compiled
@@ -0,0 +1,235 @@
+import os
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from disk_cache import DiskCache
+from config import get_setting, get_bool_setting
+
+logger = logging.getLogger(__name__)
+
+# --- 常數 ---
+DOWNLOAD_DIR = './downloads'
+TRANSCRIPT_DIR = './transcripts'
+ANALYSIS_DIR = './analysis_outputs'
+TOY_FUNCTIONS_JSON = 'toys_funcs.json'
+TRANSCRIPT_CACHE_DIR = os.path.join(TRANSCRIPT_DIR, '.cache')
+TRANSCRIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+ANALYSIS_CACHE_DIR = os.path.join(ANALYSIS_DIR, '.cache')
+ANALYSIS_CACHE_MAX_BYTES = 100 * 1024 * 1024
+TRANSCODE_PROFILE = get_setting('TRANSCODE_PROFILE', 'auto')
+USE_VAD = get_bool_setting('USE_VAD')
+# 分析請求的輸入 token 預算；未設置時使用 ContentAnalyzer 的預設值
+ANALYSIS_MAX_INPUT_TOKENS = get_setting('ANALYSIS_MAX_INPUT_TOKENS')
+# 預設分析引擎：'llm' (OpenAI)、'rules' (本地規則引擎) 或 'audio' (音訊包絡，不需要轉錄)
+ANALYSIS_ENGINE = get_setting('ANALYSIS_ENGINE', 'llm')
+# LLM 分析方式：'single' (整份字幕一次請求)、'windowed' (切分為重疊窗口並行分析)
+# 'stream' (串流請求，每個事件解析完成就交給 on_event) 或 'auto' (先嘗試單次請求，超過 token 預算時改用窗口化分析)
+ANALYSIS_MODES = ('auto', 'single', 'windowed', 'stream')
+ANALYSIS_MODE = get_setting('ANALYSIS_MODE', 'auto')
+# 音訊包絡強度曲線的時間解析度 (秒)；未設置時使用 audio_envelope 的預設值
+AUDIO_ENVELOPE_RESOLUTION = get_setting('AUDIO_ENVELOPE_RESOLUTION')
+# 以音訊包絡加密 LLM/規則引擎的事件 (需要音訊文件)
+BLEND_AUDIO = get_bool_setting('BLEND_AUDIO')
+# 網址下載時將分段暫存到磁碟並記錄檢查點，中斷後重新執行可續傳 (預設只經過記憶體串流給 ffmpeg)
+DOWNLOAD_RESUME = get_bool_setting('DOWNLOAD_RESUME')
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.webm', '.mov', '.avi')
+AUDIO_EXTENSIONS = ('.mp3', '.ogg', '.m4a', '.wav', '.opus', '.flac')
+SRT_EXTENSIONS = ('.srt',)
+
+Notify = Callable[[str], None]
+EventSink = Callable[[Dict[str, Any]], None]
+
+# 同一行程內共用的快取實例 (DiskCache 本身是執行緒安全的，多個實例同時寫索引則不是)
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _log_notify(message: str):
+    logger.info(message)
+
+
+def get_cache(kind: str) -> DiskCache:
+    """取得 'transcript' 或 'analysis' 的共用快取"""
+    with _caches_lock:
+        if kind not in _caches:
+            if kind == "transcript":
+                _caches[kind] = DiskCache(TRANSCRIPT_CACHE_DIR, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES, suffix=".srt")
+            elif kind == "analysis":
+                _caches[kind] = DiskCache(ANALYSIS_CACHE_DIR, max_bytes=ANALYSIS_CACHE_MAX_BYTES, suffix=".json")
+            else:
+                raise ValueError(f"未知的快取類型: {kind}")
+        return _caches[kind]
+
+
+def ensure_output_dirs():
+    """建立下載、轉錄和分析輸出資料夾"""
+    for path in (DOWNLOAD_DIR, TRANSCRIPT_DIR, ANALYSIS_DIR):
+        os.makedirs(path, exist_ok=True)
+
+
+def classify_input(source: str) -> Optional[str]:
+    """
+    判斷輸入來源的類型。
+
+    Returns:
+        Optional[str]: 'url'、'video'、'audio'、'srt'，無法辨識時為 None。
+    """
+    if source.startswith("http://") or source.startswith("https://"):
+        return "url"
+    ext = os.path.splitext(source)[1].lower()
+    if ext in VIDEO_EXTENSIONS:
+        return "video"
+    if ext in AUDIO_EXTENSIONS:
+        return "audio"
+    if ext in SRT_EXTENSIONS:
+        return "srt"
+    return None
+
+
+# Step 0: Download & Extract Audio
+def download_extract(url: str, notify: Notify = _log_notify, profile: str = TRANSCODE_PROFILE,
+                     resume: bool = DOWNLOAD_RESUME) -> str:
+    """
+    下載 P**nhub 影片並提取音訊。
+
+    resume 為 True 時分段暫存到 DOWNLOAD_DIR/.parts，中斷後以相同網址重新執行會從檢查點續傳。
+
+    Returns:
+        str: 音訊文件路徑。
+
+    Raises:
+        RuntimeError: 無法下載或提取音訊時。
+    """
+    from pornhub_audio import PornhubAudioDownloader
+
+    notify(f"INFO: 開始從 {url} 下載並提取音訊...")
+    downloader = PornhubAudioDownloader(save_dir=DOWNLOAD_DIR, profile=profile, resume=resume)
+    audio_file_path = downloader.download_audio(url) # This already extracts audio
+    if not audio_file_path:
+        raise RuntimeError("無法下載或提取音訊。請檢查 URL 或 ffmpeg/phub 是否安裝正確。")
+    notify(f"成功：音訊文件已保存到 '{audio_file_path}'")
+    return audio_file_path
+
+
+def extract_video(video_path: str, notify: Notify = _log_notify, profile: str = TRANSCODE_PROFILE) -> str:
+    """從本地視訊提取音訊，返回音訊文件路徑"""
+    from transcode_profiles import transcode_file
+
+    audio_base = os.path.join(DOWNLOAD_DIR, os.path.splitext(os.path.basename(video_path))[0])
+    stats = transcode_file(video_path, audio_base, profile)
+    notify(f"INFO: 音訊提取完成 (設定檔 {stats['profile']}，{stats['output_bytes'] / 1024 / 1024:.1f} MB，"
+           f"耗時 {stats['encode_seconds']:.1f} 秒)")
+    return stats["output_path"]
+
+
+# Step 1: Transcribe Audio (Takes audio path)
+def transcribe(audio_path: str, notify: Notify = _log_notify, use_vad: bool = USE_VAD) -> Tuple[str, str]:
+    """
+    將音訊檔案轉錄為 SRT 字幕並保存。
+
+    Returns:
+        Tuple[str, str]: (SRT 文件路徑, SRT 內容)。
+    """
+    from voice2text import AudioProcessor
+
+    # Basic check if path is valid (though AudioProcessor does it too)
+    if not audio_path or not os.path.exists(audio_path):
+        raise FileNotFoundError(f"用於轉錄的音訊文件路徑無效或不存在: {audio_path}")
+
+    notify(f"INFO: 開始轉錄音訊文件: {os.path.basename(audio_path)} (可能需要幾分鐘)...")
+    audio_processor = AudioProcessor(cache=get_cache("transcript"))
+    timestamp_str = time.strftime('%Y%m%d_%H%M%S')
+    base_filename = os.path.splitext(os.path.basename(audio_path))[0]
+    final_transcript_path = os.path.join(TRANSCRIPT_DIR, f"{base_filename}_transcript_{timestamp_str}.srt")
+    transcript_content = audio_processor.transcribe_audio(audio_path, use_vad=use_vad) # Returns SRT string
+    if audio_processor.last_from_cache:
+        notify("INFO: 已從本地快取取得轉錄結果，略過 Whisper 請求。")
+    audio_processor.save_transcript(final_transcript_path) # Saves the SRT string
+    notify(f"成功：音訊轉錄完成，SRT 保存到 '{final_transcript_path}'")
+    return final_transcript_path, transcript_content
+
+
+# Step 2: Analyze SRT Content (Takes SRT content string)
+def analyze(srt_content_string: Optional[str], srt_input_path: Optional[str], toy_key: str,
+            notify: Notify = _log_notify, engine: str = ANALYSIS_ENGINE, audio_path: Optional[str] = None,
+            blend_audio: bool = BLEND_AUDIO, mode: str = ANALYSIS_MODE,
+            on_event: Optional[EventSink] = None) -> Tuple[str, int]:
+    """
+    分析 SRT 字幕內容並保存分析檔案 (JSON 和 .lvtl 時間軸)。
+
+    engine 為 'rules' 時使用本地規則引擎，不呼叫 API；為 'audio' 時直接分析 audio_path
+    的音訊包絡，不需要 SRT。blend_audio 為 True 且有 audio_path 時，以音訊包絡加密字幕分析的事件。
+    mode 決定 LLM 分析方式 (見 ANALYSIS_MODES)；'stream' 時每個平滑後的事件一解析完成就交給 on_event，
+    不必等整個回應結束 (串流交出的事件之後仍會被完整結果取代並保存)。
+
+    Returns:
+        Tuple[str, int]: (分析 JSON 路徑, 事件數量)。
+    """
+    from content_analyzer import ContentAnalyzer, format_run_stats, ENGINE_AUDIO
+    from token_budget import TokenBudgetExceeded
+
+    if mode not in ANALYSIS_MODES:
+        raise ValueError(f"未知的分析方式: {mode} (可用: {', '.join(ANALYSIS_MODES)})")
+
+    resolution = float(AUDIO_ENVELOPE_RESOLUTION) if AUDIO_ENVELOPE_RESOLUTION else None
+    if engine == ENGINE_AUDIO:
+        if not audio_path or not os.path.exists(audio_path):
+            raise FileNotFoundError(f"音訊包絡分析需要音訊文件: {audio_path}")
+    elif not srt_content_string:
+        raise ValueError("用於分析的 SRT 內容為空。")
+
+    notify(f"INFO: 開始分析{'音訊' if engine == ENGINE_AUDIO else ' SRT '}內容 (使用玩具: {toy_key}，引擎: {engine})...")
+    budget = {"max_input_tokens": int(ANALYSIS_MAX_INPUT_TOKENS)} if ANALYSIS_MAX_INPUT_TOKENS else {}
+    analyzer = ContentAnalyzer(functions_json_path=TOY_FUNCTIONS_JSON, cache=get_cache("analysis"),
+                               engine=engine, **budget)
+    timestamp_str_analysis = time.strftime('%Y%m%d_%H%M%S')
+
+    # Determine base filename for analysis output
+    if srt_input_path or audio_path: # Prefer name based on input SRT file
+        base_filename = os.path.splitext(os.path.basename(srt_input_path or audio_path))[0]
+    else: # Fallback if content came from transcription without saving path yet
+        base_filename = f"analysis_output_{timestamp_str_analysis}"
+
+    suffix = "analysis" if engine == "llm" else f"analysis_{engine}"
+    final_analysis_path = os.path.join(ANALYSIS_DIR, f"{base_filename}_{suffix}_{timestamp_str_analysis}.json")
+
+    if engine == ENGINE_AUDIO:
+        analysis_result = analyzer.analyze_audio(audio_path, toy_key, resolution)
+    elif mode == "stream":
+        analysis_result = analyzer.analyze_content_stream(srt_content_string, toy_key, on_event=on_event)
+    elif mode == "windowed":
+        analysis_result = analyzer.analyze_content_windowed(srt_content_string, toy_key)
+    else:
+        try:
+            analysis_result = analyzer.analyze_content(srt_content_string, toy_key) # Pass SRT string
+        except TokenBudgetExceeded as e:
+            if mode != "auto":
+                raise
+            notify(f"INFO: {e} 改用窗口化分析。")
+            analysis_result = analyzer.analyze_content_windowed(srt_content_string, toy_key)
+    if analyzer.last_from_cache:
+        notify("INFO: 已從本地快取取得分析結果，略過 LLM 請求。")
+    else:
+        notify(f"INFO: {format_run_stats(analyzer.last_run_stats)}")
+    if blend_audio and engine != ENGINE_AUDIO:
+        if audio_path and os.path.exists(audio_path):
+            analysis_result = analyzer.blend_audio(audio_path, toy_key, resolution=resolution)
+            notify(f"INFO: 已以音訊包絡加密事件 (插入 {analyzer.last_run_stats.get('audio_blended_events', 0)} 個)。")
+        else:
+            notify("INFO: 沒有音訊文件，略過音訊包絡加密。")
+    analyzer.save_analysis(final_analysis_path, timeline_path=os.path.splitext(final_analysis_path)[0] + ".lvtl")
+    event_count = len(analysis_result.get("events", [])) if analysis_result else 0
+    notify(f"成功：內容分析完成，生成 {event_count} 個事件，保存到 '{final_analysis_path}'")
+    return final_analysis_path, event_count
+
+
+def read_srt(srt_path: str) -> str:
+    """讀取 SRT 文件，內容為空時拋出 ValueError"""
+    with open(srt_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not content:
+        raise ValueError(f"SRT 文件 '{srt_path}' 為空。")
+    return content
@@ -0,0 +1,196 @@
+import json
+import heapq
+import time
+import logging
+import threading
+import traceback
+from typing import List, Dict, Any, Optional
+
+from config import get_bool_setting
+from event_utils import event_time
+from pattern_compiler import compile_events, DEFAULT_STEP_MS
+
+logger = logging.getLogger(__name__)
+
+# 距離目標時間小於此值時改用忙等待，以取得毫秒以下的精度
+SPIN_THRESHOLD = 0.002
+# 落後超過此值的指令直接略過 (Stop 例外)，避免播放延遲後一次湧出大量過期指令
+MAX_LATENESS = 0.5
+# 播放前是否將連續事件編譯為 Lovense Pattern 指令 (減少網路訊息數)
+COMPILE_PATTERNS = get_bool_setting('COMPILE_PATTERNS')
+
+
+def load_analysis_events(json_path: str) -> List[Dict[str, Any]]:
+    """從分析結果 JSON 文件讀取 events 列表"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    events = data.get("events") if isinstance(data, dict) else None
+    if not isinstance(events, list):
+        raise ValueError(f"分析文件缺少 'events' 列表: {json_path}")
+    return events
+
+
+class EventPlayer:
+    """
+    依照分析結果的時間戳即時播放玩具指令。
+
+    指令以 heap 依時間排序，所有目標時間都相對於同一個單調時鐘起點計算，
+    因此每次等待的誤差不會累積 (漂移修正)。送出時間會依控制器量測到的
+    網路延遲提前 (lookahead)，讓指令抵達玩具的時間對齊影片時間軸。
+    """
+
+    def __init__(self, controller, events: List[Dict[str, Any]], lookahead: Optional[float] = None,
+                 max_lateness: float = MAX_LATENESS, compile_patterns: bool = COMPILE_PATTERNS,
+                 pattern_step_ms: int = DEFAULT_STEP_MS):
+        """
+        Args:
+            controller: 具有 send_command(command) 方法的控制器 (例如 LovenseController)。
+            events (List[Dict[str, Any]]): 分析結果中的事件列表。
+            lookahead (Optional[float]): 固定的提前送出秒數；None 表示使用控制器的 latency_estimate。
+            max_lateness (float): 指令落後超過此秒數時略過。
+            compile_patterns (bool): 是否先以 pattern_compiler.compile_events 將連續事件打包為 Pattern 指令。
+            pattern_step_ms (int): Pattern 的步進間隔 (毫秒)。
+        """
+        self.controller = controller
+        self.lookahead = lookahead
+        self.max_lateness = max_lateness
+        self._timeline: List[tuple] = []
+        if compile_patterns:
+            events = compile_events(events, pattern_step_ms)
+        for seq, event in enumerate(events):
+            t = event_time(event)
+            command = event.get("command")
+            if t is None or not isinstance(command, dict):
+                logger.warning(f"略過無效事件: {event.get('timestamp')}")
+                continue
+            heapq.heappush(self._timeline, (t, seq, command))
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._jitter: List[float] = []
+        self.skipped = 0
+        self.dispatched = 0
+
+    @classmethod
+    def from_analysis_file(cls, controller, json_path: str, **kwargs) -> "EventPlayer":
+        """從分析結果 JSON 文件建立播放器"""
+        return cls(controller, load_analysis_events(json_path), **kwargs)
+
+    @classmethod
+    def from_timeline(cls, controller, timeline, start_offset: float = 0.0, **kwargs) -> "EventPlayer":
+        """
+        從二進位時間軸 (timeline_format.Timeline 或 .lvtl 路徑) 建立播放器。
+
+        以 Timeline.seek() 定位到 start_offset，只解碼其後的記錄；
+        播放時請以相同的 start_offset 呼叫 play()。
+        """
+        if isinstance(timeline, str):
+            from timeline_format import Timeline
+            with Timeline(timeline) as opened:
+                events = list(opened.iter_from(start_offset))
+        else:
+            events = list(timeline.iter_from(start_offset))
+        return cls(controller, events, **kwargs)
+
+    def _current_lookahead(self) -> float:
+        if self.lookahead is not None:
+            return self.lookahead
+        return getattr(self.controller, "latency_estimate", 0.0) or 0.0
+
+    def _wait_until(self, target: float) -> bool:
+        """等待到指定的單調時鐘時間；被 stop() 中斷時返回 False"""
+        while True:
+            remaining = target - time.monotonic()
+            if remaining <= 0:
+                return True
+            if remaining > SPIN_THRESHOLD:
+                if self._stop_event.wait(remaining - SPIN_THRESHOLD):
+                    return False
+            elif self._stop_event.is_set():
+                return False
+
+    def _run(self, start_offset: float):
+        timeline = list(self._timeline)
+        # 跳過起始位置之前的指令
+        while timeline and timeline[0][0] < start_offset:
+            heapq.heappop(timeline)
+        origin = time.monotonic() - start_offset
+        logger.info(f"開始播放 {len(timeline)} 個指令 (起始位置 {start_offset:.1f} 秒)")
+        try:
+            while timeline and not self._stop_event.is_set():
+                t, _, command = heapq.heappop(timeline)
+                # 每次都以最新的延遲估計計算送出時間
+                target = origin + t - self._current_lookahead()
+                if not self._wait_until(target):
+                    break
+                lateness = time.monotonic() - target
+                if lateness > self.max_lateness and command.get("action") != "Stop":
+                    self.skipped += 1
+                    logger.warning(f"指令落後 {lateness * 1000:.0f} ms，已略過: {command.get('action')}")
+                    continue
+                self.controller.send_command(command)
+                self._jitter.append(time.monotonic() - target)
+                self.dispatched += 1
+        except Exception as e:
+            logger.error(f"播放過程中發生錯誤: {e}")
+            traceback.print_exc()
+        finally:
+            logger.info(f"播放結束，共送出 {self.dispatched} 個指令，略過 {self.skipped} 個。")
+
+    def play(self, start_offset: float = 0.0, blocking: bool = False):
+        """
+        開始播放。
+
+        Args:
+            start_offset (float): 從影片的第幾秒開始。
+            blocking (bool): True 表示在目前執行緒播放直到結束。
+        """
+        if self._thread and self._thread.is_alive():
+            raise RuntimeError("播放器已在播放中")
+        self._stop_event.clear()
+        self._jitter = []
+        self.skipped = 0
+        self.dispatched = 0
+        if blocking:
+            self._run(start_offset)
+            return
+        self._thread = threading.Thread(target=self._run, args=(start_offset,), daemon=True)
+        self._thread.start()
+
+    def stop(self, send_stop: bool = True):
+        """停止播放，並可選擇送出停止指令"""
+        self._stop_event.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        if send_stop and hasattr(self.controller, "stop_all"):
+            try:
+                self.controller.stop_all()
+            except Exception as e:
+                logger.error(f"送出停止指令失敗: {e}")
+
+    def wait(self, timeout: Optional[float] = None):
+        """等待背景播放結束"""
+        if self._thread:
+            self._thread.join(timeout)
+
+    def jitter_stats(self) -> Dict[str, float]:
+        """
+        送出時間相對目標時間的抖動統計 (毫秒)。
+
+        Returns:
+            Dict[str, float]: count, mean_ms, p50_ms, p95_ms, p99_ms, max_ms。
+        """
+        samples = sorted(j * 1000.0 for j in self._jitter)
+        if not samples:
+            return {"count": 0, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+
+        def percentile(q: float) -> float:
+            return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+        return {
+            "count": len(samples),
+            "mean_ms": sum(samples) / len(samples),
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": samples[-1],
+        }
@@ -2,17 +2,42 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import phub
 import logging
 import traceback
 
+from transcode_profiles import TRANSCODE_PROFILES, DEFAULT_PROFILE, resolve_profile, transcode_stream, transcode_file
+from download_engine import SegmentedDownloader
+import metrics
+import tracing
+
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
 class PornhubAudioDownloader:
-    def __init__(self, save_dir='downloads'):
+    def __init__(self, save_dir='downloads', max_workers=4, progress_callback=None, profile=DEFAULT_PROFILE,
+                 resume=False):
+        """
+        Args:
+            save_dir (str): 音訊保存目錄。
+            max_workers (int): 並行下載的分段數。
+            progress_callback (callable | None): 進度回呼 (已下載位元組, 總位元組, 每秒位元組)。
+            profile (str): 轉碼設定檔名稱 (見 transcode_profiles)，'auto' 表示依影片長度自動選擇。
+            resume (bool): 是否將分段暫存到磁碟以便中斷後續傳；False 時分段只經過記憶體串流給 ffmpeg。
+        """
         self.save_dir = save_dir
+        self.profile = profile
+        self.last_transcode_stats = None
+        self.max_workers = max_workers
+        self.progress_callback = progress_callback
+        self.resume = resume
     
+    def _log_progress(self, downloaded, total, rate):
+        if self.progress_callback:
+            self.progress_callback(downloaded, total, rate)
+        logger.info(f"下載進度: {downloaded / 1024 / 1024:.1f} MB, {rate / 1024 / 1024:.2f} MB/s")
+
     def download_audio(self, url):
         """Downloads audio from a Pornhub URL.
 
@@ -20,7 +45,7 @@ class PornhubAudioDownloader:
             url (str): The Pornhub video URL.
 
         Returns:
-            str | None: The path to the downloaded MP3 file on success, None on failure.
+            str | None: The path to the extracted audio file on success, None on failure.
         """
         try:
             # Ensure save directory exists before downloading
@@ -31,7 +56,8 @@ class PornhubAudioDownloader:
             client = phub.Client()
             
             # 獲取視頻
-            video = client.get(url)
+            with tracing.span("phub.get_video", cat="download"):
+                video = client.get(url)
             if not video:
                 logger.error("無法獲取視頻信息")
                 return None
@@ -40,52 +66,69 @@ class PornhubAudioDownloader:
             safe_title = "".join(c for c in video.title if c.isalnum() or c in (' ', '-', '_')).rstrip()
             if not safe_title: # Handle cases where title becomes empty
                  safe_title = f"video_{video.id or 'unknown'}"
-            output_filename = f"{safe_title}.mp3"
-            output_path = os.path.join(self.save_dir, output_filename)
+            duration = getattr(video, 'duration', None)
+            if hasattr(duration, 'total_seconds'):
+                duration = duration.total_seconds()
+            profile_name = resolve_profile(self.profile, duration)
+            output_base = os.path.join(self.save_dir, safe_title)
+            output_path = output_base + TRANSCODE_PROFILES[profile_name]["ext"]
 
             # Check if audio already exists
             if os.path.exists(output_path):
                 logger.info(f"音頻文件已存在: {output_path}，跳過下載。")
                 return output_path
 
-            # 使用最低品質下載以節省流量 (phub library might not directly support quality selection in download)
-            # The phub library's download usually gets the best available stream it finds.
-            # We need a temporary video file to extract audio.
+            # 優先使用串流路徑：把下載的分段直接送進 ffmpeg，只有音訊寫入磁碟
+            try:
+                with tracing.span("phub.get_segments", cat="download"):
+                    segments = video.get_segments(phub.Quality.LOW) # Request low quality
+            except AttributeError:
+                segments = None
+            if segments is not None:
+                logger.info("正在並行下載分段並同步提取音頻...")
+                # resume 時分段暫存在 .parts/<標題>/，中斷後重新執行會從檢查點續傳
+                engine = SegmentedDownloader(
+                    work_dir=os.path.join(self.save_dir, '.parts'),
+                    max_workers=self.max_workers,
+                    session=getattr(client, 'session', None),
+                    progress_callback=self._log_progress,
+                    resume=self.resume,
+                )
+                job_id = safe_title.replace(' ', '_')
+                self.last_transcode_stats = transcode_stream(
+                    engine.iter_segments(list(segments), job_id), output_base, profile_name, duration)
+                engine.cleanup(job_id)
+                logger.info(f"音頻下載並提取成功: {output_path} "
+                            f"(下載 {self.last_transcode_stats['input_bytes'] / 1024 / 1024:.1f} MB)")
+                return output_path # Return the path on success
+
+            # 舊版 phub 不提供分段時，退回先下載臨時影片再提取的方式
             temp_video_filename = f"video_{safe_title}.mp4"
             temp_video_path = os.path.join(self.save_dir, temp_video_filename)
             
             logger.info(f"開始下載視頻到臨時文件: {temp_video_path}")
+            download_started = time.perf_counter()
             # download() returns the path where it saved the file
-            downloaded_path = video.download(path=self.save_dir, filename=temp_video_filename, quality=phub.Quality.LOW) # Request low quality
+            with tracing.span("phub.download_video", cat="download"):
+                downloaded_path = video.download(path=self.save_dir, filename=temp_video_filename, quality=phub.Quality.LOW) # Request low quality
             if not downloaded_path or not os.path.exists(downloaded_path):
                 logger.error("視頻下載失敗或未找到下載的文件。")
-                # Clean up potentially partially downloaded file
-                if os.path.exists(temp_video_path): 
-                    pass
                 return None
+            metrics.inc("download_bytes_total", os.path.getsize(downloaded_path))
+            metrics.observe("download_seconds", time.perf_counter() - download_started)
                 
             # Ensure the temp path is correct in case download changed it
             temp_video_path = downloaded_path
 
             # 提取音頻 (Requires ffmpeg to be installed and in PATH)
-            # Use -vn to avoid video processing, -acodec copy if possible, or specify mp3 codec
-            cmd = f'ffmpeg -i "{temp_video_path}" -vn -acodec libmp3lame -q:a 2 "{output_path}" -y'
-            # Alternative (potentially faster if source audio is compatible): cmd = f'ffmpeg -i "{temp_video_path}" -vn -acodec copy "{output_path}" -y'
-            
             logger.info("正在提取音頻...")
-            exit_code = os.system(cmd)
-            
-            
-            if exit_code == 0 and os.path.exists(output_path):
-                logger.info(f"音頻下載並提取成功: {output_path}")
-                return output_path # Return the path on success
-            else:
-                logger.error(f"音頻提取失敗 (ffmpeg exit code: {exit_code})")
-                # Clean up failed output file if it exists
-                if os.path.exists(output_path): 
-                    try: os.remove(output_path) 
-                    except OSError: pass
-                return None # Return None on failure
+            try:
+                self.last_transcode_stats = transcode_file(temp_video_path, output_base, profile_name)
+            finally:
+                try: os.remove(temp_video_path)
+                except OSError: pass
+            logger.info(f"音頻下載並提取成功: {output_path}")
+            return output_path # Return the path on success
                 
         except ImportError:
             logger.error("缺少 'phub' 庫。請運行 'pip install phub'")
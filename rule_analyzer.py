@@ -0,0 +1,239 @@
+import re
+import logging
+from typing import List, Dict, Any, Optional, Tuple
+
+from srt_utils import parse_srt
+from event_utils import make_event, smooth_events, clamp_strength, MAX_STRENGTH, MAX_STRENGTH_STEP
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FUNCTION = "Vibrate"
+# 以強度控制的功能 (Position 是位置而非強度，不自動使用)
+INTENSITY_FUNCTIONS = ("Vibrate", "Rotate", "Pump", "Thrusting")
+BASE_STRENGTH = 6            # 開始時及平淡段落回落到的強度
+RELATIVE_STEP = 3            # "開大一點"/"慢一點" 等相對指令的調整量
+HEARTBEAT_SECONDS = 8.0      # 強度不變時每隔多久產生一個微調事件
+IDLE_SECONDS = 15.0          # 超過此時間沒有字幕時回落到基礎強度
+MIN_EVENT_SECONDS = 2.0
+MAX_EVENT_SECONDS = 15.0     # 強度不變時最長的事件持續時間 (smooth_events 的 hold_seconds)
+
+# 非指令字幕的強度區間 (與系統提示的低 1-8 / 中 9-15 / 高 16-20 一致)
+LEVEL_STRENGTH = {"low": 5, "medium": 12, "high": 17}
+
+_CN_NUMBERS = {"零": 0, "一": 1, "二": 2, "兩": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+_NUM = r"(\d{1,3}|[零一二兩三四五六七八九十]{1,3})"
+
+
+def _words(*words: str) -> "re.Pattern":
+    return re.compile("|".join(words), re.IGNORECASE)
+
+
+# --- 指令詞庫 (與系統提示中的 "開大一點"、"停下"、"用 XX 強度" 等指令對應) ---
+_DONT_STOP = _words(r"不要停", r"別停", r"不准停", r"繼續", r"don'?t stop", r"keep going")
+_STOP = _words(r"停下", r"停止", r"停一下", r"先停", r"停手", r"關掉", r"別動", r"不要動",
+               r"\bstop\b", r"\bhold on\b", r"turn it off")
+# "最大/最小" 必須是調整強度的說法 (開到最大、最大力)，避免 "最大的問題" 之類的誤判
+_SET_TO = r"(?:開到|調到|調成|開|用)\s*"
+_INTENSITY_WORD = r"\s*(?:力|力氣|力度|強度|檔|档|速|速度|功率)"
+_MAX = _words(_SET_TO + r"(?:最大|最強)", r"(?:最大|最強)" + _INTENSITY_WORD, r"全開", r"full power",
+              r"\bmax(imum)?\b", r"as hard as")
+_MIN = _words(_SET_TO + r"(?:最小|最弱|最輕)", r"(?:最小|最弱|最輕)" + _INTENSITY_WORD, r"\bminimum\b", r"lowest")
+_ABSOLUTE = [
+    re.compile(r"(?:用|開到|調到|調成|開|強度|力度|等級)\s*" + _NUM + r"\s*(?:級|檔|档|的?強度)"),
+    re.compile(r"(?:強度|力度|等級)\s*(?:調到|開到|是|為)?\s*" + _NUM),
+    re.compile(r"(?:level|strength|intensity|power)\s*(?:to\s*)?(\d{1,3})", re.IGNORECASE),
+]
+_INCREASE = _words(r"開大", r"大一點", r"大點", r"再大", r"加強", r"強一點", r"用力", r"加快", r"快一點",
+                   r"快點", r"更快", r"再快", r"深一點", r"harder", r"faster", r"stronger", r"deeper",
+                   r"turn it up", r"speed up", r"(?<!\bno )(?<!\bnot )(?<!\bany )\bmore\b")
+_DECREASE = _words(r"關小", r"小一點", r"小點", r"輕一點", r"輕點", r"弱一點", r"慢一點", r"慢點", r"慢下來",
+                   r"放慢", r"softer", r"slower", r"gentler", r"slow down", r"turn it down", r"easy")
+_FUNCTIONS = {
+    "Vibrate": _words(r"震動", r"振動", r"震", r"vibrat"),
+    "Rotate": _words(r"旋轉", r"轉動", r"轉起來", r"rotat", r"\bspin"),
+    "Thrusting": _words(r"抽插", r"抽送", r"thrust"),
+    "Pump": _words(r"收縮", r"吸", r"pump", r"suck"),
+}
+_ALL_FUNCTIONS = _words(r"一起", r"全部", r"都開", r"\ball\b", r"\bboth\b")
+
+# --- 情緒/動作詞庫 (非指令字幕) ---
+_INTENSITY_CUES = [
+    ("high", _words(r"高潮", r"要去了", r"去了", r"要射", r"射了", r"受不了", r"爽死", r"啊{3,}", r"不行了",
+                    r"\bcum", r"cumming", r"i'?m coming", r"orgasm", r"oh god", r"\bfuck")),
+    ("medium", _words(r"舒服", r"好爽", r"好棒", r"好深", r"喜歡", r"嗯{2,}", r"啊", r"喘", r"呻吟", r"moan",
+                      r"pant", r"feels? good", r"\byes\b", r"\bgood\b")),
+    ("low", _words(r"輕輕", r"慢慢", r"親", r"吻", r"摸", r"舔", r"挑逗", r"害羞", r"放鬆", r"kiss", r"touch",
+                   r"lick", r"tease", r"slowly", r"relax")),
+]
+_EXCLAMATION = re.compile(r"[!！]")
+
+
+def _parse_number(text: str) -> Optional[int]:
+    if text.isdigit():
+        return int(text)
+    if text == "十":
+        return 10
+    if "十" in text:
+        tens, _, ones = text.partition("十")
+        return (_CN_NUMBERS.get(tens, 1) if tens else 1) * 10 + (_CN_NUMBERS.get(ones, 0) if ones else 0)
+    return _CN_NUMBERS.get(text)
+
+
+def parse_directive(text: str) -> Optional[Dict[str, Any]]:
+    """
+    從一條字幕中找出操作玩具的直接指令。
+
+    Returns:
+        Optional[Dict[str, Any]]: {'kind': 'stop'|'absolute'|'relative'|'hold'|'function', 'value': ...,
+        'functions': [...] 或 None, 'all': bool}；沒有指令時為 None。
+        "不要停"、"繼續" 等為 'hold' (維持目前強度)，同一句中另有調整時以該調整為準。
+    """
+    functions = [name for name, pattern in _FUNCTIONS.items() if pattern.search(text)]
+    use_all = bool(_ALL_FUNCTIONS.search(text)) and bool(functions or _INCREASE.search(text))
+    directive = {"functions": functions or None, "all": use_all}
+
+    dont_stop = bool(_DONT_STOP.search(text))
+    if dont_stop:
+        text = _DONT_STOP.sub(" ", text) # "不要停" 中的 "停" 不是停止指令
+    elif _STOP.search(text):
+        return dict(directive, kind="stop", value=0)
+    if _MAX.search(text):
+        return dict(directive, kind="absolute", value=MAX_STRENGTH)
+    for pattern in _ABSOLUTE:
+        match = pattern.search(text)
+        if match:
+            value = _parse_number(match.group(1))
+            if value is not None and value > 0:
+                return dict(directive, kind="absolute", value=clamp_strength(value))
+    if _MIN.search(text):
+        return dict(directive, kind="absolute", value=1)
+    if _INCREASE.search(text):
+        return dict(directive, kind="relative", value=RELATIVE_STEP)
+    if _DECREASE.search(text):
+        return dict(directive, kind="relative", value=-RELATIVE_STEP)
+    if dont_stop:
+        return dict(directive, kind="hold", value=None)
+    if functions or use_all:
+        return dict(directive, kind="function", value=None)
+    return None
+
+
+def score_cue(text: str) -> Optional[Tuple[str, int]]:
+    """依情緒/動作詞庫為字幕評分，返回 (等級, 目標強度)；沒有線索時為 None"""
+    for level, pattern in _INTENSITY_CUES:
+        hits = len(pattern.findall(text))
+        if hits:
+            boost = min(2, hits - 1) + min(1, len(_EXCLAMATION.findall(text)))
+            return level, clamp_strength(LEVEL_STRENGTH[level] + boost)
+    return None
+
+
+def resolve_functions(capabilities: Optional[List[str]]) -> List[str]:
+    """取得玩具可用且以強度控制的功能，未知時使用 Vibrate"""
+    usable = [name for name in (capabilities or []) if name in INTENSITY_FUNCTIONS]
+    return usable or [DEFAULT_FUNCTION]
+
+
+class RuleBasedAnalyzer:
+    """
+    不需要 LLM 的快速分析引擎：逐條掃描字幕，以指令與情緒詞庫決定強度，
+    輸出與 LLM 分析相同的 {"events": [...]} 結構。
+
+    直接指令 (停下、開大一點、用 XX 強度…) 優先；其他字幕依詞庫推斷目標強度，
+    每條字幕最多改變 MAX_STRENGTH_STEP 級；過渡、維持事件與持續時間和 LLM 結果一樣交由 smooth_events 處理。
+    """
+
+    def __init__(self, capabilities: Optional[List[str]] = None):
+        """
+        Args:
+            capabilities (Optional[List[str]]): 玩具支援的功能 (toys_funcs.json 的 functions)。
+        """
+        self.functions = resolve_functions(capabilities)
+        self.active = [self.functions[0]]
+        self.level = BASE_STRENGTH
+        self.stopped = False
+        self.events: List[Dict[str, Any]] = []
+        self._last_emit = float("-inf")
+
+    def analyze(self, transcript: str) -> Dict[str, Any]:
+        cues = parse_srt(transcript)
+        last_end = None
+        for cue in cues:
+            if last_end is not None and cue["start"] - last_end > IDLE_SECONDS and not self.stopped \
+                    and self.level > BASE_STRENGTH:
+                self._set_level(BASE_STRENGTH)
+                self._emit(last_end + MIN_EVENT_SECONDS, "安靜段落：回落到基礎強度")
+            self._process_cue(cue)
+            last_end = cue["end"]
+
+        events = smooth_events(self.events, cues[-1]["end"] if cues else 0.0, hold_seconds=MAX_EVENT_SECONDS)
+        logger.info(f"規則分析完成：{len(cues)} 條字幕，生成 {len(events)} 個事件")
+        return {"events": events}
+
+    # --- 單條字幕 ---
+    def _process_cue(self, cue: Dict[str, Any]):
+        text, t = cue["text"], cue["start"]
+        directive = parse_directive(text)
+        if directive is not None:
+            self._apply_directive(directive, t, text)
+            return
+
+        scored = score_cue(text)
+        if scored is None:
+            if not self.stopped and t - self._last_emit >= HEARTBEAT_SECONDS:
+                self._emit(t, f"維持目前狀態：{text[:30]}")
+            return
+        level, target = scored
+        if self.stopped:
+            self.stopped = False
+            self.level = min(target, BASE_STRENGTH)
+        step = max(-MAX_STRENGTH_STEP, min(MAX_STRENGTH_STEP, target - self.level))
+        changed = self._set_level(self.level + step)
+        if level == "high" and len(self.functions) > 1:
+            changed = self._set_active(self.functions) or changed
+        if changed or t - self._last_emit >= HEARTBEAT_SECONDS:
+            self._emit(t, f"情緒/動作變化 ({level})：{text[:30]}")
+
+    def _apply_directive(self, directive: Dict[str, Any], t: float, text: str):
+        requested = [name for name in (directive["functions"] or []) if name in self.functions]
+        if directive["all"]:
+            self._set_active(self.functions)
+        elif requested:
+            self._set_active(requested)
+
+        kind = directive["kind"]
+        if kind == "stop":
+            if self.stopped:
+                return
+            self.stopped = True
+            self.events.append(make_event(t, {}, 0, f"直接指令 (停止)：{text[:30]}"))
+            self._last_emit = t
+            return
+
+        if kind == "absolute":
+            self._set_level(directive["value"])
+        elif kind == "relative":
+            self._set_level((BASE_STRENGTH if self.stopped else self.level) + directive["value"])
+        self.stopped = False
+        self._emit(t, f"直接指令：{text[:30]}")
+
+    # --- 狀態與輸出 ---
+    def _set_level(self, value: float) -> bool:
+        value = clamp_strength(value)
+        changed = value != self.level
+        self.level = value
+        return changed
+
+    def _set_active(self, functions: List[str]) -> bool:
+        changed = functions != self.active
+        self.active = list(functions)
+        return changed
+
+    def _emit(self, t: float, description: str):
+        self.events.append(make_event(max(0.0, t), {name: self.level for name in self.active}, 0, description))
+        self._last_emit = t
+
+
+def analyze_transcript(transcript: str, capabilities: Optional[List[str]] = None) -> Dict[str, Any]:
+    """以規則引擎分析 SRT，返回 {"events": [...]}"""
+    return RuleBasedAnalyzer(capabilities).analyze(transcript)
@@ -0,0 +1,338 @@
+import gc
+import json
+import time
+import asyncio
+import logging
+import argparse
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+from event_utils import sort_events, event_time, parse_action, format_action, make_event
+from lovense_async import AsyncLovenseController
+from config import setup_logging
+
+logger = logging.getLogger(__name__)
+
+TOY_FUNCTIONS_JSON = 'toys_funcs.json'
+# 同一個 tick 發送到各會話的時間差上限 (秒)
+DEFAULT_MAX_SPREAD = 0.05
+# 播放結束後等待各會話送完最後一個指令的時間上限 (秒)
+DEFAULT_DRAIN_TIMEOUT = 5.0
+# 玩具不支援某功能時的預設替代順序
+FALLBACK_FUNCTIONS = {
+    "Thrusting": ["Vibrate", "Pump", "Rotate"],
+    "Pump": ["Vibrate", "Thrusting"],
+    "Rotate": ["Vibrate"],
+    "Vibrate": ["Thrusting", "Rotate", "Pump"],
+    "Position": [],
+}
+
+
+def load_toy_functions(json_path: str = TOY_FUNCTIONS_JSON) -> Dict[str, Any]:
+    """讀取 toys_funcs.json 中的 toys 字典"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if "toys" not in data or not isinstance(data["toys"], dict):
+        raise ValueError(f"JSON 文件 {json_path} 缺少 'toys' 鍵或格式不正確。")
+    return data["toys"]
+
+
+def build_action_mapping(capabilities: List[str], overrides: Optional[Dict[str, str]] = None) -> Dict[str, Optional[str]]:
+    """
+    為玩具建立「事件功能 -> 玩具功能」對照表。
+
+    支援的功能對應到自身；不支援的功能依 FALLBACK_FUNCTIONS 找第一個支援的替代，
+    找不到時對應到 None (忽略)。overrides 可以覆寫個別功能的對應。
+    """
+    mapping: Dict[str, Optional[str]] = {}
+    for name, fallbacks in FALLBACK_FUNCTIONS.items():
+        if name in capabilities:
+            mapping[name] = name
+        else:
+            mapping[name] = next((f for f in fallbacks if f in capabilities), None)
+    # "All" 表示玩具的所有功能
+    mapping["All"] = "All"
+    mapping.update(overrides or {})
+    return mapping
+
+
+class ToySession:
+    """
+    單一使用者/玩具的控制會話。
+
+    每個會話有自己的發送任務：時間軸只把指令交給 post() 就繼續前進，
+    等待確認 (ack) 只會延遲這個會話。會話還在等待上一個確認時，
+    新指令會取代尚未送出的舊指令 (只送最新狀態)，慢的玩具不會越積越落後。
+    """
+
+    def __init__(self, session_id: str, controller: AsyncLovenseController, toy_id: Optional[str] = None,
+                 capabilities: Optional[List[str]] = None, overrides: Optional[Dict[str, str]] = None):
+        self.session_id = session_id
+        self.controller = controller
+        self.toy_id = toy_id
+        self.capabilities = capabilities or ["Vibrate"]
+        self.mapping = build_action_mapping(self.capabilities, overrides)
+        self.superseded = 0   # 尚未送出就被新指令取代的次數
+        self._pending: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, on_sent: Callable[[int, "ToySession", float], None]):
+        """在目前的事件迴圈中啟動發送任務；on_sent(tick, session, sent_at) 在實際送出時呼叫"""
+        if self._task is not None and not self._task.done():
+            return
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task = asyncio.get_running_loop().create_task(self._sender(on_sent))
+
+    def post(self, tick: int, command: Dict[str, Any]):
+        """交出一個 tick 的指令 (不等待發送或確認)"""
+        if self._pending is not None:
+            self.superseded += 1
+        self._pending = (tick, command)
+        self._idle.clear()
+        self._wakeup.set()
+
+    async def wait_idle(self):
+        """等待目前的指令送出並得到確認 (或逾時)"""
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _sender(self, on_sent: Callable[[int, "ToySession", float], None]):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self._pending is None:
+                continue
+            (tick, command), self._pending = self._pending, None
+            if self.controller.connected:
+                on_sent(tick, self, time.monotonic())
+            try:
+                # 確認的往返延遲由控制器另外記錄 (rtt_samples)，不計入會話間時間差
+                await self.controller.send_command(command)
+            except Exception as e:
+                logger.error(f"會話 {self.session_id} 發送失敗: {e}")
+            if self._pending is None:
+                self._idle.set()
+            else:
+                self._wakeup.set()
+
+    def map_command(self, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """依照此會話的功能對照表轉換指令；沒有可執行的功能時返回 None"""
+        mapped = dict(command)
+        if self.toy_id:
+            mapped["toy"] = self.toy_id
+        if command.get("command", "Function") != "Function" or command.get("action") == "Stop":
+            return mapped
+        strengths: Dict[str, int] = {}
+        for name, value in parse_action(command.get("action", "")).items():
+            target = self.mapping.get(name, name if name in self.capabilities else None)
+            if target:
+                # 多個功能對應到同一玩具功能時取最大強度
+                strengths[target] = max(strengths.get(target, 0), value)
+        if not strengths:
+            return None
+        mapped["action"] = format_action(strengths)
+        return mapped
+
+
+class SessionManager:
+    """
+    管理多個玩具會話，讓同一條時間軸同時驅動多位使用者。
+
+    每個 tick 先為所有會話預先轉換好指令，再交給各會話的發送任務，時間軸本身從不等待確認；
+    以各會話實際送出的時間量測同一個 tick 的發送時間差 (spread)，超過 max_spread 時記錄警告。
+    確認的往返延遲 (RTT) 由各會話的控制器分開統計。
+    """
+
+    def __init__(self, max_spread: float = DEFAULT_MAX_SPREAD, toy_functions_json: str = TOY_FUNCTIONS_JSON):
+        self.sessions: Dict[str, ToySession] = {}
+        self.max_spread = max_spread
+        self.toy_functions = load_toy_functions(toy_functions_json)
+        self.spreads: List[float] = []
+        self.spread_violations = 0
+        self._tick = 0
+        self._tick_sends: Dict[int, List[float]] = {}
+
+    def add_session(self, session_id: str, socket_url: str, toy_key: Optional[str] = None,
+                    toy_id: Optional[str] = None, overrides: Optional[Dict[str, str]] = None,
+                    **controller_kwargs) -> ToySession:
+        """
+        新增一個會話。
+
+        Args:
+            session_id (str): 會話識別碼。
+            socket_url (str): 該使用者的玩具 WebSocket 地址。
+            toy_key (Optional[str]): toys_funcs.json 中的玩具 key，用於決定功能對照。
+            toy_id (Optional[str]): Lovense 玩具 ID，不指定則控制該使用者的所有玩具。
+            overrides (Optional[Dict[str, str]]): 自訂功能對照。
+        """
+        capabilities = (self.toy_functions.get(toy_key) or {}).get("functions") if toy_key else None
+        controller = AsyncLovenseController(socket_url, **controller_kwargs)
+        session = ToySession(session_id, controller, toy_id, capabilities, overrides)
+        self.sessions[session_id] = session
+        return session
+
+    async def connect_all(self):
+        """同時連接所有會話"""
+        await asyncio.gather(*(s.controller.connect() for s in self.sessions.values()))
+        connected = sum(1 for s in self.sessions.values() if s.controller.connected)
+        logger.info(f"已連接 {connected}/{len(self.sessions)} 個會話")
+
+    async def close_all(self):
+        """停止發送任務並關閉所有會話"""
+        await asyncio.gather(*(s.stop() for s in self.sessions.values()), return_exceptions=True)
+        await asyncio.gather(*(s.controller.close() for s in self.sessions.values()), return_exceptions=True)
+
+    def start_senders(self):
+        """啟動各會話的發送任務 (play 會自動呼叫)"""
+        for session in self.sessions.values():
+            session.start(self._record_send)
+
+    def _record_send(self, tick: int, session: ToySession, sent_at: float):
+        self._tick_sends.setdefault(tick, []).append(sent_at)
+
+    def dispatch(self, command: Dict[str, Any]) -> int:
+        """
+        將一個指令交給所有會話的發送任務 (不等待發送或確認)。
+
+        Returns:
+            int: 收到指令的會話數。
+        """
+        self.start_senders()
+        tick = self._tick
+        self._tick += 1
+        posted = 0
+        for session in self.sessions.values():
+            mapped = session.map_command(command)
+            if mapped is not None:
+                session.post(tick, mapped)
+                posted += 1
+        return posted
+
+    async def drain(self, timeout: float = DEFAULT_DRAIN_TIMEOUT):
+        """等待各會話送出最後一個指令，並統計各 tick 的發送時間差"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(s.wait_idle() for s in self.sessions.values())), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"等待會話送出最後的指令超過 {timeout} 秒")
+        self._collect_spreads()
+
+    def _collect_spreads(self):
+        for tick in sorted(self._tick_sends):
+            sends = self._tick_sends[tick]
+            spread = max(sends) - min(sends)
+            self.spreads.append(spread)
+            if spread > self.max_spread:
+                self.spread_violations += 1
+                logger.warning(f"tick {tick} 會話間發送時間差 {spread * 1000:.1f} ms "
+                               f"超過上限 {self.max_spread * 1000:.0f} ms")
+        self._tick_sends.clear()
+
+    async def play(self, events: List[Dict[str, Any]], start_offset: float = 0.0,
+                   drain_timeout: float = DEFAULT_DRAIN_TIMEOUT):
+        """依照事件時間戳將整條時間軸播放到所有會話 (時間軸只依時鐘前進，不等待任何會話)"""
+        timeline = [(event_time(e), e["command"]) for e in sort_events(events)
+                    if isinstance(e.get("command"), dict) and event_time(e) >= start_offset]
+        self.start_senders()
+        # 播放前先回收並凍結現有物件：會話多時完整的分代回收可能耗時數十毫秒，
+        # 若發生在同一個 tick 的發送途中，會直接成為會話間的時間差
+        gc.collect()
+        gc.freeze()
+        try:
+            loop = asyncio.get_running_loop()
+            origin = loop.time() - start_offset
+            for t, command in timeline:
+                delay = origin + t - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.dispatch(command)
+            await self.drain(drain_timeout)
+        finally:
+            gc.unfreeze()
+        superseded = sum(s.superseded for s in self.sessions.values())
+        logger.info(f"時間軸播放完成，共 {len(timeline)} 個 tick，{len(self.sessions)} 個會話"
+                    f"，{superseded} 個指令因會話仍在等待確認而被較新的指令取代")
+
+    def spread_stats(self) -> Dict[str, float]:
+        """各 tick 會話間實際發送時間差統計 (毫秒)"""
+        samples = sorted(s * 1000.0 for s in self.spreads)
+        superseded = sum(s.superseded for s in self.sessions.values())
+        if not samples:
+            return {"ticks": 0, "mean_ms": 0.0, "p95_ms": 0.0, "max_ms": 0.0, "violations": 0,
+                    "superseded": superseded}
+        return {
+            "ticks": len(samples),
+            "mean_ms": sum(samples) / len(samples),
+            "p95_ms": samples[min(len(samples) - 1, int(0.95 * (len(samples) - 1) + 0.5))],
+            "max_ms": samples[-1],
+            "violations": self.spread_violations,
+            "superseded": superseded,
+        }
+
+
+async def run_load_test(socket_url: Optional[str] = None, sessions: int = 300, ticks: int = 50,
+                        interval: float = 0.2, toy_key: str = "nora",
+                        max_spread: float = DEFAULT_MAX_SPREAD) -> Dict[str, Any]:
+    """
+    負載測試：建立大量模擬會話並播放合成時間軸。
+
+    未指定 socket_url 時，在子行程中啟動 local_toy_server.LocalToyServer 作為目標
+    (伺服器處理收到的指令不會佔用會話的發送時間)。
+
+    Returns:
+        Dict[str, Any]: 會話間時間差統計、確認延遲摘要與伺服器收到的指令數
+        (within_bound 表示所有 tick 的時間差都不超過 max_spread)。
+    """
+    server = None
+    if socket_url is None:
+        from local_toy_server import LocalToyServer
+        server = LocalToyServer()
+        socket_url = server.start_in_process()
+    manager = SessionManager(max_spread=max_spread)
+    for i in range(sessions):
+        manager.add_session(f"session-{i}", socket_url, toy_key=toy_key, toy_id=f"toy{i}")
+    events = [make_event(k * interval, {"Vibrate": 1 + k % 20, "Thrusting": 20 - k % 20}, interval, "load test")
+              for k in range(ticks)]
+    try:
+        await manager.connect_all()
+        await manager.play(events)
+    finally:
+        await manager.close_all()
+        if server is not None:
+            server.stop_process()
+    rtts = sorted(r for s in manager.sessions.values() for r in s.controller.rtt_samples)
+    spread = manager.spread_stats()
+    return {
+        "sessions": sessions,
+        "spread": spread,
+        "within_bound": spread["ticks"] > 0 and spread["violations"] == 0,
+        "server_received": len(server.received) if server is not None else None,
+        "rtt_p50_ms": rtts[len(rtts) // 2] * 1000.0 if rtts else None,
+        "rtt_max_ms": rtts[-1] * 1000.0 if rtts else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多會話負載測試 (預設連接內建的本地 socket.io 模擬伺服器)")
+    parser.add_argument("socket_url", nargs="?", help="外部伺服器地址，例如 http://127.0.0.1:5000；省略時使用內建伺服器")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--interval", type=float, default=0.2)
+    parser.add_argument("--max-spread-ms", type=float, default=DEFAULT_MAX_SPREAD * 1000)
+    args = parser.parse_args()
+    setup_logging()
+    result = asyncio.run(run_load_test(args.socket_url, args.sessions, args.ticks, args.interval,
+                                       max_spread=args.max_spread_ms / 1000.0))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    raise SystemExit(0 if result["within_bound"] else 1)
+
+if __name__ == "__main__":
+    main()
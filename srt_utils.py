@@ -0,0 +1,197 @@
+import re
+from typing import List, Dict, Any, Iterable, Tuple
+
+# SRT 時間格式: HH:MM:SS,mmm
+SRT_TIME_PATTERN = re.compile(r"(\d{1,2}):(\d{2}):(\d{2})[,.](\d{1,3})")
+SRT_TIMING_LINE = re.compile(
+    r"(\d{1,2}:\d{2}:\d{2}[,.]\d{1,3})\s*-->\s*(\d{1,2}:\d{2}:\d{2}[,.]\d{1,3})"
+)
+
+
+def srt_time_to_seconds(timestamp: str) -> float:
+    """將 SRT 時間字串 (HH:MM:SS,mmm) 轉換為秒數"""
+    match = SRT_TIME_PATTERN.search(timestamp or "")
+    if not match:
+        raise ValueError(f"無效的 SRT 時間格式: {timestamp}")
+    hours, minutes, seconds, millis = match.groups()
+    millis = millis.ljust(3, "0")
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000.0
+
+
+def seconds_to_srt_time(seconds: float) -> str:
+    """將秒數轉換為 SRT 時間字串 (HH:MM:SS,mmm)"""
+    total_ms = max(0, int(round(seconds * 1000)))
+    hours, rem = divmod(total_ms, 3600 * 1000)
+    minutes, rem = divmod(rem, 60 * 1000)
+    secs, millis = divmod(rem, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}"
+
+
+def parse_srt(srt_content: str) -> List[Dict[str, Any]]:
+    """
+    解析 SRT 字串為字幕條目列表。
+
+    Args:
+        srt_content (str): SRT 格式的文本。
+
+    Returns:
+        List[Dict[str, Any]]: 每個條目包含 'index', 'start', 'end' (秒) 及 'text'。
+    """
+    cues = []
+    if not srt_content:
+        return cues
+    blocks = re.split(r"\r?\n\s*\r?\n", srt_content.strip())
+    for block in blocks:
+        lines = [line for line in block.splitlines() if line.strip() != ""]
+        if not lines:
+            continue
+        # 找到時間行 (通常是第二行，但容忍缺少序號的情況)
+        timing_idx = next((i for i, line in enumerate(lines) if SRT_TIMING_LINE.search(line)), None)
+        if timing_idx is None:
+            continue
+        start_str, end_str = SRT_TIMING_LINE.search(lines[timing_idx]).groups()
+        index = len(cues) + 1
+        if timing_idx > 0 and lines[timing_idx - 1].strip().isdigit():
+            index = int(lines[timing_idx - 1].strip())
+        cues.append({
+            "index": index,
+            "start": srt_time_to_seconds(start_str),
+            "end": srt_time_to_seconds(end_str),
+            "text": "\n".join(lines[timing_idx + 1:]).strip(),
+        })
+    return cues
+
+
+def format_srt(cues: Iterable[Dict[str, Any]], renumber: bool = True) -> str:
+    """將字幕條目列表轉回 SRT 字串"""
+    blocks = []
+    for i, cue in enumerate(cues, start=1):
+        index = i if renumber else cue.get("index", i)
+        blocks.append(
+            f"{index}\n"
+            f"{seconds_to_srt_time(cue['start'])} --> {seconds_to_srt_time(cue['end'])}\n"
+            f"{cue.get('text', '')}\n"
+        )
+    return "\n".join(blocks)
+
+
+def shift_cues(cues: Iterable[Dict[str, Any]], offset: float) -> List[Dict[str, Any]]:
+    """將字幕條目的時間整體平移 offset 秒"""
+    return [dict(cue, start=cue["start"] + offset, end=cue["end"] + offset) for cue in cues]
+
+
+def merge_srt_chunks(chunks: Iterable[Tuple[float, str]]) -> str:
+    """
+    合併多個分段轉錄的 SRT 結果。
+
+    Args:
+        chunks (Iterable[Tuple[float, str]]): (分段在原音訊中的起始秒數, 該分段的 SRT 字串)。
+
+    Returns:
+        str: 重新編號並已平移時間戳的完整 SRT 字串。
+    """
+    merged = []
+    for offset, srt_content in sorted(chunks, key=lambda item: item[0]):
+        merged.extend(shift_cues(parse_srt(srt_content), offset))
+    merged.sort(key=lambda cue: (cue["start"], cue["end"]))
+    return format_srt(merged)
+
+
+def split_into_windows(cues: List[Dict[str, Any]], window_seconds: float,
+                       overlap_seconds: float) -> List[Dict[str, Any]]:
+    """
+    將字幕條目切分為互相重疊的時間窗口。
+
+    每個窗口另外標記其「負責區間」(own_start, own_end)：相鄰窗口在重疊區的中點交接，
+    合併結果時每個時間點只採用一個窗口的事件。
+
+    Args:
+        cues (List[Dict[str, Any]]): parse_srt 的結果。
+        window_seconds (float): 窗口長度 (秒)。
+        overlap_seconds (float): 相鄰窗口的重疊長度 (秒)。
+
+    Returns:
+        List[Dict[str, Any]]: 每個窗口包含 'start', 'end', 'own_start', 'own_end', 'cues'。
+    """
+    if not cues:
+        return []
+    if overlap_seconds >= window_seconds:
+        raise ValueError("重疊長度必須小於窗口長度")
+    total_end = max(cue["end"] for cue in cues)
+    step = window_seconds - overlap_seconds
+    windows = []
+    start = 0.0
+    while True:
+        end = start + window_seconds
+        windows.append({"start": start, "end": end})
+        if end >= total_end:
+            break
+        start += step
+
+    half_overlap = overlap_seconds / 2.0
+    for i, window in enumerate(windows):
+        window["own_start"] = window["start"] + half_overlap if i > 0 else float("-inf")
+        window["own_end"] = window["end"] - half_overlap if i < len(windows) - 1 else float("inf")
+        window["cues"] = [cue for cue in cues if cue["end"] > window["start"] and cue["start"] < window["end"]]
+    return [window for window in windows if window["cues"]]
+
+
+# 沒有任何文字內容的字幕 (只有標點、省略號或音符)
+_EMPTY_CUE_TEXT = re.compile(r"^[\W_♪]*$")
+
+
+def compact_cues(cues: Iterable[Dict[str, Any]], merge_gap: float = 2.0) -> List[Dict[str, Any]]:
+    """
+    精簡字幕條目：去除沒有內容的條目，並合併相鄰的重複條目 (例如連續的 "[moaning]")。
+
+    Args:
+        cues (Iterable[Dict[str, Any]]): parse_srt 的結果。
+        merge_gap (float): 重複條目之間的間隔不超過此秒數時才合併。
+
+    Returns:
+        List[Dict[str, Any]]: 每個條目包含 'start', 'end', 'text' 和 'repeat' (合併的條目數)。
+    """
+    compacted: List[Dict[str, Any]] = []
+    for cue in cues:
+        text = " ".join(cue.get("text", "").split())
+        if _EMPTY_CUE_TEXT.match(text):
+            continue
+        last = compacted[-1] if compacted else None
+        if last and last["text"].casefold() == text.casefold() and cue["start"] - last["end"] <= merge_gap:
+            last["end"] = max(last["end"], cue["end"])
+            last["repeat"] += 1
+            continue
+        compacted.append({"start": cue["start"], "end": cue["end"], "text": text, "repeat": 1})
+    return compacted
+
+
+def format_compact(cues: Iterable[Dict[str, Any]]) -> str:
+    """
+    將精簡後的條目輸出為每行一條的緊湊格式: "HH:MM:SS,mmm 文字"，
+    重複條目附加 "×N (至 HH:MM:SS,mmm)"。
+    """
+    lines = []
+    for cue in cues:
+        line = f"{seconds_to_srt_time(cue['start'])} {cue['text']}"
+        if cue.get("repeat", 1) > 1:
+            line += f" ×{cue['repeat']} (至 {seconds_to_srt_time(cue['end'])})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def compact_srt(srt_content: str, merge_gap: float = 2.0) -> Tuple[str, Dict[str, int]]:
+    """
+    將 SRT 字串轉換為緊湊格式。
+
+    Returns:
+        Tuple[str, Dict[str, int]]: (緊湊文本, 統計: 'cues', 'compact_cues', 'raw_chars', 'compact_chars')。
+    """
+    cues = parse_srt(srt_content)
+    compacted = compact_cues(cues, merge_gap)
+    text = format_compact(compacted)
+    return text, {
+        "cues": len(cues),
+        "compact_cues": len(compacted),
+        "raw_chars": len(srt_content),
+        "compact_chars": len(text),
+    }
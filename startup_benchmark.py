@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import List, Dict, Any
+
+# 量測匯入成本的模組 (專案模組與主要的第三方函式庫)
+DEFAULT_MODULES = [
+    "config", "pipeline_tasks", "jobs", "log_view",
+    "voice2text", "content_analyzer", "pornhub_audio", "lovense", "vad",
+    "openai", "phub", "requests", "socketio", "numpy",
+]
+# 視窗出現前不應該被載入的網路/重量級函式庫
+HEAVY_MODULES = ["openai", "phub", "requests", "socketio", "numpy", "httpx"]
+
+_IMPORT_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+try:
+    __import__({module!r})
+    error = None
+except Exception as e:
+    error = repr(e)
+print(json.dumps({{"seconds": time.perf_counter() - start, "error": error}}))
+"""
+
+_WINDOW_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+import tkinter as tk
+import UI_main
+root = tk.Tk()
+app = UI_main.App(root)
+root.update()
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+root.destroy()
+"""
+
+
+def _run_snippet(code: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """在新的直譯器中執行程式碼，返回其輸出的 JSON 以及含直譯器啟動的總耗時"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        tail = "\n".join(result.stderr.strip().splitlines()[-3:])
+        return {"error": tail, "wall_seconds": wall}
+    data = json.loads(result.stdout.strip().splitlines()[-1])
+    data["wall_seconds"] = wall
+    return data
+
+
+def measure_imports(modules: List[str], repeat: int = 3) -> List[Dict[str, Any]]:
+    """量測每個模組在全新行程中的匯入時間 (取中位數)"""
+    env = dict(os.environ)
+    results = []
+    for module in modules:
+        runs = [_run_snippet(_IMPORT_SNIPPET.format(module=module), env) for _ in range(repeat)]
+        errors = [run.get("error") for run in runs if run.get("error")]
+        results.append({
+            "module": module,
+            "import_ms": round(statistics.median(run.get("seconds", 0.0) for run in runs) * 1000, 1),
+            "error": errors[0] if errors else None,
+        })
+    return results
+
+
+def measure_first_window(repeat: int = 3) -> Dict[str, Any]:
+    """量測啟動到第一個視窗繪製完成的時間，並列出當時已載入的重量級模組"""
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark") # 避免缺少金鑰的錯誤對話框阻塞量測
+    runs = [_run_snippet(_WINDOW_SNIPPET.format(heavy=HEAVY_MODULES), env) for _ in range(repeat)]
+    ok = [run for run in runs if "seconds" in run]
+    if not ok:
+        return {"error": runs[0].get("error")}
+    return {
+        "first_window_ms": round(statistics.median(run["seconds"] for run in ok) * 1000, 1),
+        "process_to_window_ms": round(statistics.median(run["wall_seconds"] for run in ok) * 1000, 1),
+        "heavy_modules_loaded": ok[-1]["loaded"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測 UI_main 的啟動時間與各模組匯入成本")
+    parser.add_argument("--modules", nargs="*", default=DEFAULT_MODULES, help="要量測匯入成本的模組")
+    parser.add_argument("--repeat", type=int, default=3, help="每項量測的重複次數 (取中位數)")
+    parser.add_argument("--no-window", action="store_true", help="不量測視窗啟動 (例如沒有顯示器的環境)")
+    args = parser.parse_args()
+
+    report = {"imports": measure_imports(args.modules, args.repeat)}
+    if not args.no_window:
+        report["window"] = measure_first_window(args.repeat)
+    json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
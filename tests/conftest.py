@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 測試直接導入專案根目錄下的模組
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
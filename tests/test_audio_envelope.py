@@ -0,0 +1,27 @@
+import numpy as np
+
+from audio_envelope import densify_events
+from event_utils import make_event, event_time
+
+
+def _windows(events):
+    return [(event_time(e), event_time(e) + e["command"]["timeSec"]) for e in events]
+
+
+def test_densify_windows_do_not_overlap():
+    times = np.arange(0.0, 20.0, 1.0)
+    envelopes = {"times": times, "loudness": np.linspace(0, 1, len(times)),
+                 "onset_rate": np.zeros(len(times)), "tempo": np.zeros(len(times)),
+                 "periodicity": np.zeros(len(times))}
+    curves = {"Vibrate": np.where(np.arange(len(times)) % 2, 18, 2)}
+    anchors = [make_event(0, {"Vibrate": 10}, 10, "a"), make_event(10, {"Vibrate": 10}, 10, "b")]
+
+    events = densify_events(anchors, envelopes, curves, weight=0.5)
+
+    assert len(events) > len(anchors)
+    windows = _windows(events)
+    for (start, end), (next_start, _) in zip(windows, windows[1:]):
+        assert start < next_start
+        assert end <= next_start + 1e-6
+    assert windows[-1][1] == 20
+    assert anchors[0]["command"]["timeSec"] == 10
@@ -0,0 +1,83 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+import audio_utils
+from audio_utils import extract_audio_stream
+
+# 以 Python 腳本代替 ffmpeg：讀完 stdin 後依情境寫出輸出或失敗
+FAKE_FFMPEG = r"""
+import sys
+mode, output_path = sys.argv[1], sys.argv[-1]
+if mode == "exit-early":
+    sys.stderr.write("Invalid data found when processing input\n")
+    sys.exit(1)
+data = sys.stdin.buffer.read()
+if mode == "fail":
+    with open(output_path, "wb") as f:
+        f.write(b"partial")
+    sys.stderr.write("line 1\nline 2\npipe:0: Invalid data found when processing input\n")
+    sys.exit(183)
+with open(output_path, "wb") as f:
+    f.write(data[::-1])
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    """把 audio_utils 啟動的 ffmpeg 換成 FAKE_FFMPEG，返回設定情境的函數"""
+    real_popen = subprocess.Popen
+    state = {"mode": "ok"}
+
+    def popen(cmd, *args, **kwargs):
+        assert cmd[0] == "ffmpeg"
+        return real_popen([sys.executable, "-c", FAKE_FFMPEG, state["mode"]] + cmd[1:], *args, **kwargs)
+
+    monkeypatch.setattr(audio_utils.subprocess, "Popen", popen)
+    return lambda mode: state.update(mode=mode)
+
+
+def test_stream_success_renames_temp_output(fake_ffmpeg, tmp_path):
+    output = tmp_path / "audio.mp3"
+    total = extract_audio_stream(iter([b"abc", b"", b"def"]), str(output))
+
+    assert total == 6
+    assert output.read_bytes() == b"fedcba"
+    assert not os.path.exists(str(output) + ".part")
+
+
+def test_non_zero_exit_raises_with_stderr_tail_and_removes_partial_output(fake_ffmpeg, tmp_path):
+    fake_ffmpeg("fail")
+    output = tmp_path / "audio.mp3"
+
+    with pytest.raises(RuntimeError) as excinfo:
+        extract_audio_stream(iter([b"x" * 1024] * 4), str(output))
+
+    message = str(excinfo.value)
+    assert "exit code: 183" in message
+    assert "Invalid data found" in message
+    assert not output.exists() and not os.path.exists(str(output) + ".part")
+
+
+def test_ffmpeg_exiting_early_is_reported(fake_ffmpeg, tmp_path):
+    fake_ffmpeg("exit-early")
+    output = tmp_path / "audio.mp3"
+
+    # 送出遠超過管線緩衝區的資料，確認不會因 ffmpeg 提前結束而卡住
+    with pytest.raises(RuntimeError, match="exit code: 1"):
+        extract_audio_stream(iter([b"x" * 65536] * 64), str(output))
+    assert not output.exists()
+
+
+def test_source_error_kills_ffmpeg_and_propagates(fake_ffmpeg, tmp_path):
+    output = tmp_path / "audio.mp3"
+
+    def chunks():
+        yield b"abc"
+        raise ConnectionError("下載中斷")
+
+    with pytest.raises(ConnectionError):
+        extract_audio_stream(chunks(), str(output))
+    assert not output.exists() and not os.path.exists(str(output) + ".part")
@@ -0,0 +1,99 @@
+import time
+import threading
+
+import pytest
+
+import jobs
+import pipeline_tasks
+from batch_runner import BatchPipeline
+
+STAGE_SECONDS = 0.05
+
+
+@pytest.fixture
+def stage_calls(monkeypatch):
+    """以假的階段函數代替下載/轉錄/分析，記錄 (階段, 來源, 開始, 結束)；來源含 'bad' 時在轉錄失敗"""
+    calls = []
+    lock = threading.Lock()
+
+    def fake_stage(job, stage, notify, on_analysis_event=None):
+        started = time.perf_counter()
+        time.sleep(STAGE_SECONDS)
+        if stage == "transcribe" and "bad" in job.source:
+            raise RuntimeError("轉錄失敗")
+        with lock:
+            calls.append((stage, job.source, started, time.perf_counter()))
+
+    monkeypatch.setattr(jobs, "_run_stage_func", fake_stage)
+    monkeypatch.setattr(pipeline_tasks, "ensure_output_dirs", lambda: None)
+    return calls
+
+
+def _touch(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(b"")
+    return str(path)
+
+
+def test_inputs_follow_their_routes_and_all_workers_exit(stage_calls, tmp_path):
+    audio = _touch(tmp_path, "a.mp3")
+    video = _touch(tmp_path, "b.mp4")
+    srt = _touch(tmp_path, "c.srt")
+    url = "https://example.com/d"
+    pipeline = BatchPipeline("lush4", engine="rules")
+
+    # 下載與提取都接到轉錄：轉錄有 3 個來源，分析有 2 個
+    assert pipeline.stages["transcribe"]._producers == 3
+    assert pipeline.stages["analyze"]._producers == 2
+
+    result = pipeline.run([audio, video, srt, url, str(tmp_path / "missing.mp3")])
+
+    assert [job.status for job in result] == ["done"] * 4 + ["failed"]
+    routes = {source: [stage for stage, s, _, _ in stage_calls if s == source] for source in (audio, video, srt, url)}
+    assert routes == {audio: ["transcribe", "analyze"], video: ["extract", "transcribe", "analyze"],
+                      srt: ["analyze"], url: ["download", "transcribe", "analyze"]}
+    for stage in pipeline.stages.values():
+        assert stage._producers == 0 and stage._running == 0
+        assert not any(thread.is_alive() for thread in stage._threads)
+
+
+def test_failed_stage_does_not_block_shutdown(stage_calls, tmp_path):
+    sources = [_touch(tmp_path, name) for name in ("bad1.mp3", "ok.mp3", "bad2.mp3")]
+    pipeline = BatchPipeline("lush4", stage_workers={"transcribe": 1, "analyze": 1}, queue_size=1, engine="rules")
+
+    result = pipeline.run(sources)
+
+    assert [job.status for job in result] == ["failed", "done", "failed"]
+    assert result[0].error == "transcribe: 轉錄失敗"
+    assert [(stage, source) for stage, source, _, _ in stage_calls] == [("transcribe", sources[1]),
+                                                                        ("analyze", sources[1])]
+
+
+def test_audio_engine_skips_transcribe(stage_calls, tmp_path):
+    video = _touch(tmp_path, "a.mp4")
+    pipeline = BatchPipeline("lush4", engine="audio")
+
+    # 音訊包絡引擎：下載與提取直接接到分析 (加上輸入端與閒置的轉錄階段共 4 個來源)
+    assert pipeline.stages["analyze"]._producers == 4
+    assert pipeline.stages["transcribe"]._producers == 1
+
+    result = pipeline.run([video, "https://example.com/b"])
+
+    assert [job.status for job in result] == ["done", "done"]
+    assert sorted(stage for stage, _, _, _ in stage_calls) == ["analyze", "analyze", "download", "extract"]
+
+
+def test_stages_overlap(stage_calls, tmp_path):
+    sources = [_touch(tmp_path, f"{i}.mp3") for i in range(4)]
+    pipeline = BatchPipeline("lush4", stage_workers={"transcribe": 1, "analyze": 1}, engine="rules")
+
+    started = time.perf_counter()
+    pipeline.run(sources)
+    elapsed = time.perf_counter() - started
+
+    # 依序執行需要 8 個階段時間；管線化後轉錄第 N+1 個時同時分析第 N 個
+    assert elapsed < 8 * STAGE_SECONDS * 0.8
+    transcribes = [(start, end) for stage, _, start, end in stage_calls if stage == "transcribe"]
+    analyzes = [(start, end) for stage, _, start, end in stage_calls if stage == "analyze"]
+    assert any(a_start < t_end and t_start < a_end
+               for t_start, t_end in transcribes for a_start, a_end in analyzes)
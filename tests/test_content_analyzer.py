@@ -0,0 +1,80 @@
+import os
+import json
+from types import SimpleNamespace
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+import content_analyzer
+from content_analyzer import ContentAnalyzer
+from disk_cache import DiskCache
+from token_budget import TokenBudgetExceeded
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n開始\n\n2\n00:00:20,000 --> 00:00:21,000\n停下\n\n"
+RESPONSE = json.dumps({"events": [
+    {"timestamp": "00:00:01,000", "command": {"command": "Function", "action": "Vibrate:8", "timeSec": 5, "apiVer": 1},
+     "description": "開始"},
+]}, ensure_ascii=False)
+
+
+@pytest.fixture
+def api_calls(monkeypatch):
+    """以假的 chat.completions.create 記錄每次請求"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20, prompt_tokens_details=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=RESPONSE))], usage=usage)
+
+    monkeypatch.setattr(openai.chat.completions, "create", create)
+    return calls
+
+
+def make_analyzer(tmp_path, **kwargs):
+    return ContentAnalyzer(os.path.join(ROOT, "toys_funcs.json"), cache=DiskCache(str(tmp_path / "cache")), **kwargs)
+
+
+def test_repeated_analysis_is_served_from_cache(tmp_path, api_calls):
+    first = make_analyzer(tmp_path).analyze_content(SRT, "lush4")
+    analyzer = make_analyzer(tmp_path)
+    second = analyzer.analyze_content(SRT, "lush4")
+
+    assert len(api_calls) == 1
+    assert second == first
+    assert analyzer.last_from_cache and analyzer.last_run_stats["from_cache"]
+
+
+def test_cache_key_covers_transcript_toy_and_prompt_version(tmp_path, api_calls, monkeypatch):
+    analyzer = make_analyzer(tmp_path)
+    analyzer.analyze_content(SRT, "lush4")
+    analyzer.analyze_content(SRT + "3\n00:00:30,000 --> 00:00:31,000\n再來\n", "lush4")
+    analyzer.analyze_content(SRT, "nora")
+    assert len(api_calls) == 3 and not analyzer.last_from_cache
+
+    monkeypatch.setattr(content_analyzer, "PROMPT_VERSION", "changed")
+    analyzer.analyze_content(SRT, "lush4")
+    assert len(api_calls) == 4
+
+
+def test_request_over_budget_fails_before_calling_the_api(tmp_path, api_calls):
+    analyzer = make_analyzer(tmp_path, max_input_tokens=50)
+
+    with pytest.raises(TokenBudgetExceeded):
+        analyzer.analyze_content(SRT, "lush4")
+    assert api_calls == []
+
+
+def test_transcript_is_compacted_before_sending(tmp_path, api_calls):
+    repeated = "".join(f"{i + 1}\n00:00:{i:02d},000 --> 00:00:{i:02d},900\n[moaning]\n\n" for i in range(20))
+    analyzer = make_analyzer(tmp_path)
+    analyzer.analyze_content(repeated + "21\n00:00:30,000 --> 00:00:31,000\n♪\n\n", "lush4")
+
+    user_content = api_calls[0]["messages"][1]["content"]
+    assert user_content == "00:00:00,000 [moaning] ×20 (至 00:00:19,900)"
+    stats = analyzer.last_run_stats
+    assert stats["removed_cues"] == 20
+    assert stats["compact_transcript_tokens"] < stats["raw_transcript_tokens"]
@@ -0,0 +1,52 @@
+import json
+import time
+
+from disk_cache import DiskCache
+
+
+def _index(cache):
+    with open(cache.index_path, encoding="utf-8") as f:
+        return json.load(f)["entries"]
+
+
+def test_hits_are_kept_in_memory_until_flush(tmp_path):
+    cache = DiskCache(str(tmp_path), flush_interval=3600)
+    cache.put("a", "內容")
+    saved = _index(cache)
+
+    for _ in range(3):
+        assert cache.get("a") == "內容"
+    assert _index(cache) == saved
+
+    cache.flush()
+    assert _index(cache)["a"]["hits"] == 3
+    assert _index(cache)["a"]["last_access"] > saved["a"]["last_access"]
+
+
+def test_hit_writes_index_after_flush_interval(tmp_path):
+    cache = DiskCache(str(tmp_path), flush_interval=0.05)
+    cache.put("a", "x")
+    cache.get("a")
+    assert _index(cache)["a"]["hits"] == 0
+
+    time.sleep(0.06)
+    cache.get("a")
+    assert _index(cache)["a"]["hits"] == 2
+
+
+def test_put_persists_pending_hits_and_eviction_uses_them(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10, flush_interval=3600)
+    cache.put("old", "12345")
+    cache.put("new", "12345")
+    # 命中只更新記憶體，但淘汰時仍依最新的存取時間選擇條目
+    time.sleep(0.01)
+    cache.get("old")
+    cache.put("third", "12345")
+
+    assert "old" in cache and "third" in cache and "new" not in cache
+    index = _index(cache)
+    assert set(index) == {"old", "third"}
+    assert index["old"]["hits"] == 1
+
+    reopened = DiskCache(str(tmp_path))
+    assert reopened.get("old") == "12345"
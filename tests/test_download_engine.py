@@ -0,0 +1,109 @@
+import os
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from download_engine import SegmentedDownloader, create_session
+
+PAYLOAD = bytes(range(256)) * 400          # 102400 位元組
+RANGE_SIZE = 16 * 1024
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """支援 Range 的靜態文件伺服器；可對指定起點注入一次截斷或 404"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        start, end = (int(v) for v in self.headers["Range"].split("=")[1].split("-"))
+        self.server.requests.append(start)
+        failure = self.server.failures.pop(start, None)
+        if failure == "404":
+            self.send_error(404)
+            return
+        body = PAYLOAD[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        self.end_headers()
+        if failure == "truncate":
+            # 只送出一半內容後關閉連線，模擬傳輸途中斷線
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    httpd.requests = []
+    httpd.failures = {}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/audio.bin"
+
+
+def test_truncated_segment_is_retried_without_double_counting(server, tmp_path):
+    server.failures[2 * RANGE_SIZE] = "truncate"
+    engine = SegmentedDownloader(str(tmp_path), max_workers=3, range_size=RANGE_SIZE, resume=False)
+
+    data = b"".join(engine.iter_ranges(url(server), "job"))
+
+    assert data == PAYLOAD
+    assert server.requests.count(2 * RANGE_SIZE) == 2
+    assert engine.progress.downloaded == len(PAYLOAD)
+    assert os.listdir(tmp_path) == []
+
+
+def test_resume_skips_completed_segments(server, tmp_path):
+    server.failures[3 * RANGE_SIZE] = "404"
+    engine = SegmentedDownloader(str(tmp_path), max_workers=2, range_size=RANGE_SIZE, resume=True)
+
+    received = []
+    with pytest.raises(requests.HTTPError):
+        for chunk in engine.iter_ranges(url(server), "job"):
+            received.append(chunk)
+    assert len(received) == 3
+
+    server.requests.clear()
+    data = b"".join(engine.iter_ranges(url(server), "job"))
+
+    assert data == PAYLOAD
+    assert 3 * RANGE_SIZE in server.requests
+    assert not {0, RANGE_SIZE, 2 * RANGE_SIZE} & set(server.requests)
+    assert engine.progress.downloaded == len(PAYLOAD)
+    assert engine.progress.resumed_bytes >= 3 * RANGE_SIZE
+
+    engine.cleanup("job")
+    assert not os.path.exists(tmp_path / "job")
+
+
+def test_create_session_leaves_base_session_untouched():
+    base = requests.Session()
+    base.headers["User-Agent"] = "phub"
+    base.cookies.set("sid", "1")
+    adapters = dict(base.adapters)
+
+    session = create_session(base=base)
+
+    assert session is not base
+    assert base.adapters == adapters
+    assert session.headers["User-Agent"] == "phub"
+    assert session.cookies.get("sid") == "1"
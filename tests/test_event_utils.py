@@ -0,0 +1,64 @@
+from event_utils import smooth_events, make_event, event_strengths, event_time, MAX_STRENGTH_STEP
+
+
+def _event(seconds, action, time_sec=5):
+    event = make_event(seconds, {}, time_sec, "")
+    event["command"]["action"] = action
+    return event
+
+
+def test_zero_strength_becomes_stop():
+    events = smooth_events([_event(0, "Vibrate:3"), _event(5, "Vibrate:0")])
+    assert events[-1]["command"]["action"] == "Stop"
+    assert events[-1]["command"]["timeSec"] == 0
+
+
+def test_zero_component_is_removed():
+    events = smooth_events([_event(0, "Vibrate:4,Rotate:0")])
+    assert event_strengths(events[0]) == {"Vibrate": 4}
+
+
+def test_strength_steps_are_bounded():
+    events = smooth_events([_event(0, "Vibrate:2"), _event(10, "Vibrate:20"), _event(20, "Vibrate:1")])
+    for prev, nxt in zip(events, events[1:]):
+        assert abs(event_strengths(prev).get("Vibrate", 0) - event_strengths(nxt).get("Vibrate", 0)) <= MAX_STRENGTH_STEP
+
+
+def test_ramps_down_before_stop():
+    events = smooth_events([_event(0, "Vibrate:16"), _event(10, "Stop")])
+    assert [event_strengths(e).get("Vibrate") for e in events] == [16, 12, 8, 4, None]
+
+
+def test_windows_do_not_overlap_and_long_gaps_are_held():
+    events = smooth_events([_event(0, "Vibrate:5", 15), _event(40, "Vibrate:6")], end_time=45)
+    assert [event_time(e) for e in events] == [0, 15, 30, 40]
+    for prev, nxt in zip(events, events[1:]):
+        assert event_time(prev) + prev["command"]["timeSec"] <= event_time(nxt) + 1e-6
+    assert events[-1]["command"]["timeSec"] == 5
+
+
+def test_input_is_not_modified():
+    events = [_event(0, "Vibrate:25", 30), _event(10, "Vibrate:0")]
+    smooth_events(events)
+    assert [e["command"]["action"] for e in events] == ["Vibrate:25", "Vibrate:0"]
+    assert events[0]["command"]["timeSec"] == 30
+
+
+def test_ramps_up_after_stop():
+    events = smooth_events([_event(0, "Stop", 0), _event(10, "Vibrate:16", 5)])
+    assert [(event_time(e), event_strengths(e).get("Vibrate")) for e in events] == \
+        [(0, None), (4, 4), (6, 8), (8, 12), (10, 16)]
+    assert all(e["command"]["timeSec"] == 2 for e in events[1:4])
+
+
+def test_last_event_is_held_until_end_time():
+    events = smooth_events([_event(0, "Vibrate:6")], end_time=40)
+    assert [event_time(e) for e in events] == [0, 15, 30]
+    assert all(e["description"].startswith("維持事件") for e in events[1:])
+    assert [e["command"]["timeSec"] for e in events] == [15, 15, 10]
+    assert {e["command"]["action"] for e in events} == {"Vibrate:6"}
+
+
+def test_stop_is_not_held():
+    events = smooth_events([_event(0, "Vibrate:4"), _event(5, "Stop", 0)], end_time=60)
+    assert [e["command"]["action"] for e in events] == ["Vibrate:4", "Stop"]
@@ -0,0 +1,64 @@
+import os
+import json
+from types import SimpleNamespace
+
+import openai
+import pytest
+
+import pipeline_tasks
+from jobs import Job, JobOptions, JobEventType, run_stage
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SRT = "1\n00:00:01,000 --> 00:00:02,000\n開始\n\n2\n00:00:20,000 --> 00:00:21,000\n停下\n\n"
+RESPONSE = json.dumps({"events": [
+    {"timestamp": "00:00:01,000", "command": {"command": "Function", "action": "Vibrate:8", "timeSec": 5, "apiVer": 1},
+     "description": "開始"},
+    {"timestamp": "00:00:20,000", "command": {"command": "Function", "action": "Stop", "timeSec": 0, "apiVer": 1},
+     "description": "停下"},
+]}, ensure_ascii=False)
+
+
+def fake_stream(progress):
+    """逐段送出 RESPONSE 的假串流，progress 記錄已送出的片段數"""
+    def chunk(content=None, usage=None):
+        choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+        return SimpleNamespace(choices=choices, usage=usage)
+
+    for i in range(0, len(RESPONSE), 16):
+        progress.append(i)
+        yield chunk(RESPONSE[i:i + 16])
+    progress.append("done")
+    yield chunk(usage=SimpleNamespace(prompt_tokens=100, completion_tokens=50, prompt_tokens_details=None))
+
+
+@pytest.fixture
+def srt_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(pipeline_tasks, "ANALYSIS_DIR", str(tmp_path))
+    monkeypatch.setattr(pipeline_tasks, "TOY_FUNCTIONS_JSON", os.path.join(ROOT, "toys_funcs.json"))
+    monkeypatch.setattr(pipeline_tasks, "get_cache", lambda kind: None)
+    path = tmp_path / "clip.srt"
+    path.write_text(SRT, encoding="utf-8")
+    return str(path)
+
+
+def test_stream_mode_publishes_events_before_the_response_ends(srt_path, monkeypatch):
+    progress = []
+    monkeypatch.setattr(openai.chat.completions, "create", lambda **kwargs: fake_stream(progress))
+    job = Job(srt_path, JobOptions(toy_key="lush4", engine="llm", analysis_mode="stream"))
+    received = []
+
+    def on_event(event):
+        if event.type == JobEventType.ANALYSIS_EVENT:
+            received.append((event.data, "done" in progress))
+        elif event.type == JobEventType.STAGE_COMPLETED:
+            received.append((None, "done" in progress))
+
+    assert run_stage(job, "analyze", on_event)
+
+    events = [data for data, _ in received if data is not None]
+    assert events[0]["command"]["action"] == "Vibrate:8"
+    assert events[-1]["command"]["action"] == "Stop"
+    assert received[0][1] is False          # 第一個事件在串流結束前就交出
+    assert received[-1] == (None, True)
+    assert job.event_count == len(events)
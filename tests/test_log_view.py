@@ -0,0 +1,129 @@
+import logging
+
+import pytest
+
+import log_view
+from log_view import LogView, infer_level
+
+
+class FakeText:
+    """只模擬 LogView 用到的 Tk Text 介面 (以行號索引刪除)，不需要顯示器"""
+
+    def __init__(self, parent, **kwargs):
+        self.content = ""
+        self.scheduled = []
+
+    def tag_configure(self, tag, **kwargs):
+        pass
+
+    def configure(self, **kwargs):
+        pass
+
+    def after(self, ms, callback):
+        self.scheduled.append(callback)
+
+    def yview(self):
+        return (0.0, 1.0)
+
+    def see(self, index):
+        pass
+
+    def insert(self, index, text, tags=()):
+        assert index == log_view.tk.END
+        self.content += text
+
+    def delete(self, start, end):
+        assert start == "1.0"
+        if end == log_view.tk.END:
+            self.content = ""
+        else:
+            # "N.0" 為第 N 行開頭：刪除前 N-1 行
+            self.content = "".join(self.content.splitlines(True)[int(end.split(".")[0]) - 1:])
+
+    @property
+    def lines(self):
+        return self.content.splitlines()
+
+    def run_scheduled(self):
+        callbacks, self.scheduled = self.scheduled, []
+        for callback in callbacks:
+            callback()
+
+
+@pytest.fixture
+def make_view(monkeypatch):
+    monkeypatch.setattr(log_view.scrolledtext, "ScrolledText", FakeText)
+    return lambda **kwargs: LogView(None, **kwargs)
+
+
+def test_append_is_batched_into_one_flush(make_view):
+    view = make_view()
+    for i in range(3):
+        view.append(f"訊息 {i}")
+
+    assert view.text.lines == [] and len(view.text.scheduled) == 1
+    view.text.run_scheduled()
+    assert view.text.lines == ["訊息 0", "訊息 1", "訊息 2"]
+
+
+def test_widget_keeps_only_the_last_max_lines(make_view):
+    view = make_view(max_lines=5)
+    for i in range(3):
+        view.append(f"a{i}")
+    view.flush()
+    for i in range(4):
+        view.append(f"b{i}")
+    view.text.run_scheduled()
+
+    assert view.text.lines == ["a2", "b0", "b1", "b2", "b3"]
+    assert view.dropped == 0
+    # 多行訊息按實際行數計算
+    view.append("c0\nc1")
+    view.flush()
+    assert view.text.lines == ["b1", "b2", "b3", "c0", "c1"]
+
+
+def test_messages_beyond_the_buffer_are_counted_as_dropped(make_view):
+    view = make_view(max_lines=3)
+    for i in range(5):
+        view.append(f"m{i}")
+    view.flush()
+
+    assert view.text.lines == ["m2", "m3", "m4"]
+    assert view.dropped == 2
+
+
+def test_level_filter_applies_on_flush_and_redraws_on_change(make_view):
+    view = make_view(min_level=logging.WARNING)
+    view.append("DEBUG: 細節")
+    view.append("一般訊息")
+    view.append("警告：磁碟空間不足")
+    view.append("錯誤：下載失敗")
+    view.flush()
+    assert view.text.lines == ["警告：磁碟空間不足", "錯誤：下載失敗"]
+
+    view.set_min_level(logging.DEBUG)
+    assert view.text.lines == ["DEBUG: 細節", "一般訊息", "警告：磁碟空間不足", "錯誤：下載失敗"]
+    view.set_min_level(logging.ERROR)
+    assert view.text.lines == ["錯誤：下載失敗"]
+    # 重繪後新訊息照常套用新的等級
+    view.append("一般訊息 2")
+    view.append("❌ 失敗", logging.ERROR)
+    view.text.run_scheduled()
+    assert view.text.lines == ["錯誤：下載失敗", "❌ 失敗"]
+
+
+def test_messages_are_forwarded_to_logger(make_view, caplog):
+    logger = logging.getLogger("test_log_view")
+    view = make_view(logger=logger, min_level=logging.ERROR)
+    with caplog.at_level(logging.DEBUG, logger="test_log_view"):
+        view.append("警告：略過")
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [(logging.WARNING, "警告：略過")]
+
+
+def test_infer_level():
+    assert infer_level("錯誤：x") == logging.ERROR
+    assert infer_level("❌ x") == logging.ERROR
+    assert infer_level("警告：x") == logging.WARNING
+    assert infer_level("DEBUG: x") == logging.DEBUG
+    assert infer_level("完成") == logging.INFO
@@ -0,0 +1,88 @@
+import time
+
+from lovense import LovenseController
+from playback import EventPlayer
+from event_utils import make_event, smooth_events
+
+
+class RecordingSocket:
+    """記錄 emit 的假 socket，確認回呼立即以空參數觸發"""
+
+    def __init__(self):
+        self.sent = []
+
+    def emit(self, event, data, callback=None):
+        self.sent.append(data)
+        if callback:
+            callback()
+
+
+def make_controller(min_interval=0.2):
+    controller = LovenseController("token", min_interval=min_interval, max_rate=100, burst=10)
+    controller.socket = RecordingSocket()
+    return controller
+
+
+def vibrate(strength, toy=None):
+    command = {"command": "Function", "action": f"Vibrate:{strength}", "timeSec": 5, "apiVer": 1}
+    if toy is not None:
+        command["toy"] = toy
+    return command
+
+
+def test_stop_all_discards_pending_commands_for_every_toy():
+    controller = make_controller()
+    controller.send_command(vibrate(5, "a"))
+    controller.send_command(vibrate(10, "a"))  # 在 min_interval 內，被合併等待發送
+    assert "a" in controller._pending
+
+    controller.stop_all()
+    sent_after_stop = len(controller.socket.sent)
+    assert controller._pending == {}
+    assert controller._flush_timer is None
+
+    time.sleep(controller.min_interval * 2)
+    assert len(controller.socket.sent) == sent_after_stop
+    assert controller.socket.sent[-1]["action"] == "Stop"
+
+
+def test_toy_stop_discards_that_toy_and_broadcast_commands_only():
+    controller = make_controller()
+    for toy in ("a", "b", None):
+        controller.send_command(vibrate(5, toy))
+        controller.send_command(vibrate(10, toy))
+
+    controller.send_command({"command": "Function", "action": "Stop", "timeSec": 0, "toy": "a", "apiVer": 1})
+    assert set(controller._pending) == {"b"}
+
+    time.sleep(controller.min_interval * 2)
+    actions = [(command.get("toy"), command["action"]) for command in controller.socket.sent]
+    assert actions[-1] == ("b", "Vibrate:10")
+    assert ("a", "Vibrate:10") not in actions
+    assert (None, "Vibrate:10") not in actions
+
+
+def test_early_hold_refresh_is_not_dropped():
+    controller = make_controller(min_interval=0.0)
+    controller.send_command(vibrate(5))
+    time.sleep(0.05)
+    controller.send_command(vibrate(5))      # 尚在持續時間內但會延長它，不是重複指令
+    assert len(controller.socket.sent) == 2
+    controller.send_command(vibrate(5))      # 與上一個指令幾乎同時，視為重複
+    assert len(controller.socket.sent) == 2
+    assert controller.stats["dropped"] == 1
+
+
+def test_smoothed_holds_survive_playback():
+    hold = 0.2
+    events = smooth_events([make_event(0, {"Vibrate": 5}, 0, "a"), make_event(1.6, {"Vibrate": 6}, 0, "b")],
+                           end_time=2.0, hold_seconds=hold)
+    holds = [event for event in events if event["description"].startswith("維持事件")]
+    # 0.2-1.4 秒之間 7 個，最後一個事件延續到 end_time 再加 1 個
+    assert len(holds) == 8
+    controller = make_controller(min_interval=0.0)
+    # 提前送出 (lookahead) 讓維持指令在前一個指令到期前幾毫秒送達
+    EventPlayer(controller, events, lookahead=0.01).play(blocking=True)
+
+    assert [command["action"] for command in controller.socket.sent] == [e["command"]["action"] for e in events]
+    assert controller.stats["dropped"] == 0
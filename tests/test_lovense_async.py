@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("socketio")
+pytest.importorskip("aiohttp")
+
+from local_toy_server import LocalToyServer
+from lovense_async import AsyncLovenseController
+
+ACK_DELAY = 0.05
+
+
+def test_ack_latency_and_timeout():
+    async def scenario():
+        server = LocalToyServer(ack_delays={"probe": ACK_DELAY, "stuck": 1.0})
+        url = await server.start()
+        controller = AsyncLovenseController(url, ack_timeout=0.3)
+        await controller.connect()
+        try:
+            rtts = [await controller.vibrate(k, 1, toy_id="probe") for k in range(1, 4)]
+            settled = controller.latency_estimate
+            timed_out = await controller.vibrate(1, 1, toy_id="stuck")
+        finally:
+            await controller.close()
+            await server.stop()
+        return controller, rtts, settled, timed_out
+
+    controller, rtts, settled, timed_out = asyncio.run(scenario())
+
+    assert all(ACK_DELAY <= rtt < ACK_DELAY + 0.05 for rtt in rtts)
+    # 單程延遲估計為往返時間一半的 EWMA
+    assert ACK_DELAY / 2 <= settled < (ACK_DELAY + 0.05) / 2
+    assert list(controller.rtt_samples) == rtts
+    assert controller.latency_stats()["count"] == 3
+    assert timed_out is None
+    assert controller.stats["timeouts"] == 1 and controller.stats["acked"] == 3
+
+
+def test_commands_are_queued_while_offline_and_replayed_after_reconnect():
+    async def scenario():
+        # 先取得一個空閒的埠，再關閉伺服器讓控制器連線失敗
+        probe = LocalToyServer()
+        url = await probe.start()
+        await probe.stop()
+        port = int(url.rsplit(":", 1)[1])
+
+        controller = AsyncLovenseController(url, backoff_base=0.05, backoff_max=0.1, max_queue=3)
+        await controller.connect()
+        assert not controller.connected
+        for strength in range(1, 5):
+            assert await controller.vibrate(strength, 1, toy_id="toy") is None
+
+        server = LocalToyServer(port=port)
+        await server.start()
+        try:
+            await controller.wait_connected(timeout=5)
+            for _ in range(100):
+                if not controller.queue:
+                    break
+                await asyncio.sleep(0.02)
+        finally:
+            await controller.close()
+            await server.stop()
+        return controller, [command["action"] for command, _ in server.arrivals("toy")]
+
+    controller, actions = asyncio.run(scenario())
+
+    # 隊列最多 3 個，最舊的指令被丟棄，其餘依序補發
+    assert actions == ["Vibrate:2", "Vibrate:3", "Vibrate:4"]
+    assert controller.stats["queue_dropped"] == 1
+    assert controller.stats["reconnects"] >= 1
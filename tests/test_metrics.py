@@ -0,0 +1,88 @@
+import json
+import threading
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_to_prometheus_groups_series_under_help_and_type(registry):
+    registry.inc("whisper_requests_total")
+    registry.inc("whisper_requests_total", 2)
+    registry.inc("lovense_commands_total", result="sent")
+    registry.inc("lovense_commands_total", 3, result="dropped")
+    registry.observe("stage_seconds", 0.5, stage="download", status="done")
+    registry.observe("stage_seconds", 1.25, stage="download", status="done")
+    registry.inc("custom_total", 1.5)
+
+    assert registry.to_prometheus().splitlines() == [
+        "# TYPE custom_total untyped",
+        "custom_total 1.5",
+        "# HELP lovense_commands_total 玩具指令數 (依結果: sent/merged/dropped)",
+        "# TYPE lovense_commands_total counter",
+        'lovense_commands_total{result="dropped"} 3',
+        'lovense_commands_total{result="sent"} 1',
+        "# HELP stage_seconds 工作階段耗時 (秒)",
+        "# TYPE stage_seconds summary",
+        'stage_seconds_count{stage="download",status="done"} 2',
+        'stage_seconds_sum{stage="download",status="done"} 1.750000',
+        "# HELP whisper_requests_total Whisper 轉錄請求數",
+        "# TYPE whisper_requests_total counter",
+        "whisper_requests_total 3",
+    ]
+
+
+def test_label_values_are_escaped(registry):
+    registry.inc("cache_hits_total", kind='a"b\\c\nd')
+    assert 'cache_hits_total{kind="a\\"b\\\\c\\nd"} 1' in registry.to_prometheus()
+
+
+def test_empty_registry_exports_a_single_newline(registry):
+    assert registry.to_prometheus() == "\n"
+
+
+def test_counter_and_summary_values_across_labels(registry):
+    registry.inc("lovense_commands_total", result="sent")
+    registry.inc("lovense_commands_total", 4, result="merged")
+    registry.observe("llm_request_seconds", 1.0, mode="single")
+    registry.observe("llm_request_seconds", 3.0, mode="stream")
+
+    assert registry.counter_value("lovense_commands_total") == 5
+    assert registry.counter_value("lovense_commands_total", result="merged") == 4
+    assert registry.summary_value("llm_request_seconds") == {"count": 2, "sum": 4.0}
+    assert registry.report()["derived"]["llm_avg_seconds"] == 2.0
+
+
+def test_concurrent_increments_are_not_lost(registry):
+    def work():
+        for _ in range(1000):
+            registry.inc("whisper_requests_total")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert registry.counter_value("whisper_requests_total") == 8000
+
+
+def test_write_reports(tmp_path, monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(metrics, "write", registry.write)
+    registry.inc("download_bytes_total", 4096)
+    registry.observe("download_seconds", 2.0)
+
+    json_path, prom_path = metrics.write_reports(str(tmp_path / "out"), "run")
+
+    with open(json_path, encoding="utf-8") as f:
+        report = json.load(f)
+    assert report["derived"]["download_throughput_bytes_per_second"] == 2048.0
+    with open(prom_path, encoding="utf-8") as f:
+        assert "download_bytes_total 4096\n" in f.read()
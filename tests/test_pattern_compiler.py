@@ -0,0 +1,95 @@
+from event_utils import make_event, event_time, event_strengths
+from pattern_compiler import compile_events, MAX_PATTERN_STEPS
+from playback import EventPlayer
+
+STEP_MS = 500
+
+
+def _event(seconds, action, time_sec=1.0, toy=None):
+    event = make_event(seconds, {}, time_sec, "")
+    event["command"]["action"] = action
+    if toy:
+        event["command"]["toy"] = toy
+    return event
+
+
+def _strength_at(events, t):
+    """依原始 Function 事件的階梯語意取得 t 時的強度 (事件結束後為 0)"""
+    value = 0
+    for event in events:
+        start = event_time(event)
+        if start <= t < start + event["command"]["timeSec"]:
+            value = next(iter(event_strengths(event).values()), 0)
+    return value
+
+
+def _pattern_strength_at(compiled, t):
+    """將 Pattern 指令展開回 t 時的強度"""
+    for event in compiled:
+        command = event["command"]
+        step = int(command["rule"].split("S:")[1].rstrip("#")) / 1000.0
+        values = [int(v) for v in command["strength"].split(";")]
+        k = int((t - event_time(event)) / step + 1e-6)
+        if 0 <= k < len(values):
+            return values[k]
+    return 0
+
+
+def test_round_trip_keeps_step_values():
+    events = [_event(0, "Vibrate:4"), _event(1, "Vibrate:12"), _event(2, "Vibrate:12"),
+              _event(3, "Vibrate:20", 1.5), _event(5, "Vibrate:6")]
+    compiled = compile_events(events, STEP_MS)
+
+    assert [e["command"]["command"] for e in compiled] == ["Pattern"]
+    for k in range(13):
+        t = k * STEP_MS / 1000.0
+        assert _pattern_strength_at(compiled, t) == _strength_at(events, t), t
+
+
+def test_long_runs_are_split_into_chunks_without_losing_samples():
+    events = [_event(k, f"Vibrate:{1 + k % 20}") for k in range(40)]
+    compiled = compile_events(events, STEP_MS)
+
+    assert len(compiled) == 2
+    assert compiled[0]["command"]["strength"].count(";") == MAX_PATTERN_STEPS - 1
+    for k in range(80):
+        t = k * STEP_MS / 1000.0
+        assert _pattern_strength_at(compiled, t) == _strength_at(events, t)
+
+
+def test_runs_are_split_when_the_toy_changes():
+    events = [_event(k, "Vibrate:5", toy="a") for k in range(3)] + \
+             [_event(3 + k, "Vibrate:8", toy="b") for k in range(3)]
+    compiled = compile_events(events, STEP_MS)
+
+    assert [e["command"].get("toy") for e in compiled] == ["a", "b"]
+    assert compiled[1]["command"]["strength"] == ";".join(["8"] * 6)
+
+
+def test_discontinuities_keep_function_commands():
+    events = [_event(0, "Vibrate:5"), _event(1, "Vibrate:6"), _event(2, "Vibrate:7"), _event(3, "Stop", 0),
+              _event(10, "Rotate:3")]
+    compiled = compile_events(events, STEP_MS)
+
+    assert [e["command"]["command"] for e in compiled] == ["Pattern", "Function", "Function"]
+    assert [e["command"].get("action") for e in compiled[1:]] == ["Stop", "Rotate:3"]
+
+
+class RecordingController:
+    def __init__(self):
+        self.sent = []
+
+    def send_command(self, command):
+        self.sent.append(command)
+
+
+def test_player_compiles_patterns_when_enabled():
+    events = [_event(k * 0.1, f"Vibrate:{k + 1}", 0.1) for k in range(5)] + [_event(0.5, "Stop", 0)]
+    controller = RecordingController()
+    player = EventPlayer(controller, events, lookahead=0.0, compile_patterns=True, pattern_step_ms=100)
+
+    player.play(blocking=True)
+
+    assert [c["command"] for c in controller.sent] == ["Pattern", "Function"]
+    assert controller.sent[0]["strength"] == "1;2;3;4;5"
+    assert controller.sent[1]["action"] == "Stop"
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+import pipeline_tasks
+from content_analyzer import ContentAnalyzer
+from event_utils import make_event
+from token_budget import TokenBudgetExceeded
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+SRT = "".join(f"{i + 1}\n00:00:{i:02d},000 --> 00:00:{i:02d},900\n第 {i} 句字幕，開大一點\n\n" for i in range(30))
+
+
+@pytest.fixture
+def windowed_calls(tmp_path, monkeypatch):
+    """讓 LLM 分析在輸入 token 預算上失敗，並以假的窗口化分析取代 API 請求"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(pipeline_tasks, "ANALYSIS_DIR", str(tmp_path))
+    monkeypatch.setattr(pipeline_tasks, "TOY_FUNCTIONS_JSON", os.path.join(ROOT, "toys_funcs.json"))
+    monkeypatch.setattr(pipeline_tasks, "ANALYSIS_MAX_INPUT_TOKENS", "50")
+    monkeypatch.setattr(pipeline_tasks, "get_cache", lambda kind: None)
+    calls = []
+
+    def fake_windowed(self, transcript, toy_key=None, **kwargs):
+        calls.append(toy_key)
+        self._start_run("windowed")
+        self.analysis_result = {"events": [make_event(0, {"Vibrate": 5}, 1, "窗口")]}
+        self._finish_run()
+        return self.analysis_result
+
+    monkeypatch.setattr(ContentAnalyzer, "analyze_content_windowed", fake_windowed)
+    return calls
+
+
+def test_auto_mode_falls_back_to_windowed(windowed_calls):
+    messages = []
+    path, count = pipeline_tasks.analyze(SRT, None, "lush4", messages.append, engine="llm", mode="auto")
+    assert windowed_calls == ["lush4"]
+    assert count == 1 and os.path.exists(path)
+    assert any("窗口化分析" in message for message in messages)
+
+
+def test_windowed_mode_skips_single_request(windowed_calls, monkeypatch):
+    monkeypatch.setattr(ContentAnalyzer, "analyze_content", lambda *args: pytest.fail("不應送出單次請求"))
+    pipeline_tasks.analyze(SRT, None, "lush4", engine="llm", mode="windowed")
+    assert windowed_calls == ["lush4"]
+
+
+def test_single_mode_reports_budget_error(windowed_calls):
+    with pytest.raises(TokenBudgetExceeded):
+        pipeline_tasks.analyze(SRT, None, "lush4", engine="llm", mode="single")
+    assert windowed_calls == []
+
+
+def test_unknown_mode_is_rejected(windowed_calls):
+    with pytest.raises(ValueError):
+        pipeline_tasks.analyze(SRT, None, "lush4", engine="llm", mode="bogus")
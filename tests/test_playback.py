@@ -0,0 +1,132 @@
+import time
+
+import pytest
+
+socketio = pytest.importorskip("socketio")
+pytest.importorskip("aiohttp")
+
+from lovense import LovenseController
+from playback import EventPlayer
+from event_utils import make_event
+from local_toy_server import LocalToyServer
+
+ACK_DELAY = 0.04
+SLOW_ACK_DELAY = 0.2
+TOLERANCE = 0.03
+
+
+class SlowController:
+    """第一次 send_command 阻塞 block 秒的控制器，用來製造落後的指令"""
+
+    def __init__(self, block):
+        self.block = block
+        self.sent = []
+
+    def send_command(self, command):
+        self.sent.append((time.monotonic(), command))
+        if len(self.sent) == 1:
+            time.sleep(self.block)
+
+
+@pytest.fixture
+def toy_server():
+    """子行程中的本地 socket.io 伺服器：toy 為 probe/slow 的指令延遲確認，其餘立即確認"""
+    server = LocalToyServer(ack_delays={"probe": ACK_DELAY, "slow": SLOW_ACK_DELAY})
+    server.start_in_process()
+    yield server
+    server.stop_process()
+
+
+@pytest.fixture
+def controller(toy_server):
+    controller = LovenseController("token", min_interval=0.0, max_rate=100, burst=10)
+    controller.socket = socketio.Client()
+    controller.socket.connect(toy_server.url)
+    yield controller
+    if controller.socket.connected:
+        controller.socket.disconnect()
+
+
+def collect_arrivals(controller, server, toy=None):
+    """斷開連線並停止伺服器，返回伺服器記錄的 (動作, 到達時間)"""
+    controller.socket.disconnect()
+    server.stop_process()
+    return [(command["action"], at) for command, at in server.arrivals(toy)]
+
+
+def event(seconds, action, toy="target"):
+    result = make_event(seconds, {}, 1, "")
+    result["command"]["action"] = action
+    result["command"]["toy"] = toy
+    return result
+
+
+def wait_for_acks(controller, count, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while controller.latency_samples < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert controller.latency_samples == count
+
+
+def test_ack_updates_latency_estimate_with_ewma(controller):
+    for strength in range(1, 4):
+        controller.vibrate(strength, 1, toy_id="probe")
+        wait_for_acks(controller, strength)
+    # 往返時間 = 確認延遲 + 實際傳輸；單程估計略高於確認延遲的一半
+    settled = controller.latency_estimate
+    assert ACK_DELAY / 2 <= settled < ACK_DELAY / 2 + TOLERANCE
+
+    # 一次慢速確認只以 alpha=0.2 的權重拉高估計 (EWMA)，不會直接取代
+    controller.vibrate(1, 1, toy_id="slow")
+    wait_for_acks(controller, 4)
+    expected = 0.8 * settled + 0.2 * SLOW_ACK_DELAY / 2
+    assert expected <= controller.latency_estimate < expected + 0.2 * TOLERANCE
+
+
+def test_events_arrive_in_time_order(controller, toy_server):
+    events = [event(0.3, "Vibrate:3"), event(0.1, "Vibrate:1"), event(0.2, "Vibrate:2")]
+    player = EventPlayer(controller, events, lookahead=0.0)
+
+    start = time.monotonic()
+    player.play(blocking=True)
+    arrivals = collect_arrivals(controller, toy_server, "target")
+
+    assert [action for action, _ in arrivals] == ["Vibrate:1", "Vibrate:2", "Vibrate:3"]
+    lateness = [at - start - target for (_, at), target in zip(arrivals, (0.1, 0.2, 0.3))]
+    # 不提前送出時，指令在目標時間之後到達 (傳輸延遲)，且各指令的延遲一致
+    assert all(0 <= late < TOLERANCE for late in lateness)
+    assert max(lateness) - min(lateness) < TOLERANCE / 2
+    assert player.dispatched == 3 and player.skipped == 0
+    assert player.jitter_stats()["max_ms"] < TOLERANCE * 1000
+
+
+def test_commands_arrive_on_time_with_measured_latency(controller, toy_server):
+    # 以立即確認的玩具量測實際傳輸延遲
+    for strength in range(1, 6):
+        controller.vibrate(strength, 1, toy_id="probe-fast")
+        wait_for_acks(controller, strength)
+    lookahead = controller.latency_estimate
+    assert 0 < lookahead < TOLERANCE
+
+    targets = (0.2, 0.3, 0.4)
+    player = EventPlayer(controller, [event(t, f"Vibrate:{k + 5}") for k, t in enumerate(targets)])
+    start = time.monotonic()
+    player.play(blocking=True)
+    arrivals = collect_arrivals(controller, toy_server, "target")
+
+    assert [action for action, _ in arrivals] == ["Vibrate:5", "Vibrate:6", "Vibrate:7"]
+    # 依延遲估計提前送出後，到達時間對齊時間軸 (誤差遠小於未補償的單程延遲加上抖動)
+    lateness = [at - start - t for (_, at), t in zip(arrivals, targets)]
+    assert all(abs(late) < TOLERANCE / 3 for late in lateness)
+
+
+def test_late_commands_are_skipped_but_stop_is_always_sent():
+    controller = SlowController(block=0.4)
+    events = [event(0.0, "Vibrate:5"), event(0.05, "Vibrate:6"), event(0.1, "Stop"), event(0.6, "Vibrate:7")]
+    player = EventPlayer(controller, events, lookahead=0.0, max_lateness=0.2)
+
+    player.play(blocking=True)
+
+    assert [command["action"] for _, command in controller.sent] == ["Vibrate:5", "Stop", "Vibrate:7"]
+    assert player.skipped == 1
+    assert player.dispatched == 3
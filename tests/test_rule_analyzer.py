@@ -0,0 +1,42 @@
+import pytest
+
+from rule_analyzer import parse_directive, analyze_transcript, RELATIVE_STEP
+from event_utils import event_strengths
+
+
+@pytest.mark.parametrize("text, kind, value", [
+    ("more", "relative", RELATIVE_STEP),
+    ("harder, more!", "relative", RELATIVE_STEP),
+    ("開到最大", "absolute", 20),
+    ("最大力", "absolute", 20),
+    ("用最強的", "absolute", 20),
+    ("開到最小", "absolute", 1),
+    ("停下", "stop", 0),
+    ("不要停", "hold", None),
+    ("繼續", "hold", None),
+    ("keep going", "hold", None),
+    ("don't stop", "hold", None),
+    ("不要停，用力", "relative", RELATIVE_STEP),
+    ("keep going, slower", "relative", -RELATIVE_STEP),
+])
+def test_parse_directive(text, kind, value):
+    directive = parse_directive(text)
+    assert directive is not None
+    assert (directive["kind"], directive["value"]) == (kind, value)
+
+
+@pytest.mark.parametrize("text", [
+    "no more please",
+    "not more than that",
+    "最大的問題是時間",
+    "最小的那個",
+])
+def test_parse_directive_ignores_false_positives(text):
+    assert parse_directive(text) is None
+
+
+def test_dont_stop_holds_current_level():
+    srt = ("1\n00:00:01,000 --> 00:00:02,000\n用 10 強度\n\n"
+           "2\n00:00:04,000 --> 00:00:05,000\n不要停\n")
+    events = analyze_transcript(srt, ["Vibrate"])["events"]
+    assert [event_strengths(e) for e in events] == [{"Vibrate": 10}, {"Vibrate": 10}]
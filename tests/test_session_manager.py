@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("socketio")
+pytest.importorskip("aiohttp")
+
+from event_utils import make_event
+from local_toy_server import LocalToyServer
+from session_manager import SessionManager, run_load_test, DEFAULT_MAX_SPREAD
+
+SLOW_ACK_SECONDS = 0.8
+
+
+def test_slow_session_does_not_stall_other_sessions():
+    async def scenario():
+        server = LocalToyServer(ack_delays={"slow": SLOW_ACK_SECONDS})
+        url = await server.start()
+        manager = SessionManager(max_spread=0.05)
+        for toy in ("fast0", "fast1", "fast2", "slow"):
+            manager.add_session(toy, url, toy_key="lush4", toy_id=toy)
+        await manager.connect_all()
+        interval = 0.1
+        events = [make_event(k * interval, {"Vibrate": k + 1}, interval, "tick") for k in range(5)]
+        try:
+            await manager.play(events, drain_timeout=3.0)
+        finally:
+            await manager.close_all()
+            await server.stop()
+        return manager, [(toy, command["action"], at) for toy, command, at in server.received]
+
+    manager, received = asyncio.run(scenario())
+
+    # 快速會話收到每一個 tick，且按時間軸的時間到達，不受慢會話的確認延遲影響
+    started = min(at for _, _, at in received)
+    for toy in ("fast0", "fast1", "fast2"):
+        arrivals = [(action, at) for t, action, at in received if t == toy]
+        assert [action for action, _ in arrivals] == [f"Vibrate:{k + 1}" for k in range(5)]
+        for k, (_, at) in enumerate(arrivals):
+            assert at - started < k * 0.1 + 0.08
+
+    # 慢會話只送出第一個與最後一個 (最新) 狀態，中間的指令被取代
+    slow = [action for t, action, _ in received if t == "slow"]
+    assert slow == ["Vibrate:1", "Vibrate:5"]
+    assert manager.sessions["slow"].superseded == 3
+
+    # 時間差以實際送出時間計算：tick 0 同時送出，tick 4 反映慢會話的延遲
+    assert manager.spreads[0] < 0.05
+    assert manager.spreads[-1] > SLOW_ACK_SECONDS / 2
+    assert manager.spread_stats()["violations"] >= 1
+
+    # 確認往返延遲分開統計
+    slow_rtt = list(manager.sessions["slow"].controller.rtt_samples)
+    fast_rtt = list(manager.sessions["fast0"].controller.rtt_samples)
+    assert len(slow_rtt) == 2 and min(slow_rtt) >= SLOW_ACK_SECONDS
+    assert len(fast_rtt) == 5 and max(fast_rtt) < SLOW_ACK_SECONDS / 2
+
+
+def test_load_test_with_200_sessions_stays_within_spread_bound():
+    result = asyncio.run(run_load_test(sessions=200, ticks=10, interval=0.2))
+
+    assert result["server_received"] == 200 * 10
+    assert result["spread"]["ticks"] == 10
+    assert result["spread"]["max_ms"] <= DEFAULT_MAX_SPREAD * 1000
+    assert result["within_bound"]
@@ -0,0 +1,62 @@
+from srt_utils import parse_srt, format_srt, shift_cues, merge_srt_chunks, compact_cues, compact_srt
+
+CHUNK = "1\n00:00:00,500 --> 00:00:02,000\n{text} 一\n\n2\n00:00:59,000 --> 00:01:00,250\n{text} 二\n"
+
+
+def test_shift_cues_moves_start_and_end_without_modifying_input():
+    cues = parse_srt(CHUNK.format(text="a"))
+    shifted = shift_cues(cues, 600.25)
+
+    assert [(c["start"], c["end"]) for c in shifted] == [(600.75, 602.25), (659.25, 660.5)]
+    assert cues[0]["start"] == 0.5
+
+
+def test_merge_srt_chunks_offsets_and_renumbers():
+    # 分段的完成順序與起始時間無關
+    merged = merge_srt_chunks([(600.0, CHUNK.format(text="第二段")), (0.0, CHUNK.format(text="第一段"))])
+    cues = parse_srt(merged)
+
+    assert [c["index"] for c in cues] == [1, 2, 3, 4]
+    assert [c["text"] for c in cues] == ["第一段 一", "第一段 二", "第二段 一", "第二段 二"]
+    assert [c["start"] for c in cues] == [0.5, 59.0, 600.5, 659.0]
+    assert "00:11:00,250" in merged
+
+
+def test_merge_srt_chunks_sorts_overlapping_cues():
+    merged = merge_srt_chunks([(0.0, "1\n00:00:58,000 --> 00:01:01,000\n尾\n"),
+                               (59.5, "1\n00:00:00,000 --> 00:00:01,000\n頭\n")])
+    assert [c["text"] for c in parse_srt(merged)] == ["尾", "頭"]
+
+
+def test_format_round_trip():
+    cues = parse_srt(CHUNK.format(text="x"))
+    assert parse_srt(format_srt(cues)) == cues
+
+
+def _cue(start, end, text):
+    return {"index": 0, "start": start, "end": end, "text": text}
+
+
+def test_compact_cues_drops_empty_cues_and_merges_close_repeats():
+    cues = [_cue(1.0, 2.0, "♪ ♪"), _cue(2.0, 3.0, "[moaning]"), _cue(3.5, 4.0, "[Moaning]"),
+            _cue(5.5, 6.0, "[moaning]"), _cue(9.0, 10.0, "[moaning]"), _cue(10.0, 11.0, "..."),
+            _cue(11.0, 12.0, "好  了\n吧")]
+
+    compacted = compact_cues(cues, merge_gap=2.0)
+
+    # 間隔超過 merge_gap 的重複條目不合併；文字的空白被正規化
+    assert compacted == [
+        {"start": 2.0, "end": 6.0, "text": "[moaning]", "repeat": 3},
+        {"start": 9.0, "end": 10.0, "text": "[moaning]", "repeat": 1},
+        {"start": 11.0, "end": 12.0, "text": "好 了 吧", "repeat": 1},
+    ]
+
+
+def test_compact_srt_formats_repeats_and_reports_stats():
+    srt = format_srt([_cue(1.0, 2.0, "啊"), _cue(2.5, 3.0, "啊"), _cue(3.0, 4.0, "♪"), _cue(70.0, 71.0, "結束")])
+
+    text, stats = compact_srt(srt)
+
+    assert text == "00:00:01,000 啊 ×2 (至 00:00:03,000)\n00:01:10,000 結束"
+    assert stats == {"cues": 4, "compact_cues": 2, "raw_chars": len(srt), "compact_chars": len(text)}
+    assert stats["compact_chars"] < stats["raw_chars"]
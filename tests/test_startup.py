@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import logging
+import subprocess
+
+import pytest
+
+import config
+from startup_benchmark import HEAVY_MODULES, measure_imports
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+
+def _loaded_after_import(module, tmp_path, env=None):
+    """在全新的直譯器中匯入 module，返回其後已載入的重量級模組"""
+    code = f"import sys, json, {module}; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    env = dict(env if env is not None else os.environ, PYTHONPATH=ROOT)
+    # 在暫存目錄執行：UI_main 匯入時會建立 app.log，也不讀取專案的 .env
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env,
+                            cwd=str(tmp_path), timeout=60)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", ["UI_main", "pipeline_tasks", "jobs", "batch_runner"])
+def test_entry_modules_do_not_load_heavy_libraries(module, tmp_path):
+    assert _loaded_after_import(module, tmp_path) == []
+
+
+def test_stage_modules_import_without_api_key(tmp_path):
+    pytest.importorskip("openai")
+    env = {key: value for key, value in os.environ.items() if key != "OPENAI_API_KEY"}
+
+    # 金鑰只在建立 AudioProcessor/ContentAnalyzer 時檢查，匯入本身不會失敗
+    for module in ("voice2text", "content_analyzer"):
+        assert "openai" in _loaded_after_import(module, tmp_path, env)
+
+
+def test_api_key_is_checked_when_the_stage_needs_it(monkeypatch):
+    pytest.importorskip("openai")
+    from voice2text import AudioProcessor
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    monkeypatch.setattr(config, "_env_loaded", True)
+
+    with pytest.raises(ValueError, match="OPENAI_API_KEY"):
+        AudioProcessor()
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    assert config.require_openai_api_key() == "test-key"
+
+
+def test_setup_logging_runs_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(config, "_logging_configured", False)
+    monkeypatch.setattr(logging, "basicConfig", lambda **kwargs: calls.append(kwargs))
+
+    config.setup_logging(filename="first.log")
+    config.setup_logging(filename="second.log", level=logging.DEBUG)
+
+    assert [call["filename"] for call in calls] == ["first.log"]
+
+
+def test_measure_imports_reports_time_and_errors():
+    results = measure_imports(["config", "no_such_module_xyz"], repeat=1)
+
+    assert [r["module"] for r in results] == ["config", "no_such_module_xyz"]
+    assert results[0]["error"] is None and results[0]["import_ms"] >= 0
+    assert "ModuleNotFoundError" in results[1]["error"]
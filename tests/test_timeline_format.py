@@ -0,0 +1,71 @@
+import json
+
+from playback import EventPlayer
+from timeline_format import Timeline, write_timeline, json_to_timeline, timeline_to_json
+
+EVENTS = [
+    {"timestamp": "00:00:01,000", "description": "開始",
+     "command": {"command": "Function", "action": "Vibrate:5", "timeSec": 2, "apiVer": 1}},
+    {"timestamp": "00:00:03,500", "description": "沒有持續時間",
+     "command": {"command": "Function", "action": "Vibrate:8,Rotate:3", "apiVer": 1}},
+    {"timestamp": "00:00:05,000", "description": "停止",
+     "command": {"command": "Function", "action": "Stop", "timeSec": 0, "apiVer": 1}},
+    {"timestamp": "00:00:06,250",
+     "command": {"command": "Function", "action": "Pump:4", "timeSec": 1.5, "loopRunningSec": 0.5,
+                 "loopPauseSec": 0, "apiVer": 1, "toy": "toy1"}},
+    {"timestamp": "00:00:08,000", "description": "Pattern",
+     "command": {"command": "Pattern", "rule": "V:1;F:v;S:500#", "strength": "1;2;3", "timeSec": 1.5,
+                 "apiVer": 2}},
+]
+
+
+def _write_json(path, events):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"events": events}, f, ensure_ascii=False)
+
+
+def test_json_round_trip_keeps_missing_and_zero_fields(tmp_path):
+    json_path = tmp_path / "analysis.json"
+    _write_json(json_path, EVENTS)
+
+    timeline_path = json_to_timeline(str(json_path))
+    output_path = timeline_to_json(timeline_path, str(tmp_path / "decoded.json"))
+    with open(output_path, encoding="utf-8") as f:
+        decoded = json.load(f)["events"]
+
+    assert decoded == EVENTS
+    assert "timeSec" not in decoded[1]["command"]
+    assert decoded[2]["command"]["timeSec"] == 0
+
+
+def test_seek_returns_first_record_at_or_after_time(tmp_path):
+    path = str(tmp_path / "events.lvtl")
+    write_timeline(EVENTS, path)
+    with Timeline(path) as timeline:
+        assert len(timeline) == len(EVENTS)
+        assert timeline.seek(0) == 0
+        assert timeline.seek(3.5) == 1
+        assert timeline.seek(4) == 2
+        assert timeline.seek(100) == len(EVENTS)
+
+
+class RecordingController:
+    def __init__(self):
+        self.sent = []
+
+    def send_command(self, command):
+        self.sent.append(command)
+
+
+def test_player_loads_only_records_after_the_start_offset(tmp_path):
+    path = str(tmp_path / "events.lvtl")
+    write_timeline(EVENTS, path)
+
+    player = EventPlayer.from_timeline(RecordingController(), path, start_offset=4.0)
+    assert [t for t, _, _ in sorted(player._timeline)] == [5.0, 6.25, 8.0]
+
+    with Timeline(path) as timeline:
+        controller = RecordingController()
+        player = EventPlayer.from_timeline(controller, timeline, start_offset=7.9, lookahead=0.0)
+    player.play(start_offset=7.9, blocking=True)
+    assert controller.sent == [EVENTS[-1]["command"]]
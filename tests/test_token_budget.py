@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+import pytest
+
+import token_budget
+from token_budget import (estimate_tokens, estimate_messages_tokens, check_budget, usage_to_dict, add_usage,
+                          TokenBudgetExceeded, MESSAGE_OVERHEAD_TOKENS)
+
+
+@pytest.fixture
+def no_tiktoken(monkeypatch):
+    """使用字元估算，結果不依賴 tiktoken 是否安裝"""
+    monkeypatch.setattr(token_budget, "_get_encoding", lambda: None)
+
+
+def test_estimate_counts_cjk_per_character(no_tiktoken):
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("你好嗎") == 3
+    assert estimate_tokens("abcdefgh") == 2
+    assert estimate_tokens("你好 abcd") == 2 + 2
+
+
+def test_messages_include_per_message_overhead(no_tiktoken):
+    messages = [{"role": "system", "content": "abcd"}, {"role": "user", "content": "你好"}]
+    assert estimate_messages_tokens(messages) == 1 + 2 + 2 * MESSAGE_OVERHEAD_TOKENS
+
+
+def test_check_budget():
+    check_budget(100, 100)
+    check_budget(10 ** 6, None)
+    check_budget(10 ** 6, 0)
+    with pytest.raises(TokenBudgetExceeded, match="窗口 2的輸入約 101 tokens，超過預算 100 tokens") as excinfo:
+        check_budget(101, 100, "窗口 2")
+    assert isinstance(excinfo.value, ValueError)
+
+
+def test_usage_helpers():
+    usage = SimpleNamespace(prompt_tokens=100, completion_tokens=20,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+    total = add_usage(usage_to_dict(None), usage_to_dict(usage))
+    add_usage(total, usage_to_dict(SimpleNamespace(prompt_tokens=5, completion_tokens=None,
+                                                   prompt_tokens_details=None)))
+    assert total == {"prompt_tokens": 105, "completion_tokens": 20, "cached_tokens": 64}
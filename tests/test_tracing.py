@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+
+import tracing
+
+
+@pytest.fixture
+def trace():
+    """每個測試從空的追蹤開始，結束時關閉追蹤"""
+    tracing.clear()
+    yield tracing
+    tracing.disable()
+    tracing.clear()
+
+
+def _spans(name=None):
+    return [e for e in tracing._events if e["ph"] != "M" and (name is None or e["name"] == name)]
+
+
+def test_nested_spans_are_contained_in_their_parent(trace):
+    trace.enable()
+    with trace.span("outer", cat="job", job="j1"):
+        with trace.span("inner") as inner:
+            inner.set(bytes=42)
+        with trace.span("sibling"):
+            pass
+
+    outer, = _spans("outer")
+    # 完成事件 (X) 在區段結束時記錄，子區段先於父區段出現
+    assert [e["name"] for e in _spans()] == ["inner", "sibling", "outer"]
+    for child in _spans("inner") + _spans("sibling"):
+        assert child["ph"] == "X" and child["tid"] == outer["tid"]
+        assert outer["ts"] <= child["ts"] and child["ts"] + child["dur"] <= outer["ts"] + outer["dur"]
+    assert outer["cat"] == "job" and outer["args"] == {"job": "j1"}
+    assert _spans("inner")[0]["args"] == {"bytes": 42}
+
+
+def test_thread_name_metadata_is_recorded_once_per_thread(trace):
+    trace.enable()
+
+    def work():
+        for _ in range(3):
+            with trace.span("work"):
+                pass
+
+    thread = threading.Thread(target=work, name="worker-1")
+    thread.start()
+    thread.join()
+    work()
+
+    metadata = [e for e in trace._events if e["ph"] == "M"]
+    assert sorted(e["args"]["name"] for e in metadata) == sorted(["worker-1", threading.current_thread().name])
+    assert len(_spans("work")) == 6
+
+
+def test_exception_is_recorded_and_propagated(trace):
+    trace.enable()
+    with pytest.raises(RuntimeError):
+        with trace.span("failing"):
+            raise RuntimeError("boom")
+    assert _spans("failing")[0]["args"]["error"] == "RuntimeError: boom"
+
+
+def test_async_spans_use_begin_and_end_events(trace):
+    trace.enable()
+    with trace.span("openai.whisper", async_id="chunk-1"):
+        pass
+    assert [(e["ph"], e["id"]) for e in _spans()] == [("b", "chunk-1"), ("e", "chunk-1")]
+
+
+def test_nothing_is_recorded_when_disabled(trace):
+    calls = []
+
+    @trace.traced("decorated")
+    def decorated(x):
+        calls.append(x)
+        return x * 2
+
+    with trace.span("ignored") as ignored:
+        ignored.set(size=1)
+    assert ignored is tracing._NULL_SPAN
+    assert decorated(3) == 6
+    trace.complete("done", 0.0)
+    trace.instant("tick")
+    trace.flow("handoff", 1, start=True)
+
+    assert trace._events == [] and calls == [3]
+
+    trace.enable()
+    decorated(4)
+    assert [e["name"] for e in _spans()] == ["decorated"]
+
+
+def test_events_beyond_the_limit_are_dropped(trace, monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "MAX_EVENTS", 3)
+    trace.enable()
+    for _ in range(5):
+        trace.instant("tick")
+
+    # 上限包含執行緒名稱的中繼事件
+    assert len(trace._events) == 3
+    path = tmp_path / "out" / "trace.json"
+    assert trace.export(str(path)) == 3
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["otherData"]["dropped_events"] == 3
+    assert [e["ph"] for e in data["traceEvents"]] == ["M", "i", "i"]
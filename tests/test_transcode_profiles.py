@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+pytest.importorskip("openai")
+
+import transcode_profiles
+from transcode_profiles import benchmark_profiles, TRANSCODE_PROFILES
+
+
+def _fake_transcode(output_dirs, fail_on=None):
+    """不呼叫 ffmpeg：依設定檔位元率寫出對應大小的文件"""
+    def transcode_file(input_path, output_base, profile):
+        output_dirs.add(os.path.dirname(output_base))
+        if profile == fail_on:
+            raise RuntimeError("ffmpeg 失敗")
+        output_path = output_base + TRANSCODE_PROFILES[profile]["ext"]
+        with open(output_path, "wb") as f:
+            f.write(b"\0" * TRANSCODE_PROFILES[profile]["kbps"] * 1000)
+        return {"profile": profile, "output_path": output_path, "output_bytes": os.path.getsize(output_path)}
+    return transcode_file
+
+
+def test_benchmark_against_local_stub(monkeypatch, tmp_path):
+    output_dirs = set()
+    monkeypatch.setattr(transcode_profiles, "transcode_file", _fake_transcode(output_dirs))
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    results = benchmark_profiles(str(tmp_path / "input.mp4"), ["mp3_stereo_q2", "speech_opus_16k"],
+                                 local_stub=True)
+
+    assert [r["profile"] for r in results] == ["mp3_stereo_q2", "speech_opus_16k"]
+    # 模擬端點的延遲隨上傳大小增加
+    assert results[0]["transcribe_seconds"] > results[1]["transcribe_seconds"]
+    assert not any(os.path.exists(d) for d in output_dirs)
+
+
+def test_temp_dir_is_removed_when_a_profile_fails(monkeypatch, tmp_path):
+    output_dirs = set()
+    monkeypatch.setattr(transcode_profiles, "transcode_file",
+                        _fake_transcode(output_dirs, fail_on="speech_opus_32k"))
+
+    with pytest.raises(RuntimeError):
+        benchmark_profiles(str(tmp_path / "input.mp4"), ["speech_mp3_48k", "speech_opus_32k"], transcribe=False)
+
+    assert len(output_dirs) == 1
+    assert not os.path.exists(output_dirs.pop())
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import vad
+from vad import SAMPLE_RATE, _frame_features, _stream_features, detect_speech_regions, prepare_speech_audio
+
+
+def _signal(seconds=6.0, speech=((1.0, 2.5), (4.0, 5.0)), seed=0):
+    """低音量白噪音中夾雜 440 Hz 的「語音」片段，返回 int16 取樣"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    samples = rng.normal(0, 0.003, len(t))
+    for start, end in speech:
+        on = (t >= start) & (t < end)
+        samples[on] += 0.3 * np.sin(2 * np.pi * 440 * t[on])
+    return (np.clip(samples, -1, 1) * 32767).astype("<i2")
+
+
+def _blocks(samples, size):
+    return [samples[i:i + size] for i in range(0, len(samples), size)]
+
+
+@pytest.mark.parametrize("block_size", [7, 480, 1000, 16000, 10 ** 6])
+def test_streamed_features_match_whole_file(block_size):
+    samples = _signal(2.0)
+    expected = _frame_features(samples.astype(np.float32) / 32768.0, SAMPLE_RATE)
+    kept = []
+    streamed = _stream_features(_blocks(samples, block_size), SAMPLE_RATE, keep=kept)
+
+    for a, b in zip(expected, streamed):
+        np.testing.assert_allclose(a, b, rtol=1e-5, atol=1e-5)
+    assert np.array_equal(np.concatenate(kept), samples)
+
+
+def test_prepare_speech_audio_processes_blocks(monkeypatch, tmp_path):
+    samples = _signal()
+    monkeypatch.setattr(vad, "iter_pcm_blocks", lambda path, rate: iter(_blocks(samples, 16000)))
+    written = {}
+
+    def fake_extract(chunks, output_path, output_args=None, input_args=None):
+        written["pcm"] = b"".join(chunks)
+        return len(written["pcm"])
+
+    monkeypatch.setattr(vad, "extract_audio_stream", fake_extract)
+
+    result = prepare_speech_audio(str(tmp_path / "input.mp3"), str(tmp_path))
+
+    assert result["original_seconds"] == pytest.approx(6.0)
+    assert [round(start, 1) for _, start, _ in result["mapping"]] == [0.8, 3.8]
+    assert result["speech_seconds"] == pytest.approx(3.0, abs=0.5)
+    # 輸出的 PCM 直接取自 int16 取樣，與原始取樣一致
+    first_start = int(result["mapping"][0][1] * SAMPLE_RATE)
+    first = np.frombuffer(written["pcm"], dtype="<i2")[:100]
+    assert np.array_equal(first, samples[first_start:first_start + 100])
+    regions = detect_speech_regions(samples.astype(np.float32) / 32768.0)
+    assert [round(s, 1) for s, _ in regions] == [0.8, 3.8]
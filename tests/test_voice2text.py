@@ -0,0 +1,63 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+
+import voice2text
+from srt_utils import parse_srt
+from voice2text import AudioProcessor
+
+CHUNK_SRT = "1\n00:00:01,000 --> 00:00:02,500\n{name} 第一句\n\n2\n00:00:20,000 --> 00:00:21,000\n{name} 第二句\n"
+
+
+@pytest.fixture
+def processor(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+    return AudioProcessor()
+
+
+def test_chunked_transcription_stitches_chunks_in_order(processor, monkeypatch, tmp_path):
+    audio_path = tmp_path / "long.mp3"
+    audio_path.write_bytes(b"\0" * 1000)
+    monkeypatch.setattr(voice2text, "probe_duration", lambda path: 95.0)
+    # 30 秒附近沒有靜音、60 秒附近有靜音：切割點為 0、30、61
+    monkeypatch.setattr(voice2text, "detect_silences", lambda path: [(60.0, 62.0)])
+
+    chunk_dirs = set()
+
+    def fake_cut(source, output_path, start, duration):
+        chunk_dirs.add(os.path.dirname(output_path))
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(f"{start:g}")
+
+    def fake_transcribe(chunk_path):
+        with open(chunk_path, encoding="utf-8") as f:
+            start = f.read()
+        # 越前面的分段越晚完成，確認合併結果不依完成順序
+        time.sleep(0.1 if start == "0" else 0.0)
+        return CHUNK_SRT.format(name=f"段{start}")
+
+    monkeypatch.setattr(voice2text, "cut_segment", fake_cut)
+    monkeypatch.setattr(processor, "_transcribe_file", fake_transcribe)
+
+    srt = processor.transcribe_audio(str(audio_path), chunked=True, max_workers=3, chunk_seconds=30)
+    cues = parse_srt(srt)
+
+    assert [cue["text"] for cue in cues] == ["段0 第一句", "段0 第二句", "段30 第一句", "段30 第二句",
+                                             "段61 第一句", "段61 第二句"]
+    assert [cue["start"] for cue in cues] == [1.0, 20.0, 31.0, 50.0, 62.0, 81.0]
+    assert [cue["index"] for cue in cues] == list(range(1, 7))
+    # 暫存分段已清除
+    assert len(chunk_dirs) == 1 and not os.path.exists(chunk_dirs.pop())
+
+
+def test_small_files_are_sent_in_one_request(processor, monkeypatch, tmp_path):
+    audio_path = tmp_path / "short.mp3"
+    audio_path.write_bytes(b"\0" * 1000)
+    calls = []
+    monkeypatch.setattr(processor, "_transcribe_file", lambda path: calls.append(path) or CHUNK_SRT.format(name="全"))
+
+    assert processor.transcribe_audio(str(audio_path)) == CHUNK_SRT.format(name="全")
+    assert calls == [str(audio_path)]
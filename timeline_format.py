@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import logging
+import argparse
+from bisect import bisect_left
+from typing import List, Dict, Any, Optional
+
+from event_utils import parse_action, format_action, event_time
+from srt_utils import seconds_to_srt_time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 為選用依賴，缺少時改用 struct 逐筆讀取
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LVTL"
+FORMAT_VERSION = 2
+NO_STRING = 0xFFFFFFFF
+# 版本 2 起，指令中沒有 timeSec/loopRunningSec/loopPauseSec 時以此值標記 (與 0 區分)
+NO_VALUE = 0xFFFFFFFF
+MAX_ACTIONS = 4
+
+# 檔頭: magic, 版本, 記錄大小, 記錄數, 字串表位移, 字串數
+HEADER = struct.Struct("<4sHHIII")
+# 記錄: 時間, 持續, 循環運行, 循環暫停 (毫秒，缺少時為 NO_VALUE), 描述索引, 額外欄位索引,
+#       指令類型, 功能數, 4 組 (功能代碼, 強度), 2 bytes 對齊
+RECORD = struct.Struct("<IIIIIIBB8B2x")
+
+COMMAND_CODES = {"Function": 0, "Pattern": 1}
+ACTION_CODES = {
+    "Vibrate": 1, "Rotate": 2, "Pump": 3, "Thrusting": 4, "All": 5,
+    "Position": 6, "Fingering": 7, "Suction": 8, "Depth": 9, "Oscillate": 10,
+}
+_COMMAND_NAMES = {v: k for k, v in COMMAND_CODES.items()}
+_ACTION_NAMES = {v: k for k, v in ACTION_CODES.items()}
+# 固定欄位以外的指令鍵值存放在字串表 (JSON)
+_FIXED_KEYS = {"command", "action", "timeSec", "loopRunningSec", "loopPauseSec", "apiVer"}
+
+if np is not None:
+    RECORD_DTYPE = np.dtype([
+        ("time_ms", "<u4"), ("duration_ms", "<u4"), ("loop_run_ms", "<u4"), ("loop_pause_ms", "<u4"),
+        ("desc_index", "<u4"), ("extra_index", "<u4"), ("command", "u1"), ("n_actions", "u1"),
+        ("actions", "u1", (MAX_ACTIONS, 2)), ("pad", "V2"),
+    ])
+    assert RECORD_DTYPE.itemsize == RECORD.size
+
+
+def _to_ms(value: Any) -> int:
+    try:
+        return min(NO_VALUE - 1, max(0, int(round(float(value or 0) * 1000))))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _optional_ms(command: Dict[str, Any], key: str) -> int:
+    """指令沒有此欄位 (或為 None) 時返回 NO_VALUE，讓解碼時不會補上 0"""
+    value = command.get(key)
+    return NO_VALUE if value is None else _to_ms(value)
+
+
+def _from_ms(ms: int):
+    return ms // 1000 if ms % 1000 == 0 else ms / 1000.0
+
+
+def write_timeline(events: List[Dict[str, Any]], output_path: str):
+    """
+    將事件列表寫入二進位時間軸文件。
+
+    事件依時間排序後寫成固定寬度記錄，描述等字串另存於字串表 (重複字串只存一次)。
+    """
+    strings: List[str] = []
+    string_index: Dict[str, int] = {}
+
+    def intern(text: Optional[str]) -> int:
+        if text is None:
+            return NO_STRING
+        if text not in string_index:
+            string_index[text] = len(strings)
+            strings.append(text)
+        return string_index[text]
+
+    timed = sorted(((event_time(e), i, e) for i, e in enumerate(events) if event_time(e) is not None),
+                   key=lambda item: item[:2])
+    records = bytearray()
+    for t, _, event in timed:
+        command = event.get("command") or {}
+        strengths = list(parse_action(command.get("action", "")).items())
+        unknown = [name for name, _ in strengths if name not in ACTION_CODES]
+        extra = {k: v for k, v in command.items() if k not in _FIXED_KEYS}
+        if command.get("apiVer", 1) != 1:
+            extra["apiVer"] = command.get("apiVer")
+        if command.get("command", "Function") not in COMMAND_CODES:
+            extra["command"] = command.get("command")
+        if unknown or len(strengths) > MAX_ACTIONS:
+            # 無法以固定欄位表示的 action 原樣保存
+            extra["action"] = command.get("action")
+            strengths = []
+        pairs = []
+        for name, value in strengths:
+            pairs += [ACTION_CODES[name], max(0, min(255, value))]
+        pairs += [0] * (MAX_ACTIONS * 2 - len(pairs))
+        records += RECORD.pack(
+            _to_ms(t), _optional_ms(command, "timeSec"),
+            _optional_ms(command, "loopRunningSec"), _optional_ms(command, "loopPauseSec"),
+            intern(event.get("description")),
+            intern(json.dumps(extra, ensure_ascii=False, sort_keys=True)) if extra else NO_STRING,
+            COMMAND_CODES.get(command.get("command", "Function"), 0),
+            len(strengths), *pairs,
+        )
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for blob in encoded:
+        offsets.append(offsets[-1] + len(blob))
+    strings_offset = HEADER.size + len(records)
+    with open(output_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, len(timed), strings_offset, len(strings)))
+        f.write(records)
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        f.write(b"".join(encoded))
+    logger.info(f"二進位時間軸已保存到: {output_path} ({len(timed)} 筆記錄, {len(strings)} 個字串)")
+
+
+class Timeline:
+    """
+    以 mmap 開啟的二進位時間軸。
+
+    開啟時只讀取檔頭；記錄在存取時才解碼，seek() 以二分搜尋定位，
+    安裝 NumPy 時另提供零複製的結構化陣列 (records)。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, count, strings_offset, strings_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"不是有效的時間軸文件: {path}")
+        if version not in (1, FORMAT_VERSION) or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"不支援的時間軸版本 {version} (記錄大小 {record_size})")
+        self.version = version
+        self.count = count
+        self._strings_offset = strings_offset
+        self._strings_count = strings_count
+        self._blob_offset = strings_offset + 4 * (strings_count + 1)
+        self.records = None
+        if np is not None:
+            self.records = np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+
+    def close(self):
+        self.records = None
+        if getattr(self, "_mm", None) is not None and not self._mm.closed:
+            try:
+                self._mm.close()
+            except BufferError:
+                # 仍有 NumPy 視圖引用時交由垃圾回收處理
+                pass
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def time_ms(self, index: int) -> int:
+        """第 index 筆記錄的時間 (毫秒)"""
+        return struct.unpack_from("<I", self._mm, HEADER.size + index * RECORD.size)[0]
+
+    def string(self, index: int) -> Optional[str]:
+        """讀取字串表中的字串"""
+        if index == NO_STRING:
+            return None
+        start, end = struct.unpack_from("<II", self._mm, self._strings_offset + 4 * index)
+        return self._mm[self._blob_offset + start:self._blob_offset + end].decode("utf-8")
+
+    def seek(self, seconds: float) -> int:
+        """返回第一個時間 >= seconds 的記錄索引"""
+        target = int(round(seconds * 1000))
+        if self.records is not None:
+            return int(np.searchsorted(self.records["time_ms"], target, side="left"))
+
+        class _Times:
+            def __len__(inner):
+                return self.count
+
+            def __getitem__(inner, i):
+                return self.time_ms(i)
+
+        return bisect_left(_Times(), target)
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        """將單筆記錄解碼為事件字典"""
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        fields = RECORD.unpack_from(self._mm, HEADER.size + index * RECORD.size)
+        time_ms, duration_ms, loop_run_ms, loop_pause_ms, desc_index, extra_index, command_code, n_actions = fields[:8]
+        pairs = fields[8:]
+        strengths = {_ACTION_NAMES.get(pairs[2 * k], "Vibrate"): pairs[2 * k + 1] for k in range(n_actions)}
+        command: Dict[str, Any] = {
+            "command": _COMMAND_NAMES.get(command_code, "Function"),
+            "action": format_action(strengths),
+        }
+        if self.version == 1:
+            # 版本 1 無法區分缺少與 0：持續時間一律保留，循環參數為 0 時省略
+            command["timeSec"] = _from_ms(duration_ms)
+            loop_run_ms = loop_run_ms or NO_VALUE
+            loop_pause_ms = loop_pause_ms or NO_VALUE
+        elif duration_ms != NO_VALUE:
+            command["timeSec"] = _from_ms(duration_ms)
+        if loop_run_ms != NO_VALUE:
+            command["loopRunningSec"] = _from_ms(loop_run_ms)
+        if loop_pause_ms != NO_VALUE:
+            command["loopPauseSec"] = _from_ms(loop_pause_ms)
+        command["apiVer"] = 1
+        extra = self.string(extra_index)
+        extra_fields = json.loads(extra) if extra else {}
+        command.update(extra_fields)
+        if command["command"] != "Function" and "action" not in extra_fields:
+            command.pop("action", None)
+        event = {"timestamp": seconds_to_srt_time(time_ms / 1000.0), "command": command}
+        description = self.string(desc_index)
+        if description is not None:
+            event["description"] = description
+        return event
+
+    def iter_from(self, seconds: float):
+        """從指定秒數開始依序產生事件"""
+        for index in range(self.seek(seconds), self.count):
+            yield self[index]
+
+    def to_events(self) -> List[Dict[str, Any]]:
+        """解碼全部記錄為事件列表"""
+        return [self[i] for i in range(self.count)]
+
+
+def json_to_timeline(json_path: str, output_path: Optional[str] = None) -> str:
+    """將分析結果 JSON 轉換為二進位時間軸，返回輸出路徑"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    output_path = output_path or os.path.splitext(json_path)[0] + ".lvtl"
+    write_timeline(data.get("events", []), output_path)
+    return output_path
+
+
+def timeline_to_json(timeline_path: str, output_path: Optional[str] = None) -> str:
+    """將二進位時間軸轉回分析結果 JSON，返回輸出路徑"""
+    output_path = output_path or os.path.splitext(timeline_path)[0] + ".json"
+    with Timeline(timeline_path) as timeline:
+        events = timeline.to_events()
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({"events": events}, f, ensure_ascii=False, indent=4)
+    return output_path
+
+
+def benchmark(json_path: str, repeats: int = 20) -> Dict[str, float]:
+    """
+    比較 JSON 與二進位時間軸的開啟/定位成本。
+
+    Returns:
+        Dict[str, float]: 各項平均耗時 (毫秒) 與文件大小 (位元組)。
+    """
+    timeline_path = os.path.splitext(json_path)[0] + ".lvtl"
+    json_to_timeline(json_path, timeline_path)
+
+    def timed(func) -> float:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            func()
+        return (time.perf_counter() - start) / repeats * 1000.0
+
+    def json_open_and_seek():
+        with open(json_path, 'r', encoding='utf-8') as f:
+            events = json.load(f)["events"]
+        times = [event_time(e) for e in events]
+        return times[len(times) // 2] if times else None
+
+    def timeline_open_and_seek():
+        with Timeline(timeline_path) as timeline:
+            if len(timeline):
+                return timeline[timeline.seek(timeline.time_ms(len(timeline) - 1) / 2000.0)]
+
+    return {
+        "json_bytes": os.path.getsize(json_path),
+        "timeline_bytes": os.path.getsize(timeline_path),
+        "json_open_seek_ms": timed(json_open_and_seek),
+        "timeline_open_seek_ms": timed(timeline_open_and_seek),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分析結果 JSON 與二進位時間軸 (.lvtl) 互相轉換")
+    sub = parser.add_subparsers(dest="action", required=True)
+    to_bin = sub.add_parser("compile", help="JSON -> .lvtl")
+    to_bin.add_argument("json_path")
+    to_bin.add_argument("-o", "--output")
+    to_json = sub.add_parser("decompile", help=".lvtl -> JSON")
+    to_json.add_argument("timeline_path")
+    to_json.add_argument("-o", "--output")
+    bench = sub.add_parser("bench", help="比較 JSON 與 .lvtl 的載入/定位耗時")
+    bench.add_argument("json_path")
+    bench.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.action == "compile":
+        print(json_to_timeline(args.json_path, args.output))
+    elif args.action == "decompile":
+        print(timeline_to_json(args.timeline_path, args.output))
+    else:
+        json.dump(benchmark(args.json_path, args.repeats), sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import re
+import logging
+import threading
+from typing import Dict, Any, Optional
+
+try:
+    import tiktoken
+except ImportError:  # 沒有 tiktoken 時使用字元數估算
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_ENCODING = "o200k_base"
+# 每則訊息的固定開銷 (角色標記等)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_CJK = re.compile(r"[\u3000-\u30ff\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]")
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    with _encoding_lock:
+        if _encoding is None and tiktoken is not None and not _encoding_failed:
+            try:
+                _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:  # 例如離線環境無法下載編碼表
+                _encoding_failed = True
+                logger.warning(f"無法載入 tiktoken 編碼 {TOKENIZER_ENCODING}，改用估算: {e}")
+        return _encoding
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    計算文本的 token 數。
+
+    有 tiktoken 時精確計算；否則以 CJK 字元約 1 token、其他字元約 4 字元 1 token 估算。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def estimate_messages_tokens(messages) -> int:
+    """估算聊天訊息列表的輸入 token 數"""
+    return sum(estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS for message in messages)
+
+
+class TokenBudgetExceeded(ValueError):
+    """輸入超過設定的 token 預算"""
+
+
+def check_budget(input_tokens: int, max_input_tokens: Optional[int], what: str = "請求"):
+    """
+    確認輸入 token 數不超過預算。
+
+    Raises:
+        TokenBudgetExceeded: 超過預算時。
+    """
+    if max_input_tokens and input_tokens > max_input_tokens:
+        raise TokenBudgetExceeded(
+            f"{what}的輸入約 {input_tokens} tokens，超過預算 {max_input_tokens} tokens；"
+            f"請提高預算或改用窗口化分析 (--analysis-mode windowed / ANALYSIS_MODE=windowed)。")
+
+
+def usage_to_dict(usage: Any) -> Dict[str, int]:
+    """將 API 回應的 usage 物件轉為 dict (含提示快取命中的 token 數)"""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0,
+    }
+
+
+def add_usage(total: Dict[str, int], usage: Dict[str, int]) -> Dict[str, int]:
+    for key, value in usage.items():
+        total[key] = total.get(key, 0) + value
+    return total
@@ -0,0 +1,218 @@
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from functools import wraps
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 記錄上限，避免忘記關閉時長時間執行耗盡記憶體
+MAX_EVENTS = 500000
+
+_enabled = False
+_events: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_origin = time.perf_counter()
+_pid = os.getpid()
+_named_threads = set()
+_dropped = 0
+
+
+class _NullSpan:
+    """追蹤關閉時使用的空 context manager (共用同一個實例，不產生任何配置)"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(output_path: Optional[str] = None):
+    """
+    開始記錄追蹤事件。
+
+    Args:
+        output_path (Optional[str]): 指定時，行程結束時自動匯出到此文件。
+    """
+    global _enabled
+    _enabled = True
+    if output_path:
+        atexit.register(export, output_path)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def _now_us() -> float:
+    return (time.perf_counter() - _origin) * 1e6
+
+
+def _record(event: Dict[str, Any]):
+    global _dropped
+    thread = threading.current_thread()
+    tid = thread.ident
+    with _lock:
+        if len(_events) >= MAX_EVENTS:
+            _dropped += 1
+            return
+        if tid not in _named_threads:
+            _named_threads.add(tid)
+            _events.append({"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid,
+                            "args": {"name": thread.name}})
+        event["pid"] = _pid
+        event["tid"] = tid
+        _events.append(event)
+
+
+class _Span:
+    __slots__ = ("name", "cat", "args", "async_id", "start")
+
+    def __init__(self, name: str, cat: str, args: Dict[str, Any], async_id: Optional[str]):
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.async_id = async_id
+
+    def set(self, **args):
+        """補充要記錄在區段上的參數 (例如完成後才知道的大小)"""
+        self.args.update(args)
+
+    def __enter__(self):
+        self.start = _now_us()
+        if self.async_id is not None:
+            _record({"name": self.name, "cat": self.cat, "ph": "b", "id": self.async_id, "ts": self.start,
+                     "args": self.args})
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = _now_us()
+        if exc_type is not None:
+            self.args["error"] = f"{exc_type.__name__}: {exc}"
+        if self.async_id is not None:
+            _record({"name": self.name, "cat": self.cat, "ph": "e", "id": self.async_id, "ts": end,
+                     "args": self.args})
+        else:
+            _record({"name": self.name, "cat": self.cat, "ph": "X", "ts": self.start, "dur": end - self.start,
+                     "args": self.args})
+        return False
+
+
+def span(name: str, cat: str = "pipeline", async_id: Optional[str] = None, **args):
+    """
+    以 with 區塊記錄一個區段；同一執行緒內的巢狀 with 會顯示為子區段。
+
+    Args:
+        name (str): 區段名稱，例如 'stage.transcribe'、'openai.whisper'。
+        cat (str): 類別，可在 Perfetto 中篩選。
+        async_id (Optional[str]): 在同一執行緒中會互相重疊的區段 (例如 asyncio 並行請求)
+            需要指定，改用非同步事件記錄。
+        **args: 記錄在區段上的參數。
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, cat, args, async_id)
+
+
+def complete(name: str, started: float, cat: str = "pipeline", async_id: Optional[str] = None, **args):
+    """
+    記錄一個已經結束的區段，用於無法以 with 包住的流程 (例如逐塊讀取的串流回應)。
+
+    Args:
+        started (float): 區段開始時的 time.perf_counter() 值。
+    """
+    if not _enabled:
+        return
+    start, end = (started - _origin) * 1e6, _now_us()
+    if async_id is not None:
+        _record({"name": name, "cat": cat, "ph": "b", "id": async_id, "ts": start, "args": args})
+        _record({"name": name, "cat": cat, "ph": "e", "id": async_id, "ts": end, "args": {}})
+    else:
+        _record({"name": name, "cat": cat, "ph": "X", "ts": start, "dur": end - start, "args": args})
+
+
+def instant(name: str, cat: str = "pipeline", **args):
+    """記錄一個時間點事件"""
+    if _enabled:
+        _record({"name": name, "cat": cat, "ph": "i", "s": "t", "ts": _now_us(), "args": args})
+
+
+def flow(name: str, flow_id: Any, start: bool, cat: str = "handoff"):
+    """
+    記錄跨執行緒交接的流程箭頭 (start=True 為起點，False 為終點)；
+    必須在起點與終點各自的區段內呼叫。
+    """
+    if _enabled:
+        event = {"name": name, "cat": cat, "ph": "s" if start else "f", "id": str(flow_id), "ts": _now_us()}
+        if not start:
+            event["bp"] = "e"
+        _record(event)
+
+
+def traced(name: Optional[str] = None, cat: str = "pipeline"):
+    """為函數加上區段的裝飾器"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with _Span(span_name, cat, {}, None):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def export(path: str) -> int:
+    """
+    將已記錄的事件寫入 Chrome/Perfetto trace-event JSON 文件
+    (可在 chrome://tracing 或 https://ui.perfetto.dev 開啟)。
+
+    Returns:
+        int: 寫入的事件數。
+    """
+    with _lock:
+        events = list(_events)
+        dropped = _dropped
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms",
+                   "otherData": {"dropped_events": dropped}}, f, ensure_ascii=False)
+    logger.info(f"追蹤已匯出: {path} ({len(events)} 個事件)")
+    return len(events)
+
+
+def clear():
+    global _dropped
+    with _lock:
+        _events.clear()
+        _named_threads.clear()
+        _dropped = 0
+
+
+def enable_from_env():
+    """TRACE_FILE 環境變數 (或 .env) 有設置時啟用追蹤，並在結束時匯出到該文件"""
+    from config import get_setting
+    path = get_setting('TRACE_FILE')
+    if path:
+        enable(path)
+    return path
@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+from typing import List, Dict, Any, Optional
+
+from audio_utils import probe_duration, extract_audio_file, extract_audio_stream
+from config import setup_logging, require_openai_api_key
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Whisper API 上傳大小限制為 25 MB，保留一些餘量
+WHISPER_MAX_UPLOAD_BYTES = 24 * 1024 * 1024
+
+# 轉碼設定檔：語音辨識只需要 16 kHz 單聲道，低位元率即可保持辨識品質
+TRANSCODE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "mp3_stereo_q2": {
+        "description": "原本的立體聲 MP3 (-q:a 2)，作為比較基準",
+        "ext": ".mp3",
+        "format": "mp3",
+        "kbps": 190,
+        "args": ["-vn", "-acodec", "libmp3lame", "-q:a", "2"],
+    },
+    "speech_mp3_48k": {
+        "description": "16 kHz 單聲道 MP3 48 kbps (相容性最佳)",
+        "ext": ".mp3",
+        "format": "mp3",
+        "kbps": 48,
+        "args": ["-vn", "-ac", "1", "-ar", "16000", "-acodec", "libmp3lame", "-b:a", "48k"],
+    },
+    "speech_opus_32k": {
+        "description": "16 kHz 單聲道 Opus 32 kbps",
+        "ext": ".ogg",
+        "format": "ogg",
+        "kbps": 32,
+        "args": ["-vn", "-ac", "1", "-ar", "16000", "-acodec", "libopus", "-b:a", "32k", "-application", "voip"],
+    },
+    "speech_opus_24k": {
+        "description": "16 kHz 單聲道 Opus 24 kbps",
+        "ext": ".ogg",
+        "format": "ogg",
+        "kbps": 24,
+        "args": ["-vn", "-ac", "1", "-ar", "16000", "-acodec", "libopus", "-b:a", "24k", "-application", "voip"],
+    },
+    "speech_opus_16k": {
+        "description": "16 kHz 單聲道 Opus 16 kbps (超長音訊用)",
+        "ext": ".ogg",
+        "format": "ogg",
+        "kbps": 16,
+        "args": ["-vn", "-ac", "1", "-ar", "16000", "-acodec", "libopus", "-b:a", "16k", "-application", "voip"],
+    },
+}
+BASELINE_PROFILE = "mp3_stereo_q2"
+# 自動選擇時依品質由高到低嘗試
+AUTO_PROFILE_ORDER = ["speech_opus_32k", "speech_opus_24k", "speech_opus_16k"]
+DEFAULT_PROFILE = "auto"
+
+
+def estimate_bytes(profile_name: str, duration: float) -> int:
+    """依位元率估算輸出大小 (含約 5% 容器開銷)"""
+    return int(TRANSCODE_PROFILES[profile_name]["kbps"] * 1000 / 8 * duration * 1.05)
+
+
+def select_profile(duration: Optional[float], max_bytes: int = WHISPER_MAX_UPLOAD_BYTES) -> str:
+    """
+    依音訊長度選擇能在上傳限制內單次上傳的最高品質設定檔。
+
+    長度未知時使用 AUTO_PROFILE_ORDER 的第一個；全部都超過限制時選最小的，
+    交給 AudioProcessor 的分段轉錄處理。
+    """
+    if not duration:
+        return AUTO_PROFILE_ORDER[0]
+    for name in AUTO_PROFILE_ORDER:
+        if estimate_bytes(name, duration) <= max_bytes:
+            return name
+    return AUTO_PROFILE_ORDER[-1]
+
+
+def resolve_profile(profile: Optional[str], duration: Optional[float]) -> str:
+    """將 'auto'/None 解析為具體的設定檔名稱"""
+    if not profile or profile == "auto":
+        return select_profile(duration)
+    if profile not in TRANSCODE_PROFILES:
+        raise ValueError(f"未知的轉碼設定檔: {profile}")
+    return profile
+
+
+def output_args(profile_name: str):
+    """返回給 audio_utils 使用的 ffmpeg 輸出參數建構函數"""
+    profile = TRANSCODE_PROFILES[profile_name]
+    return lambda path: profile["args"] + ["-f", profile["format"], path]
+
+
+def _stats(profile_name: str, output_path: str, duration: Optional[float], encode_seconds: float,
+           input_bytes: Optional[int], mode: str) -> Dict[str, Any]:
+    output_bytes = os.path.getsize(output_path)
+    metrics.observe("ffmpeg_seconds", encode_seconds, mode=mode, profile=profile_name)
+    metrics.inc("ffmpeg_output_bytes_total", output_bytes, profile=profile_name)
+    baseline = estimate_bytes(BASELINE_PROFILE, duration) if duration else None
+    stats = {
+        "profile": profile_name,
+        "output_path": output_path,
+        "duration_sec": duration,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "baseline_bytes": baseline,
+        "bytes_saved": (baseline - output_bytes) if baseline else None,
+        "encode_seconds": round(encode_seconds, 3),
+    }
+    saved = f"，較基準節省 {stats['bytes_saved'] / 1024 / 1024:.1f} MB" if baseline else ""
+    logger.info(f"轉碼完成 [{profile_name}]: {output_bytes / 1024 / 1024:.2f} MB，耗時 {encode_seconds:.1f} 秒{saved}")
+    return stats
+
+
+def transcode_file(input_path: str, output_base: str, profile: Optional[str] = DEFAULT_PROFILE) -> Dict[str, Any]:
+    """
+    將本地影音文件轉碼為適合 Whisper 的音訊。
+
+    Args:
+        input_path (str): 輸入影片或音訊文件。
+        output_base (str): 輸出路徑 (不含副檔名，副檔名由設定檔決定)。
+        profile (Optional[str]): 設定檔名稱或 'auto'。
+
+    Returns:
+        Dict[str, Any]: 轉碼統計 (profile, output_path, output_bytes, bytes_saved, encode_seconds...)。
+    """
+    duration = probe_duration(input_path)
+    profile_name = resolve_profile(profile, duration)
+    output_path = output_base + TRANSCODE_PROFILES[profile_name]["ext"]
+    start = time.perf_counter()
+    extract_audio_file(input_path, output_path, output_args(profile_name))
+    return _stats(profile_name, output_path, duration, time.perf_counter() - start, os.path.getsize(input_path), "file")
+
+
+def transcode_stream(chunks, output_base: str, profile: Optional[str] = DEFAULT_PROFILE,
+                     duration: Optional[float] = None) -> Dict[str, Any]:
+    """與 transcode_file 相同，但輸入為串流位元組 (例如下載中的分段)"""
+    profile_name = resolve_profile(profile, duration)
+    output_path = output_base + TRANSCODE_PROFILES[profile_name]["ext"]
+    start = time.perf_counter()
+    total = extract_audio_stream(chunks, output_path, output_args(profile_name))
+    return _stats(profile_name, output_path, duration, time.perf_counter() - start, total, "stream")
+
+
+def benchmark_profiles(audio_path: str, profiles: Optional[List[str]] = None,
+                       base_url: Optional[str] = None, transcribe: bool = True,
+                       local_stub: bool = False) -> List[Dict[str, Any]]:
+    """
+    比較各設定檔的上傳大小與轉錄延遲。
+
+    Args:
+        audio_path (str): 測試用的音訊或影片文件。
+        profiles (Optional[List[str]]): 要比較的設定檔，預設全部。
+        base_url (Optional[str]): Whisper 端點 (可指向本地模擬服務)。
+        transcribe (bool): 是否實際送出轉錄請求量測延遲。
+        local_stub (bool): 啟動 local_whisper_server.LocalWhisperServer 作為端點 (忽略 base_url，不需要 API Key)。
+    """
+    results = []
+    temp_dir = tempfile.mkdtemp(prefix="transcode_bench_")
+    stub = None
+    try:
+        client = None
+        if transcribe:
+            import openai
+            if local_stub:
+                from local_whisper_server import LocalWhisperServer
+                stub = LocalWhisperServer()
+                client = openai.OpenAI(api_key="local-stub", base_url=stub.start())
+            else:
+                client = openai.OpenAI(api_key=require_openai_api_key(), base_url=base_url)
+        for name in profiles or list(TRANSCODE_PROFILES):
+            stats = transcode_file(audio_path, os.path.join(temp_dir, name), name)
+            if client is not None:
+                start = time.perf_counter()
+                with open(stats["output_path"], "rb") as f:
+                    client.audio.transcriptions.create(model="whisper-1", file=f, response_format="srt")
+                stats["transcribe_seconds"] = round(time.perf_counter() - start, 3)
+            os.remove(stats["output_path"])
+            results.append(stats)
+    finally:
+        # 轉碼或轉錄失敗時也清除暫存的輸出
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        if stub is not None:
+            stub.stop()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較各轉碼設定檔的上傳大小與轉錄延遲")
+    parser.add_argument("audio_path")
+    parser.add_argument("--profiles", nargs="*", choices=list(TRANSCODE_PROFILES))
+    parser.add_argument("--base-url", help="Whisper 端點，例如本地模擬服務 http://127.0.0.1:8000/v1")
+    parser.add_argument("--no-transcribe", action="store_true", help="只比較轉碼大小與時間")
+    parser.add_argument("--local-stub", action="store_true",
+                        help="以內建的本地 Whisper 模擬端點量測轉錄延遲 (不需要 API Key，延遲隨上傳大小增加)")
+    args = parser.parse_args()
+    setup_logging()
+    results = benchmark_profiles(args.audio_path, args.profiles, args.base_url, not args.no_transcribe,
+                                 args.local_stub)
+    json.dump(results, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import os
+import logging
+from typing import List, Tuple, Dict, Any, Optional, Iterable
+
+import numpy as np
+
+from audio_utils import iter_pcm_blocks, extract_audio_stream, pcm_input_args
+from srt_utils import parse_srt, format_srt
+from transcode_profiles import TRANSCODE_PROFILES, output_args
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+HOP_MS = 10
+# 一次處理的幀數，避免長音訊的 FFT 佔用過多記憶體
+BLOCK_FRAMES = 8192
+# 能量門檻：高於估計噪音底 ENERGY_MARGIN_DB，且不低於 MIN_ENERGY_DB (dBFS)
+ENERGY_MARGIN_DB = 10.0
+MIN_ENERGY_DB = -50.0
+# 語音頻帶 (Hz) 能量佔比與頻譜平坦度門檻
+SPEECH_BAND = (300.0, 3400.0)
+MIN_BAND_RATIO = 0.45
+MAX_FLATNESS = 0.45
+# 區段後處理 (秒)
+MIN_SPEECH = 0.25
+MIN_SILENCE = 0.4
+PADDING = 0.2
+# 拼接語音區段時插入的靜音長度 (秒)，避免不同區段的詞語黏在一起
+JOIN_GAP = 0.3
+VAD_PROFILE = "speech_opus_24k"
+
+
+def _frame_features(samples: np.ndarray, sample_rate: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """計算每一幀的能量 (dBFS)、語音頻帶能量佔比和頻譜平坦度"""
+    frame_len = int(sample_rate * FRAME_MS / 1000)
+    hop = int(sample_rate * HOP_MS / 1000)
+    if len(samples) < frame_len:
+        samples = np.pad(samples, (0, frame_len - len(samples)))
+    frames = np.lib.stride_tricks.sliding_window_view(samples, frame_len)[::hop]
+    window = np.hanning(frame_len).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_len, 1.0 / sample_rate)
+    band = (freqs >= SPEECH_BAND[0]) & (freqs <= SPEECH_BAND[1])
+
+    energy_db = np.empty(len(frames), dtype=np.float32)
+    band_ratio = np.empty(len(frames), dtype=np.float32)
+    flatness = np.empty(len(frames), dtype=np.float32)
+    for start in range(0, len(frames), BLOCK_FRAMES):
+        block = frames[start:start + BLOCK_FRAMES]
+        rms = np.sqrt(np.mean(block * block, axis=1))
+        energy_db[start:start + len(block)] = 20.0 * np.log10(rms + 1e-10)
+        power = np.abs(np.fft.rfft(block * window, axis=1)) ** 2 + 1e-12
+        total = power.sum(axis=1)
+        band_ratio[start:start + len(block)] = power[:, band].sum(axis=1) / total
+        # 平坦度 = 幾何平均 / 算術平均；噪音接近 1，語音 (有諧波結構) 較低
+        flatness[start:start + len(block)] = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db, band_ratio, flatness
+
+
+def _stream_features(blocks: Iterable[np.ndarray], sample_rate: int,
+                     keep: Optional[List[np.ndarray]] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    逐塊計算幀特徵，結果與 _frame_features 對整段音訊計算的相同。
+
+    每塊 int16 取樣只在處理時轉為 float32，跨塊的幀以上一塊剩餘的取樣補齊；
+    keep 不為 None 時保留各塊的 int16 取樣 (供之後拼接語音區段)。
+    """
+    frame_len = int(sample_rate * FRAME_MS / 1000)
+    hop = int(sample_rate * HOP_MS / 1000)
+    carry = np.zeros(0, dtype=np.float32)
+    parts = []
+    for block in blocks:
+        if keep is not None:
+            keep.append(block)
+        buffer = np.concatenate((carry, block.astype(np.float32) / 32768.0))
+        if len(buffer) < frame_len:
+            carry = buffer
+            continue
+        count = (len(buffer) - frame_len) // hop + 1
+        parts.append(_frame_features(buffer[:(count - 1) * hop + frame_len], sample_rate))
+        carry = buffer[count * hop:]
+    if not parts:
+        parts.append(_frame_features(carry, sample_rate))
+    return tuple(np.concatenate(values) for values in zip(*parts))
+
+
+def _mask_to_regions(mask: np.ndarray, hop_seconds: float) -> List[Tuple[float, float]]:
+    """將逐幀布林遮罩轉為 (開始, 結束) 秒數區段"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    starts, ends = edges[0::2], edges[1::2]
+    return [(float(s) * hop_seconds, float(e) * hop_seconds) for s, e in zip(starts, ends)]
+
+
+def detect_speech_regions(samples: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Tuple[float, float]]:
+    """
+    以能量和頻譜特徵找出語音區段。
+
+    Args:
+        samples (np.ndarray): 單聲道 float32 PCM。
+        sample_rate (int): 取樣率。
+
+    Returns:
+        List[Tuple[float, float]]: 合併、補邊後的語音區段 (秒)。
+    """
+    duration = len(samples) / float(sample_rate)
+    return _regions_from_features(*_frame_features(samples, sample_rate), duration)
+
+
+def _regions_from_features(energy_db: np.ndarray, band_ratio: np.ndarray, flatness: np.ndarray,
+                           duration: float) -> List[Tuple[float, float]]:
+    """依逐幀特徵判定語音幀，並合併、補邊為語音區段"""
+    noise_floor = float(np.percentile(energy_db, 10))
+    threshold = max(noise_floor + ENERGY_MARGIN_DB, MIN_ENERGY_DB)
+    mask = (energy_db > threshold) & ((band_ratio > MIN_BAND_RATIO) | (flatness < MAX_FLATNESS))
+
+    hop_seconds = HOP_MS / 1000.0
+    regions = _mask_to_regions(mask, hop_seconds)
+    # 補邊並合併間隔過短的區段
+    merged: List[List[float]] = []
+    for start, end in regions:
+        start, end = max(0.0, start - PADDING), min(duration, end + FRAME_MS / 1000.0 + PADDING)
+        if merged and start - merged[-1][1] < MIN_SILENCE:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    result = [(s, e) for s, e in merged if e - s >= MIN_SPEECH]
+    speech = sum(e - s for s, e in result)
+    logger.info(f"VAD: 噪音底 {noise_floor:.1f} dBFS，門檻 {threshold:.1f} dBFS，"
+                f"找到 {len(result)} 個語音區段，共 {speech:.1f}/{duration:.1f} 秒")
+    return result
+
+
+def build_speech_audio(samples: np.ndarray, regions: List[Tuple[float, float]], output_base: str,
+                       sample_rate: int = SAMPLE_RATE, profile: str = VAD_PROFILE) -> Tuple[str, List[Tuple[float, float, float]]]:
+    """
+    將語音區段拼接為較短的音訊文件 (samples 可為 float32 或 int16 PCM)。
+
+    Returns:
+        Tuple[str, List[Tuple[float, float, float]]]: (輸出路徑, 時間對照表)。
+        對照表每項為 (拼接後起點, 原始起點, 長度)，供 remap_srt 還原時間戳。
+    """
+    gap = np.zeros(int(JOIN_GAP * sample_rate), dtype=np.int16)
+    mapping: List[Tuple[float, float, float]] = []
+    pieces: List[bytes] = []
+    position = 0.0
+    for start, end in regions:
+        segment = samples[int(start * sample_rate):int(end * sample_rate)]
+        length = len(segment) / float(sample_rate)
+        mapping.append((position, start, length))
+        if segment.dtype == np.int16:
+            pieces.append(segment.astype("<i2", copy=False).tobytes())
+        else:
+            pieces.append((np.clip(segment, -1.0, 1.0) * 32767).astype("<i2").tobytes())
+        pieces.append(gap.tobytes())
+        position += length + JOIN_GAP
+    output_path = output_base + TRANSCODE_PROFILES[profile]["ext"]
+    extract_audio_stream(iter(pieces), output_path, output_args(profile), input_args=pcm_input_args(sample_rate))
+    return output_path, mapping
+
+
+def map_time(t: float, mapping: List[Tuple[float, float, float]]) -> float:
+    """將拼接後音訊中的時間映射回原始時間軸"""
+    if not mapping:
+        return t
+    for joined_start, original_start, length in reversed(mapping):
+        if t >= joined_start:
+            # 落在區段後的靜音間隔內時夾到區段結尾
+            return original_start + min(t - joined_start, length)
+    return mapping[0][1]
+
+
+def remap_srt(srt_content: str, mapping: List[Tuple[float, float, float]]) -> str:
+    """將拼接音訊的 SRT 時間戳還原到原始時間軸"""
+    cues = parse_srt(srt_content)
+    for cue in cues:
+        cue["start"] = map_time(cue["start"], mapping)
+        cue["end"] = max(cue["start"], map_time(cue["end"], mapping))
+    return format_srt(cues)
+
+
+@traced("vad.prepare", cat="audio")
+def prepare_speech_audio(audio_path: str, output_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    解碼音訊、偵測語音並輸出只含語音的文件。
+
+    解碼結果逐塊計算特徵，只保留 int16 取樣 (每個取樣 2 位元組)，
+    不會把整個文件轉為 float32。
+
+    Returns:
+        Optional[Dict[str, Any]]: 包含 'path', 'mapping', 'original_seconds', 'speech_seconds'；
+        找不到語音時返回 None。
+    """
+    blocks: List[np.ndarray] = []
+    features = _stream_features(iter_pcm_blocks(audio_path, SAMPLE_RATE), SAMPLE_RATE, keep=blocks)
+    samples = np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.int16)
+    blocks.clear()
+    regions = _regions_from_features(*features, len(samples) / float(SAMPLE_RATE))
+    if not regions:
+        return None
+    base = os.path.join(output_dir, os.path.splitext(os.path.basename(audio_path))[0] + "_speech")
+    path, mapping = build_speech_audio(samples, regions, base)
+    return {
+        "path": path,
+        "mapping": mapping,
+        "original_seconds": len(samples) / float(SAMPLE_RATE),
+        "speech_seconds": sum(length for _, _, length in mapping),
+    }
@@ -1,37 +1,54 @@
 import os
 import time
+import shutil
+import tempfile
 import traceback  # Import traceback at the top
+from concurrent.futures import ThreadPoolExecutor
 # import json # 如果 main 函數不再直接使用 json，可以移除
 import openai
-from dotenv import load_dotenv
 import logging
+from audio_utils import probe_duration, detect_silences, plan_split_points, cut_segment
+from srt_utils import merge_srt_chunks
+from disk_cache import DiskCache, hash_file
+from config import require_openai_api_key
+import metrics
+import tracing
 #from lovense import LovenseController
 
-# 設置日誌
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# 加載環境變數
-load_dotenv()
-
-# 使用環境變數獲取 API 密鑰
-# os.environ["OPENAI_API_KEY"] = "sk-proj-..." # Removed hardcoded key
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-if not OPENAI_API_KEY:
-    # Log error and raise if the key is crucial for this script
-    logger.error("OpenAI API Key 未在環境變數中設置！") 
-    raise ValueError("請設置 OPENAI_API_KEY 環境變數或將其放入 .env 文件")
-
-openai.api_key = OPENAI_API_KEY
+# Whisper API 上傳大小限制為 25 MB，保留一些餘量
+WHISPER_MAX_UPLOAD_BYTES = 24 * 1024 * 1024
+DEFAULT_CHUNK_SECONDS = 600
+DEFAULT_MAX_WORKERS = 4
 
 class AudioProcessor:
     """處理音訊文件和轉換為文本的類"""
     
-    def __init__(self):
+    def __init__(self, model: str = "whisper-1", cache: DiskCache = None):
+        """
+        Args:
+            model (str): Whisper 模型名稱。
+            cache (DiskCache): 轉錄結果快取；None 表示不使用快取。
+        """
+        require_openai_api_key()
         self.transcript = ""
+        self.model = model
+        self.cache = cache
+        self.last_from_cache = False
     
-    def transcribe_audio(self, audio_path):
-        """使用 OpenAI Whisper 將音訊轉換為文本"""
+    def transcribe_audio(self, audio_path, chunked=None, max_workers=DEFAULT_MAX_WORKERS,
+                         chunk_seconds=DEFAULT_CHUNK_SECONDS, use_vad=False):
+        """使用 OpenAI Whisper 將音訊轉換為文本
+
+        Args:
+            audio_path (str): 音訊文件路徑。
+            chunked (bool | None): 是否使用分段並行轉錄；None 表示文件超過上傳限制時自動啟用。
+            max_workers (int): 分段模式下同時轉錄的最大執行緒數。
+            chunk_seconds (float): 分段模式下每段的目標長度 (秒)。
+            use_vad (bool): 是否先以語音活動偵測移除無語音區段，只上傳語音部分
+                (需要 NumPy)；時間戳會映射回原始時間軸。
+        """
         try:
             logger.info(f"開始轉錄音訊文件: {audio_path}")
             
@@ -40,16 +57,29 @@ class AudioProcessor:
                  logger.error(f"音訊文件不存在: {audio_path}")
                  raise FileNotFoundError(f"音訊文件不存在: {audio_path}")
 
-            with open(audio_path, "rb") as audio_file:
-                transcript_response = openai.audio.transcriptions.create(
-                    model="whisper-1", # 使用 whisper-1 模型
-                    file=audio_file,
-                    response_format="srt"
-                )
-            
-            # Directly assign the string response when format is srt
-            self.transcript = transcript_response 
+            self.last_from_cache = False
+            cache_key = None
+            if self.cache is not None:
+                cache_key = hash_file(audio_path, extra=(self.model, "srt", "vad" if use_vad else "full"))
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    self.transcript = cached
+                    self.last_from_cache = True
+                    metrics.inc("cache_hits_total", kind="transcript")
+                    logger.info(f"轉錄快取命中 ({cache_key[:12]})，略過 Whisper 請求")
+                    return self.transcript
+
+            if use_vad:
+                self.transcript = self._transcribe_speech_only(audio_path, chunked, max_workers, chunk_seconds)
+            else:
+                self.transcript = self._transcribe_path(audio_path, chunked, max_workers, chunk_seconds)
             logger.info(f"音訊轉錄完成 (SRT 格式)")
+
+            if cache_key is not None and self.transcript:
+                self.cache.put(cache_key, self.transcript, meta={
+                    "model": self.model,
+                    "source": os.path.basename(audio_path),
+                })
             return self.transcript
             
         except openai.APIError as api_err:
@@ -65,6 +95,82 @@ class AudioProcessor:
             traceback.print_exc()
             raise
     
+    def _transcribe_path(self, audio_path, chunked, max_workers, chunk_seconds):
+        """依文件大小決定單次或分段轉錄"""
+        if chunked is None:
+            chunked = os.path.getsize(audio_path) > WHISPER_MAX_UPLOAD_BYTES
+        if chunked:
+            return self._transcribe_chunked(audio_path, max_workers, chunk_seconds)
+        # Directly assign the string response when format is srt
+        return self._transcribe_file(audio_path)
+
+    def _transcribe_speech_only(self, audio_path, chunked, max_workers, chunk_seconds):
+        """只轉錄 VAD 找出的語音區段，再把時間戳映射回原始音訊"""
+        from vad import prepare_speech_audio, remap_srt  # 需要 NumPy，只在啟用 VAD 時載入
+
+        temp_dir = tempfile.mkdtemp(prefix="vad_")
+        try:
+            speech = prepare_speech_audio(audio_path, temp_dir)
+            if speech is None:
+                logger.warning("VAD 未偵測到語音，返回空白轉錄。")
+                return ""
+            logger.info(f"VAD 保留 {speech['speech_seconds']:.1f}/{speech['original_seconds']:.1f} 秒音訊，"
+                        f"上傳 {os.path.getsize(speech['path']) / 1024 / 1024:.2f} MB "
+                        f"(原始 {os.path.getsize(audio_path) / 1024 / 1024:.2f} MB)")
+            srt = self._transcribe_path(speech["path"], chunked, max_workers, chunk_seconds)
+            return remap_srt(srt, speech["mapping"])
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def _transcribe_file(self, audio_path):
+        """對單一文件呼叫 Whisper API，返回 SRT 字串"""
+        metrics.inc("whisper_requests_total", model=self.model)
+        metrics.inc("whisper_upload_bytes_total", os.path.getsize(audio_path), model=self.model)
+        with open(audio_path, "rb") as audio_file, metrics.timer("whisper_request_seconds", model=self.model), \
+                tracing.span("openai.whisper", cat="openai", bytes=os.path.getsize(audio_path)):
+            return openai.audio.transcriptions.create(
+                model=self.model,
+                file=audio_file,
+                response_format="srt"
+            )
+
+    def _transcribe_chunked(self, audio_path, max_workers, chunk_seconds):
+        """在靜音處切割音訊，並行轉錄各分段後合併為單一 SRT"""
+        duration = probe_duration(audio_path)
+        if not duration:
+            raise RuntimeError(f"無法取得音訊長度，無法進行分段轉錄: {audio_path}")
+
+        # 確保每段都在上傳限制以內 (以平均位元率估算)
+        bytes_per_second = os.path.getsize(audio_path) / duration
+        max_chunk_seconds = WHISPER_MAX_UPLOAD_BYTES * 0.8 / bytes_per_second
+        chunk_seconds = max(30.0, min(chunk_seconds, max_chunk_seconds))
+
+        silences = detect_silences(audio_path)
+        split_points = plan_split_points(duration, chunk_seconds, silences)
+        logger.info(f"音訊長度 {duration:.1f} 秒，分為 {len(split_points)} 段，使用 {max_workers} 個執行緒並行轉錄")
+
+        ext = os.path.splitext(audio_path)[1] or ".mp3"
+        temp_dir = tempfile.mkdtemp(prefix="whisper_chunks_")
+        try:
+            chunk_jobs = []
+            for i, start in enumerate(split_points):
+                end = split_points[i + 1] if i + 1 < len(split_points) else None
+                chunk_path = os.path.join(temp_dir, f"chunk_{i:04d}{ext}")
+                cut_segment(audio_path, chunk_path, start, None if end is None else end - start)
+                chunk_jobs.append((start, chunk_path))
+
+            def transcribe_chunk(job):
+                start, chunk_path = job
+                logger.info(f"開始轉錄分段 {os.path.basename(chunk_path)} (起始 {start:.1f} 秒)")
+                return start, self._transcribe_file(chunk_path)
+
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+                results = list(executor.map(transcribe_chunk, chunk_jobs))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        return merge_srt_chunks(results)
+    
     def save_transcript(self, output_path):
         """保存轉錄文本到文件"""
         try: